@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Keyword business rules: critical / seasonal item flags and per-category demand multipliers
+
+DEFAULT_BUSINESS_RULES = {
+    "critical_items": ["first aid", "safety", "emergency", "sanitizer"],
+    "seasonal_items": ["ice cream", "hot chocolate", "coconut water"],
+    "category_multipliers": {
+        "HK Chemical": 0.8,
+        "Food Items": 1.2,
+        "Safety Items": 1.1,
+        "Office Supplies": 0.9
+    }
+}
+
+# Keyword rules, in the order of the (Is_Critical, Is_Seasonal) flag columns
+FLAG_RULES = ['critical_items', 'seasonal_items']
+
+def validate_rules(rules):
+    """Check a rules mapping (any subset of DEFAULT_BUSINESS_RULES' keys); raises ValueError"""
+    
+    if not isinstance(rules, dict):
+        raise ValueError("❌ Business rules must be a mapping")
+    
+    unknown = sorted(set(rules) - set(DEFAULT_BUSINESS_RULES))
+    if unknown:
+        raise ValueError(f"❌ Unknown business rules: {unknown} (available: {list(DEFAULT_BUSINESS_RULES)})")
+    
+    for name in FLAG_RULES:
+        keywords = rules.get(name, [])
+        if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+            raise ValueError(f"❌ '{name}' must be a list of keywords")
+        for keyword in keywords:
+            try:
+                re.compile(keyword)
+            except re.error as e:
+                raise ValueError(f"❌ Invalid keyword '{keyword}' in '{name}': {e}")
+    
+    multipliers = rules.get('category_multipliers', {})
+    if not isinstance(multipliers, dict) or not all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in multipliers.values()):
+        raise ValueError("❌ 'category_multipliers' must map categories to numbers")
+    
+    return rules
+
+def load_rules_file(path, base=None):
+    """
+    Business rules from a JSON file, layered over base (DEFAULT_BUSINESS_RULES).
+    
+    The file may hold any of 'critical_items', 'seasonal_items' and
+    'category_multipliers'; the ones it leaves out keep their base value.
+    """
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        rules = validate_rules(json.load(f))
+    
+    merged = dict(base or DEFAULT_BUSINESS_RULES)
+    merged.update(rules)
+    return merged
+
+class BusinessRuleEngine:
+    """
+    Business rules compiled once, with every item name's flags memoized.
+    
+    Each keyword list becomes one compiled alternation (keywords are regular
+    expressions, matched case-insensitively anywhere in the name). The memo is
+    a hashed index of the item names seen so far with their flags: a frame is
+    looked up with one vectorized get_indexer and only names never seen before
+    are matched, so after the first month the cost follows the new items rather
+    than rows x months. save_memo / load_memo carry the memo across runs.
+    """
+    
+    def __init__(self, rules):
+        validate_rules(rules)
+        self.rules = rules
+        self.patterns = [self._compile(rules.get(name, [])) for name in FLAG_RULES]
+        self.category_multipliers = dict(rules.get('category_multipliers', {}))
+        self.key = self.rules_key(rules)
+        self._names = pd.Index([], dtype='str')                     # Item names matched so far
+        self._flags = np.zeros((0, len(FLAG_RULES)), dtype=bool)    # (Is_Critical, Is_Seasonal) per name
+        self._new_names = 0     # Names matched since the memo was loaded / saved
+    
+    @staticmethod
+    def _compile(keywords):
+        pattern = '|'.join(keywords)
+        return re.compile(pattern, re.IGNORECASE) if pattern else None
+    
+    @staticmethod
+    def rules_key(rules):
+        """Hash of the keyword rules (the part of the rules the name memo depends on)"""
+        
+        payload = json.dumps([rules.get(name, []) for name in FLAG_RULES]).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()[:16]
+    
+    def matches(self, rules):
+        """Check whether this engine was compiled from rules"""
+        
+        return rules == self.rules
+    
+    def __len__(self):
+        return len(self._names)
+    
+    def _remember(self, names, flags):
+        self._names = self._names.append(pd.Index(names, dtype='str'))
+        self._flags = np.concatenate([self._flags, flags])
+    
+    def _match(self, names):
+        """Flags of new item names (an Index of unique names), one column per keyword rule"""
+        
+        lowered = pd.Series(names, dtype=object).astype(str).str.lower()
+        flags = np.zeros((len(names), len(FLAG_RULES)), dtype=bool)
+        for i, pattern in enumerate(self.patterns):
+            if pattern is not None:
+                flags[:, i] = lowered.str.contains(pattern, na=False).to_numpy(dtype=bool)
+        return flags
+    
+    def flags(self, names):
+        """(Is_Critical, Is_Seasonal) boolean arrays for a Series of item names"""
+        
+        names = pd.Series(names)
+        positions = self._names.get_indexer(names)
+        
+        new = (positions < 0) & names.notna().to_numpy()
+        if new.any():
+            new_names = pd.Index(pd.unique(names[new]))
+            self._remember(new_names, self._match(new_names))
+            self._new_names += len(new_names)
+            positions[new] = self._names.get_indexer(names[new])
+        
+        # Missing names (position -1) pick the trailing all-False row
+        table = np.concatenate([self._flags, np.zeros((1, len(FLAG_RULES)), dtype=bool)])
+        picked = table[positions]
+        return tuple(picked[:, i] for i in range(len(FLAG_RULES)))
+    
+    def multipliers(self, categories):
+        """Category multiplier (1.0 for unlisted categories) for a Series of categories"""
+        
+        codes, uniques = pd.factorize(categories)
+        table = np.ones(len(uniques) + 1, dtype=float)
+        for i, category in enumerate(uniques.tolist()):
+            value = self.category_multipliers.get(category)
+            if value is not None and not pd.isna(value):
+                table[i] = value
+        return table[codes]
+    
+    def load_memo(self, path):
+        """Merge a saved name memo for the same keyword rules; returns the names loaded"""
+        
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            names = pd.Index(saved['names'], dtype='str')
+            flags = np.array(saved['flags'], dtype=bool).reshape(len(names), len(FLAG_RULES))
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0
+        
+        if saved.get('key') != self.key:
+            return 0
+        
+        return self._add(names, flags)
+    
+    def _add(self, names, flags):
+        """Remember the (names, flags) entries not in the memo yet; returns how many were added"""
+        
+        unseen = self._names.get_indexer(names) < 0
+        self._remember(names[unseen], flags[unseen])
+        return int(unseen.sum())
+    
+    def entries(self, start=0):
+        """(names, flags) lists of the memo from position start, e.g. the names one sheet matched"""
+        
+        return self._names[start:].tolist(), self._flags[start:].tolist()
+    
+    def merge(self, names, flags):
+        """Add memo entries matched by another engine (a worker process); returns the names added"""
+        
+        names = pd.Index(names, dtype='str')
+        flags = np.array(flags, dtype=bool).reshape(len(names), len(FLAG_RULES))
+        added = self._add(names, flags)
+        self._new_names += added
+        return added
+    
+    def save_memo(self, path, max_names=None):
+        """
+        Write the name memo if names were matched since it was loaded; returns True if written.
+        
+        Names other processes saved to path since it was loaded (parallel site runs
+        share the memo) are merged in first. Only the latest max_names names are
+        written, dropping the ones memoized longest ago.
+        """
+        
+        if not self._new_names:
+            return False
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.load_memo(path)
+        names, flags = self._names, self._flags
+        if max_names is not None and len(names) > max_names:
+            names, flags = names[len(names) - max_names:], flags[len(names) - max_names:]
+        payload = {'key': self.key, 'names': names.tolist(), 'flags': flags.tolist()}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        self._new_names = 0
+        return True
@@ -6,6 +6,8 @@ import numpy as np
 from datetime import datetime, timedelta
 import os
 
+import prediction_sinks
+
 # Page configuration
 st.set_page_config(
     page_title="Inventory Predictions Dashboard", 
@@ -13,72 +15,68 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Directories searched for published predictions (typed Parquet/Arrow files preferred over CSV)
+DATA_DIRECTORIES = [
+    ".",
+    "data",
+    os.path.join(os.path.expanduser("~"), "Downloads")
+]
+
 @st.cache_data
+def read_predictions(file_path, file_format, modified_time):
+    """Read and enrich published predictions (cached per file version)"""
+    df = prediction_sinks.read_predictions(file_path, file_format)
+    
+    # Data cleaning - columns already carry the shared schema types
+    df['Final_Monthly_Prediction'] = df['Final_Monthly_Prediction'].fillna(0)
+    df['Confidence'] = df['Confidence'].fillna(0)
+    df['Price'] = df['Price'].fillna(0)
+    
+    # Add time-based columns for filtering from the month the predictions were made for
+    if prediction_sinks.TARGET_MONTH_COLUMN in df.columns:
+        target_months = pd.PeriodIndex(df[prediction_sinks.TARGET_MONTH_COLUMN].astype(str), freq='M')
+        df['Prediction_Month'] = target_months.strftime('%b %Y')
+        df['Prediction_Year'] = target_months.year
+    else:
+        # Files published before Target_Month existed were all for June 2025
+        df['Prediction_Month'] = 'Jun 2025'
+        df['Prediction_Year'] = 2025
+    
+    # Create weekly breakdown (simulate 4 weeks in the month)
+    np.random.seed(42)  # For consistent results
+    weeks = ['Week 1', 'Week 2', 'Week 3', 'Week 4']
+    df['Prediction_Week'] = np.random.choice(weeks, size=len(df))
+    
+    # Calculate weekly predictions (distribute monthly prediction across weeks)
+    weekly_factors = {'Week 1': 0.25, 'Week 2': 0.25, 'Week 3': 0.25, 'Week 4': 0.25}
+    df['Weekly_Prediction'] = (
+        df['Final_Monthly_Prediction'] * df['Prediction_Week'].map(weekly_factors)
+    ).astype(int)
+    
+    # Add value calculations
+    df['Total_Value'] = df['Final_Monthly_Prediction'] * df['Price']
+    df['Weekly_Value'] = df['Weekly_Prediction'] * df['Price']
+    
+    # Add category for better grouping if missing
+    if 'Category' not in df.columns:
+        df['Category'] = 'General'
+    
+    return df
+
 def load_data():
     """Load and validate the predictions data with error handling"""
     try:
-        # Try multiple possible file locations
-        possible_paths = [
-            "predictions_latest.csv",
-            "data/predictions_latest.csv",
-            os.path.join(os.path.expanduser("~"), "Downloads", "predictions_latest.csv"),
-            "./predictions_latest.csv"
-        ]
-        
-        df = None
-        file_path = None
+        file_path, file_format = prediction_sinks.find_published(DATA_DIRECTORIES)
         
-        for path in possible_paths:
-            if os.path.exists(path):
-                df = pd.read_csv(path)
-                file_path = path
-                break
-        
-        if df is None:
-            st.error("❌ Could not find predictions_latest.csv file")
+        if file_path is None:
+            st.error("❌ Could not find published predictions (predictions_latest.parquet/.arrow/.csv)")
             st.info("Please ensure the file is in one of these locations:")
-            for path in possible_paths:
-                st.write(f"• {path}")
-            return None
-        
-        # Validate required columns
-        required_cols = ['Item_Name', 'Final_Monthly_Prediction', 'Confidence', 'Risk_Level']
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        
-        if missing_cols:
-            st.error(f"❌ Missing required columns: {missing_cols}")
+            for directory in DATA_DIRECTORIES:
+                st.write(f"• {os.path.join(directory, prediction_sinks.PREDICTIONS_NAME)}.*")
             return None
         
-        # Data cleaning and preprocessing
-        df['Item_Name'] = df['Item_Name'].astype(str).str.strip()
-        df['Final_Monthly_Prediction'] = pd.to_numeric(df['Final_Monthly_Prediction'], errors='coerce').fillna(0)
-        df['Confidence'] = pd.to_numeric(df['Confidence'], errors='coerce').fillna(0)
-        df['Price'] = pd.to_numeric(df['Price'], errors='coerce').fillna(0)
-        
-        # Add time-based columns for filtering (simulated based on prediction data)
-        # Since this is prediction data for June 2025, we'll create monthly breakdown
-        df['Prediction_Month'] = 'Jun 2025'
-        df['Prediction_Year'] = 2025
-        
-        # Create weekly breakdown (simulate 4 weeks in June)
-        np.random.seed(42)  # For consistent results
-        weeks = ['Week 1', 'Week 2', 'Week 3', 'Week 4']
-        df['Prediction_Week'] = np.random.choice(weeks, size=len(df))
-        
-        # Calculate weekly predictions (distribute monthly prediction across weeks)
-        weekly_factors = {'Week 1': 0.25, 'Week 2': 0.25, 'Week 3': 0.25, 'Week 4': 0.25}
-        df['Weekly_Prediction'] = df.apply(
-            lambda row: int(row['Final_Monthly_Prediction'] * weekly_factors[row['Prediction_Week']]), 
-            axis=1
-        )
-        
-        # Add value calculations
-        df['Total_Value'] = df['Final_Monthly_Prediction'] * df['Price']
-        df['Weekly_Value'] = df['Weekly_Prediction'] * df['Price']
-        
-        # Add category for better grouping if missing
-        if 'Category' not in df.columns:
-            df['Category'] = 'General'
+        # Files are published atomically, so the modification time identifies a complete version
+        df = read_predictions(file_path, file_format, os.path.getmtime(file_path))
         
         st.success(f"✅ Successfully loaded {len(df)} items from {file_path}")
         return df
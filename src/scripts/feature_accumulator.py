@@ -0,0 +1,286 @@
+import numpy as np
+
+# Running per-item sufficient statistics for the batch-aware features (walk-forward training state)
+
+# Per-month values summed per item (their means are features); 'rate' is the daily consumption rate
+SUM_FIELDS = ('rate', 'frequency', 'batch', 'predictability', 'regularity', 'seasonal')
+
+def row_percentile(sorted_values, lengths, q):
+    """np.percentile(..., method='linear') of the first lengths[i] sorted values of each row"""
+    
+    virtual = (lengths - 1) * q
+    previous = np.floor(virtual)
+    above = virtual >= lengths - 1
+    prev_idx = np.where(above, lengths - 1, previous).astype(np.intp)
+    next_idx = np.where(above, lengths - 1, previous + 1).astype(np.intp)
+    gamma = virtual - np.where(above, -1, previous)
+    
+    rows = np.arange(len(lengths))
+    lower = sorted_values[rows, prev_idx]
+    upper = sorted_values[rows, next_idx]
+    
+    # Same two-sided linear interpolation as NumPy's _lerp
+    diff = upper - lower
+    return np.where(gamma >= 0.5, upper - diff * (1 - gamma), lower + diff * gamma)
+
+def weighted_row_percentile(values, weights, q):
+    """
+    Linear percentile of weighted sorted points (zero weight = padding).
+    
+    A point of weight w stands for w consecutive sorted values and sits at the
+    middle of them; the percentile interpolates between neighbouring points
+    like np.percentile(..., method='linear'), which it equals for unit weights.
+    """
+    
+    cumulative = np.cumsum(weights, axis=1)
+    total = cumulative[:, -1]
+    centers = np.where(weights > 0, cumulative - (weights + 1) / 2, np.inf)
+    target = (total - 1) * q
+    
+    n_valid = (weights > 0).sum(axis=1)
+    below = (centers < target[:, None]).sum(axis=1)
+    lo = np.clip(below - 1, 0, n_valid - 1)
+    hi = np.clip(below, 0, n_valid - 1)
+    
+    rows = np.arange(len(values))
+    span = centers[rows, hi] - centers[rows, lo]
+    fraction = np.clip(np.where(span > 0, (target - centers[rows, lo]) / np.where(span > 0, span, 1), 0.0), 0, 1)
+    return values[rows, lo] + (values[rows, hi] - values[rows, lo]) * fraction
+
+def _merge_closest(values, weights, n_valid):
+    """
+    Drop one point from every row: the adjacent pair with the smallest combined
+    weight becomes one point at their weighted mean. Returns the new arrays
+    (same width, padded at the end) and valid counts.
+    """
+    
+    n_rows, width = values.shape
+    pair_weight = weights[:, :-1] + weights[:, 1:]
+    pair_weight = np.where(np.arange(width - 1) + 1 < n_valid[:, None], pair_weight, np.inf)
+    j = np.argmin(pair_weight, axis=1)
+    rows = np.arange(n_rows)
+    
+    merged_weight = pair_weight[rows, j]
+    merged_value = (values[rows, j] * weights[rows, j] + values[rows, j + 1] * weights[rows, j + 1]) / merged_weight
+    values, weights = values.copy(), weights.copy()
+    values[rows, j], weights[rows, j] = merged_value, merged_weight
+    
+    keep = np.ones(values.shape, dtype=bool)
+    keep[rows, j + 1] = False
+    values = np.concatenate([values[keep].reshape(n_rows, width - 1), np.full((n_rows, 1), np.inf)], axis=1)
+    weights = np.concatenate([weights[keep].reshape(n_rows, width - 1), np.zeros((n_rows, 1))], axis=1)
+    return values, weights, n_valid - 1
+
+class FeatureAccumulator:
+    """
+    Sufficient statistics of every item's monthly history, updated one month at a time.
+    
+    Per item code: month count, sums of the SUM_FIELDS values, sums of t, t^2
+    and t*rate for the least-squares trend (t = Month_Num), Welford mean/M2 of
+    the rate and batch size, first / previous / last rate, min and max rate,
+    batch pattern counts with the position each pattern was last seen, and the
+    panel row of the latest month. add_month folds one month in with O(1) work
+    per item; merge combines the accumulators of two consecutive month ranges.
+    
+    Median and quartiles come from a per-item sorted buffer of rates, exact
+    for up to quantile_points months. Beyond that the buffer is a weighted
+    sketch (a one-dimensional t-digest): each point carries the number of
+    months it stands for, and when a month arrives at a full buffer the
+    adjacent pair with the smallest combined weight is merged into its
+    weighted mean. Quantiles interpolate between point centres
+    (weighted_row_percentile), so the rank error stays around
+    1 / quantile_points and memory at items x quantile_points; min and max
+    are tracked exactly.
+    """
+    
+    def __init__(self, n_items, n_patterns, quantile_points=64):
+        self.quantile_points = quantile_points
+        self.count = np.zeros(n_items, dtype=int)
+        self.latest_row = np.full(n_items, -1)
+        self.sums = {name: np.zeros(n_items) for name in SUM_FIELDS + ('t', 'tt', 'tx')}
+        self.rate_mean, self.rate_m2 = np.zeros(n_items), np.zeros(n_items)
+        self.batch_mean, self.batch_m2 = np.zeros(n_items), np.zeros(n_items)
+        self.first_rate, self.prev_rate, self.last_rate = np.zeros(n_items), np.zeros(n_items), np.zeros(n_items)
+        self.min_rate, self.max_rate = np.full(n_items, np.inf), np.full(n_items, -np.inf)
+        self.pattern_counts = np.zeros((n_items, n_patterns), dtype=int)
+        self.pattern_last_seen = np.full((n_items, n_patterns), -1)
+        
+        # Quantile buffer: sorted rates (inf padding) with their weights (months per point),
+        # grown on demand up to quantile_points columns
+        self.points = np.full((n_items, 1), np.inf)
+        self.weights = np.zeros((n_items, 1))
+        self.n_points = np.zeros(n_items, dtype=int)
+    
+    @property
+    def n_items(self):
+        return len(self.count)
+    
+    def _widen(self, width):
+        width = min(max(width, 2 * self.points.shape[1]), self.quantile_points + 1)
+        if width > self.points.shape[1]:
+            extra = width - self.points.shape[1]
+            self.points = np.concatenate([self.points, np.full((self.n_items, extra), np.inf)], axis=1)
+            self.weights = np.concatenate([self.weights, np.zeros((self.n_items, extra))], axis=1)
+    
+    def _trim(self):
+        """Drop the spare column used while a full buffer takes one more point"""
+        
+        if self.points.shape[1] > self.quantile_points:
+            self.points = self.points[:, :self.quantile_points]
+            self.weights = self.weights[:, :self.quantile_points]
+    
+    def add_month(self, codes, t, pattern_codes, rows, **values):
+        """
+        Fold one month into the items listed in it (codes must be unique).
+        
+        values holds one array per SUM_FIELDS name, aligned with codes; t is the
+        month number, pattern_codes the batch pattern and rows the panel row of
+        each item's entry.
+        """
+        
+        k_before = self.count[codes]
+        k_after = k_before + 1
+        value = values['rate']
+        
+        self.first_rate[codes] = np.where(k_before == 0, value, self.first_rate[codes])
+        self.prev_rate[codes] = self.last_rate[codes]
+        self.last_rate[codes] = value
+        self.latest_row[codes] = rows
+        self.min_rate[codes] = np.minimum(self.min_rate[codes], value)
+        self.max_rate[codes] = np.maximum(self.max_rate[codes], value)
+        
+        for name in SUM_FIELDS:
+            self.sums[name][codes] += values[name]
+        self.sums['t'][codes] += t
+        self.sums['tt'][codes] += t * t
+        self.sums['tx'][codes] += t * value
+        
+        for mean, m2, column in [(self.rate_mean, self.rate_m2, value),
+                                 (self.batch_mean, self.batch_m2, values['batch'])]:
+            delta = column - mean[codes]
+            mean[codes] += delta / k_after
+            m2[codes] += delta * (column - mean[codes])
+        
+        self._insert_rates(codes, value)
+        
+        self.pattern_counts[codes, pattern_codes] += 1
+        self.pattern_last_seen[codes, pattern_codes] = k_before
+        self.count[codes] = k_after
+    
+    def _insert_rates(self, codes, value):
+        # Insert into each sorted buffer with weight 1
+        self._widen(int(self.n_points[codes].max()) + 1)
+        current, weights = self.points[codes], self.weights[codes]
+        position = (current < value[:, None]).sum(axis=1)
+        column_idx = np.arange(current.shape[1])
+        before, at = column_idx < position[:, None], column_idx == position[:, None]
+        self.points[codes] = np.where(before, current, np.where(at, value[:, None], np.roll(current, 1, axis=1)))
+        self.weights[codes] = np.where(before, weights, np.where(at, 1.0, np.roll(weights, 1, axis=1)))
+        self.n_points[codes] += 1
+        
+        # Buffers that were full merge their two lightest neighbours
+        full = codes[self.n_points[codes] > self.quantile_points]
+        if len(full):
+            self.points[full], self.weights[full], self.n_points[full] = _merge_closest(
+                self.points[full], self.weights[full], self.n_points[full]
+            )
+        self._trim()
+    
+    def merge(self, later):
+        """
+        Fold in the accumulator of the months right after this one's (same item
+        codes and pattern codes) and return self.
+        """
+        
+        n_a, n_b = self.count, later.count
+        n = n_a + n_b
+        safe_n = np.maximum(n, 1)
+        
+        for mean, m2, other_mean, other_m2 in [(self.rate_mean, self.rate_m2, later.rate_mean, later.rate_m2),
+                                              (self.batch_mean, self.batch_m2, later.batch_mean, later.batch_m2)]:
+            delta = other_mean - mean
+            m2 += other_m2 + delta * delta * n_a * n_b / safe_n
+            mean += delta * n_b / safe_n
+        
+        for name in self.sums:
+            self.sums[name] += later.sums[name]
+        
+        self.first_rate = np.where(n_a > 0, self.first_rate, later.first_rate)
+        self.prev_rate = np.select([n_b >= 2, n_b == 1], [later.prev_rate, self.last_rate], self.prev_rate)
+        self.last_rate = np.where(n_b > 0, later.last_rate, self.last_rate)
+        self.latest_row = np.where(n_b > 0, later.latest_row, self.latest_row)
+        self.min_rate = np.minimum(self.min_rate, later.min_rate)
+        self.max_rate = np.maximum(self.max_rate, later.max_rate)
+        
+        self.pattern_last_seen = np.where(later.pattern_last_seen >= 0, later.pattern_last_seen + n_a[:, None],
+                                          self.pattern_last_seen)
+        self.pattern_counts = self.pattern_counts + later.pattern_counts
+        
+        # Quantile buffers: combine the sorted points, then merge neighbours back down to quantile_points
+        values = np.concatenate([self.points, later.points], axis=1)
+        weights = np.concatenate([self.weights, later.weights], axis=1)
+        order = np.argsort(values, axis=1, kind='stable')
+        values = np.take_along_axis(values, order, axis=1)
+        weights = np.take_along_axis(weights, order, axis=1)
+        n_points = self.n_points + later.n_points
+        
+        while n_points.max(initial=0) > self.quantile_points:
+            over = n_points > self.quantile_points
+            values[over], weights[over], n_points[over] = _merge_closest(values[over], weights[over], n_points[over])
+        
+        width = max(min(int(n_points.max(initial=0)), self.quantile_points), 1)
+        self.points, self.weights, self.n_points = values[:, :width], weights[:, :width], n_points
+        
+        self.count = n
+        return self
+    
+    def stats(self, codes):
+        """
+        Feature statistics of the given items (those with at least one month),
+        keyed like the stats consumed by _assemble_feature_frame. dominant_pattern
+        is a pattern code (ties go to the most recently seen pattern).
+        """
+        
+        k = self.count[codes]
+        n = k.astype(float)
+        sums = {name: values[codes] for name, values in self.sums.items()}
+        points, n_points = self.points[codes], self.n_points[codes]
+        rows = np.arange(len(codes))
+        
+        # Exact buffers (one point per month) use the exact median/percentiles, sketches interpolate
+        exact = n_points == k
+        weights = self.weights[codes]
+        median_lower = points[rows, (n_points - 1) // 2]
+        median_upper = points[rows, n_points // 2]
+        
+        def quantile(q):
+            return np.where(exact, row_percentile(points, n_points, q), weighted_row_percentile(points, weights, q))
+        pattern_counts = self.pattern_counts[codes]
+        recency = int(self.count.max(initial=0)) + 1
+        dominant = np.argmax(pattern_counts * recency + self.pattern_last_seen[codes], axis=1)
+        slope = (n * sums['tx'] - sums['t'] * sums['rate']) / (n * sums['tt'] - sums['t'] * sums['t'])
+        
+        return {
+            'months': k,
+            'avg_rate': sums['rate'] / n,
+            'median_rate': np.where(exact, np.where(n_points % 2 == 1, median_lower, (median_lower + median_upper) / 2),
+                                    quantile(0.5)),
+            'rate_std': np.sqrt(self.rate_m2[codes] / n),
+            'seasonal_rate': sums['seasonal'] / n,
+            'trend': np.where(k > 2, slope, 0.0),
+            'recent_trend': np.where(k > 2, self.last_rate[codes] - self.prev_rate[codes], 0.0),
+            'first_rate': self.first_rate[codes],
+            'prev_rate': self.prev_rate[codes],
+            'last_rate': self.last_rate[codes],
+            'avg_frequency': sums['frequency'] / n,
+            'avg_batch_size': sums['batch'] / n,
+            'batch_size_std': np.sqrt(self.batch_m2[codes] / n),
+            'avg_regularity': sums['regularity'] / n,
+            'avg_predictability': sums['predictability'] / n,
+            'dominant_pattern': dominant,
+            'pattern_stability': pattern_counts[rows, dominant] / k,
+            'min_rate': self.min_rate[codes],
+            'max_rate': self.max_rate[codes],
+            'q75_rate': quantile(0.75),
+            'q25_rate': quantile(0.25)
+        }
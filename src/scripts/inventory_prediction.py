@@ -4,20 +4,159 @@ import warnings
 from datetime import datetime
 import os
 import sys
+import time
+import json
+import hashlib
+import copy
+import re
+import functools
+import shutil
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 
-# Machine Learning
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.linear_model import LinearRegression, Ridge
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from sklearn.preprocessing import StandardScaler, RobustScaler
-from sklearn.model_selection import train_test_split, cross_val_score
+# Machine learning (scikit-learn) and Excel formatting (openpyxl) are imported
+# inside the stages that use them, so importing this module stays cheap
 
-# Data handling
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+# Published outputs (schema shared with dashboard.py) and stage instrumentation
+import prediction_sinks
+import run_report
+import sheet_stream
+from business_rules import DEFAULT_BUSINESS_RULES, BusinessRuleEngine, load_rules_file
+from feature_accumulator import FeatureAccumulator, row_percentile
+from withdrawal_store import WithdrawalEvents, WithdrawalTensor
 
 warnings.filterwarnings('ignore')
 
+def _fit_estimator(name, estimator, X, y):
+    """Fit one ensemble member; returns (name, model, wall seconds, CPU seconds)"""
+    
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()  # Includes every thread of this worker process
+    estimator.fit(X, y)
+    
+    return name, estimator, time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+def _process_sheet_group(file_path, sheets, settings, record_memory=False):
+    """
+    Read and process (sheet name, month label) sheets of a workbook in a worker process.
+    
+    The worker's system takes the parent's processing settings and opens the
+    workbook once for the whole group. Returns one outcome per sheet (see
+    _sheet_outcome) carrying the log messages, run-report spans (recorded
+    when record_memory, the parent recorder's memory mode, is not False) and
+    business-rule memo entries the sheet produced, so the parent can report
+    and keep every sheet in order as if it had been read there.
+    """
+    
+    system = BatchAwareInventoryPredictionSystem(verbose=False, use_cache=settings['use_cache'],
+                                                 cache_dir=settings['cache_dir'])
+    for name, value in settings.items():
+        setattr(system, name, value)
+    messages = []
+    system.log = messages.append
+    recorder = system.run_recorder = run_report.RunRecorder(enabled=record_memory is not False,
+                                                            memory=record_memory or None)
+    try:
+        engine = system._business_rule_engine()
+    except ValueError:
+        engine = None   # Invalid rules are reported by _apply_business_rules, sheet by sheet
+    
+    outcomes = []
+    workbook = pd.ExcelFile(file_path, engine='openpyxl')
+    try:
+        for sheet_name, month_label in sheets:
+            del messages[:]
+            first_span, first_name = len(recorder.spans), len(engine) if engine is not None else 0
+            outcome = system._sheet_outcome(workbook, sheet_name, month_label)
+            outcome['messages'] = list(messages)
+            outcome['spans'] = [span.as_dict() for span in recorder.spans[first_span:]]
+            if engine is not None:
+                outcome['rule_memo'] = engine.entries(first_name)
+            outcome['in_worker'] = True
+            outcomes.append(outcome)
+    finally:
+        workbook.close()
+    
+    return outcomes
+
+def _row_count(result):
+    """Rows in a stage result (a frame or a dict of frames), or None"""
+    
+    if isinstance(result, dict) and result and all(hasattr(v, 'shape') for v in result.values()):
+        return int(sum(len(v) for v in result.values()))
+    if hasattr(result, 'shape'):
+        return len(result)
+    return None
+
+def _stage(name):
+    """Record the decorated method as a run-report span (rows out = size of its result)"""
+    
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.run_recorder.span(name) as span:
+                result = method(self, *args, **kwargs)
+                span.rows_out = _row_count(result)
+            return result
+        return wrapper
+    return decorate
+
+def _build_random_forest(n_jobs=1):
+    from sklearn.ensemble import RandomForestRegressor
+    
+    return RandomForestRegressor(
+        n_estimators=200,  # Fewer trees for smaller dataset
+        max_depth=15,      # Shallower for batch patterns
+        min_samples_split=2,
+        min_samples_leaf=1,
+        random_state=42,
+        n_jobs=n_jobs
+    )
+
+def _build_gradient_boosting(n_jobs=1):
+    from sklearn.ensemble import GradientBoostingRegressor
+    
+    return GradientBoostingRegressor(
+        n_estimators=150,   # Fewer estimators
+        max_depth=8,        # Shallower trees
+        learning_rate=0.1,  # Slightly higher learning rate
+        min_samples_split=3,
+        random_state=42
+    )
+
+def _build_hist_gradient_boosting(n_jobs=1):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    
+    # Bins each feature once (255 bins), so fit time grows far slower with sample count
+    return HistGradientBoostingRegressor(
+        max_iter=150,
+        max_depth=8,
+        learning_rate=0.1,
+        early_stopping=False,  # Fixed number of stages, like GradientBoosting
+        random_state=42
+    )
+
+def _build_ridge(n_jobs=1):
+    from sklearn.linear_model import Ridge
+    
+    return Ridge(alpha=0.5, random_state=42)  # Lower regularization
+
+def _build_linear_regression(n_jobs=1):
+    from sklearn.linear_model import LinearRegression
+    
+    return LinearRegression()
+
+def _build_standard_scaler():
+    from sklearn.preprocessing import StandardScaler
+    
+    return StandardScaler()
+
+def _build_robust_scaler():
+    from sklearn.preprocessing import RobustScaler
+    
+    return RobustScaler()
+
 class BatchAwareInventoryPredictionSystem:
     """
     Batch-Aware Inventory Prediction System - Handles Periodic/Batch Recording
@@ -26,20 +165,75 @@ class BatchAwareInventoryPredictionSystem:
     where daily columns show stock withdrawals, not actual daily consumption.
     """
     
-    def __init__(self, verbose=True):
+    # Bump whenever a _safe_process_sheet_batch_aware step changes its output
+    PROCESSING_CACHE_VERSION = 3
+    
+    # Settings a sheet worker process copies from the system (see _process_sheet_group)
+    SHEET_WORKER_SETTINGS = (
+        'low_volume_threshold', 'business_rules', 'ingest_column_keywords', 'stream_chunk_rows',
+        'compact_memory', 'compact_text_columns', 'compact_exact_columns', 'keep_daily_withdrawals',
+        'use_cache', 'cache_dir'
+    )
+    
+    # Shared-string cell of a worksheet's XML (<c r="A1" t="s"><v>12</v></c>); group 1 is the string index
+    SHARED_STRING_CELL = re.compile(rb'\bt="s"[^>]*>\s*<(?:\w+:)?v>(\d+)<')
+    
+    # Month (and optional year) in a sheet name: 'Jan 25', ' Mar 25', 'March-2025', 'Sept 2024'
+    MONTH_SHEET_PATTERN = re.compile(
+        r'(?<![a-z])(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|'
+        r'sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)(?![a-z])'
+        r"\.?[\s_\-/']*((?:19|20)?\d{2})?(?!\d)",
+        re.IGNORECASE
+    )
+    MONTH_ABBREVIATIONS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+    
+    # Bump whenever the layout of a saved model artifact changes
+    MODEL_ARTIFACT_VERSION = 1
+    
+    # Bump whenever the layout of a saved item panel (save_panel_state) changes
+    PANEL_STATE_VERSION = 2
+    
+    # Safety-net adjustments, stored per prediction as an Adjustment_Flags bitmask
+    # (rendered in this order as the Adjustments_Applied text on export)
+    ADJUSTMENT_FLAGS = {
+        'irregular_pattern': 1,
+        'single_batch_cap': 2,
+        'zero_prediction': 4,
+        'batch_volatility': 8,
+        'withdrawal_pattern_risk': 16,
+        'critical_buffer': 32,
+        'seasonal_item': 64,
+        'consumption_trend': 128
+    }
+    
+    def __init__(self, verbose=True, use_cache=True, cache_dir=None):
         self.verbose = verbose
         self.models = {}
         self.scalers = {}
         self.feature_importance = {}
         self.monthly_data = {}
         self.training_features = None
+        self.feature_cols = None
+        self.model_scores = {}
+        self.data_hash = None
+        self.month_sheet_hashes = {}    # Content hash of each loaded month's sheet (identifies the workbook)
+        self.item_panel = None
+        self.item_names = None
+        self.panel_months = []      # Month labels of the item panel, in Month_Order
+        self.item_features = None   # Features of every item (training_features keeps Data_Quality > 0.2)
         self.predictions_df = None
         self.performance_metrics = {}
         
-        # Configuration
-        self.sheet_names = ['Jan 25', 'Feb 25', ' Mar 25', ' Apr 25', ' May 25']
-        self.month_labels = ['Jan', 'Feb', 'Mar', 'Apr', 'May']
-        self.prediction_month = 'Jun'
+        # Configuration - month sheets are discovered from the workbook unless sheet_names
+        # is set; history_months keeps only the latest N months (None = every month)
+        self.sheet_names = None
+        self.history_months = None
+        self.prediction_month = None  # pd.Period / 'YYYY-MM'; None = month after the latest loaded
+        
+        # Set by discover_month_sheets
+        self.month_labels = []      # 'Jan 2025', ... in calendar order
+        self.month_periods = {}     # label -> pd.Period
+        self.target_month = None    # pd.Period being predicted
         
         # Production parameters - adjusted for batch recording
         self.outlier_threshold = 1000
@@ -53,17 +247,12 @@ class BatchAwareInventoryPredictionSystem:
             'Jan': 1.0, 'Feb': 0.95, 'Mar': 1.1, 'Apr': 1.05, 'May': 1.0, 'Jun': 0.85
         }
         
-        # Business rules
-        self.business_rules = {
-            "critical_items": ["first aid", "safety", "emergency", "sanitizer"],
-            "seasonal_items": ["ice cream", "hot chocolate", "coconut water"],
-            "category_multipliers": {
-                "HK Chemical": 0.8,
-                "Food Items": 1.2,
-                "Safety Items": 1.1,
-                "Office Supplies": 0.9
-            }
-        }
+        # Business rules - keyword lists are regular expressions; load_business_rules reads them
+        # from a JSON file. The compiled engine memoizes flags per item name (see business_rules.py);
+        # the memo saved under cache_dir keeps the latest rule_memo_max_names names
+        self.business_rules = copy.deepcopy(DEFAULT_BUSINESS_RULES)
+        self._rule_engine = None
+        self.rule_memo_max_names = 200_000
         
         # Batch recording specific parameters
         self.batch_patterns = {
@@ -74,9 +263,145 @@ class BatchAwareInventoryPredictionSystem:
             'Frequent_Small_Batches': {'min_withdrawals': 20, 'max_withdrawals': 31}
         }
         
+        # Ingestion - header keywords of the columns the pipeline reads
+        # (the first four columns are always kept for positional lookups)
+        self.ingest_column_keywords = [
+            'ITEM', 'DESCRIPTION', 'UOM', 'PRICE', 'STOCK', 'CONSUMPTION',
+            'SIH', 'TYPE', 'CATEGORY', 'CONSUMABLE'
+        ]
+        self.sheet_parse_times = {}  # Read + process time per month
+        
+        # Streaming ingestion - month sheets are read with openpyxl's read-only row iterator and
+        # processed stream_chunk_rows rows at a time, so peak memory does not grow with the sheet
+        # (None = read whole sheets with pd.read_excel)
+        self.stream_chunk_rows = 20000
+        
+        # Month sheets missing from the cache are read and processed on ingest_workers processes,
+        # each opening the workbook once (None = one per CPU, 1 = in this process)
+        self.ingest_workers = None
+        
+        # Batch-aware feature columns, in training-feature order
+        self._feature_columns = [
+            'Item_Name', 'UOM', 'Category', 'Price', 'Months_Available',
+            'Avg_Daily_Consumption_Rate', 'Median_Daily_Rate', 'Daily_Rate_Std', 'Daily_Rate_CV',
+            'Seasonal_Adjusted_Daily_Rate', 'Daily_Rate_Trend', 'Recent_Trend',
+            'Recent_Weighted_Daily_Rate', 'Last_Month_Daily_Rate', 'Last_2Months_Avg_Daily_Rate',
+            'Avg_Withdrawal_Frequency', 'Avg_Batch_Size', 'Batch_Size_Variability',
+            'Avg_Withdrawal_Regularity', 'Avg_Consumption_Predictability',
+            'Dominant_Batch_Pattern', 'Batch_Pattern_Stability',
+            'Is_Critical', 'Is_Seasonal', 'Category_Multiplier',
+            'Min_Daily_Rate', 'Max_Daily_Rate', 'Daily_Rate_Range', 'Q75_Daily_Rate', 'Q25_Daily_Rate',
+            'Is_Low_Volume', 'Is_High_Volatility', 'Is_Single_Batch_Item', 'Is_Frequent_Small_Batch',
+            'Data_Quality', 'Growth_Rate', 'Recent_vs_Historical', 'Momentum',
+            'Withdrawal_Pattern_Risk', 'Batch_Size_Risk'
+        ]
+        
+        # Item x month panel - columns kept and how duplicate item rows are merged
+        self.panel_columns = [
+            'Item_Name', 'UOM', 'Category', 'Price', 'Opening_Stock', 'Month_Num',
+            'Total_Monthly_Consumption', 'Withdrawal_Events', 'Average_Batch_Size',
+            'Estimated_Daily_Consumption_Rate', 'Withdrawal_Regularity',
+            'Consumption_Predictability', 'Batch_Consumption_Pattern',
+            'Withdrawal_Frequency_Category', 'Is_Critical', 'Is_Seasonal', 'Category_Multiplier'
+        ]
+        self.panel_aggregation = {
+            'Item_Name': 'first', 'UOM': 'first', 'Category': 'first', 'Month': 'first',
+            'Month_Num': 'first', 'Price': 'mean', 'Opening_Stock': 'sum',
+            'Total_Monthly_Consumption': 'sum', 'Withdrawal_Events': 'sum',
+            'Estimated_Daily_Consumption_Rate': 'sum', 'Withdrawal_Regularity': 'mean',
+            'Consumption_Predictability': 'mean', 'Batch_Consumption_Pattern': 'first',
+            'Withdrawal_Frequency_Category': 'first', 'Is_Critical': 'max',
+            'Is_Seasonal': 'max', 'Category_Multiplier': 'mean'
+        }
+        
+        # Compact memory mode: categorical text, int8 flags and float32 for the monthly frames' other
+        # float columns, with the day columns dropped once the derived metrics exist. Metrics that
+        # feed the item panel (and so the features) stay float64, so predictions are unchanged.
+        self.compact_memory = False
+        self.compact_text_columns = [
+            'UOM', 'Category', 'Month', 'Batch_Consumption_Pattern',
+            'Withdrawal_Frequency_Category', 'Dominant_Batch_Pattern'
+        ]
+        self.compact_exact_columns = [  # Float columns kept at float64
+            'Price', 'Opening_Stock', 'Total_Monthly_Consumption', 'Average_Batch_Size',
+            'Estimated_Daily_Consumption_Rate', 'Withdrawal_Regularity', 'Consumption_Predictability',
+            'Category_Multiplier'
+        ]
+        
+        # Daily withdrawal store - keeps the raw day columns as a memory-mapped (items, months, 31)
+        # tensor (see withdrawal_store.py) under withdrawal_store_dir (None = <cache_dir>/withdrawals)
+        self.keep_daily_withdrawals = False
+        self.withdrawal_store_dir = None
+        self.withdrawals = None
+        self._daily_withdrawals = {}
+        
+        # Saved item panel for append_month - one Parquet file per month plus the item features
+        # and a state.json with each month's sheet content hash, which append_month checks the
+        # workbook against (None = <save_path>/batch_aware_panel)
+        self.panel_state_dir = None
+        
+        # Processed-sheet cache (Parquet, keyed by sheet content + config), with the months' daily
+        # withdrawals, withdrawal stores and business-rule memos under one LRU budget of entries
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir or os.path.join(
+            os.path.expanduser("~"), ".cache", "batch_inventory_prediction"
+        )
+        self.cache_max_entries = 120
+        
         # Setup save directory
         self.setup_directories()
         
+        # CPU cores shared by the ensemble members while training
+        self.training_cpu_budget = os.cpu_count() or 1
+        self.model_fit_stats = {}
+        
+        # Walk-forward feature state - rates kept per item for exact median/quantiles; longer
+        # histories switch to a compacted quantile sketch (see feature_accumulator.py)
+        self.feature_quantile_points = 64
+        
+        # Estimator registry - how each ensemble member is built, preprocessed, scheduled,
+        # predicted and weighted. fit_cost orders the fits (longest first); a member with
+        # n_jobs=True gets the cores the other workers leave free. weight_multipliers apply
+        # per batch pattern / predictability band in _calculate_batch_aware_weights.
+        self.preprocessors = {'standard': _build_standard_scaler, 'robust': _build_robust_scaler}
+        self.estimator_registry = {}
+        self.register_estimator('RandomForest', _build_random_forest, fit_cost=3, n_jobs=True, weight=0.35,
+                                weight_multipliers={'regular': 0.95, 'irregular': 1.2, 'low_predictability': 1.15})
+        self.register_estimator('GradientBoosting', _build_gradient_boosting, fit_cost=3, weight=0.35,
+                                weight_multipliers={'irregular': 1.15, 'frequent': 1.2, 'low_predictability': 1.1})
+        self.register_estimator('HistGradientBoosting', _build_hist_gradient_boosting, fit_cost=1, weight=0.35,
+                                weight_multipliers={'irregular': 1.15, 'frequent': 1.2, 'low_predictability': 1.1})
+        self.register_estimator('Ridge', _build_ridge, preprocessing='standard', fit_cost=0.1, weight=0.15,
+                                weight_multipliers={'regular': 1.3, 'irregular': 0.8, 'frequent': 1.1,
+                                                    'high_predictability': 1.2})
+        self.register_estimator('LinearRegression', _build_linear_regression, preprocessing='robust',
+                                fit_cost=0.1, weight=0.15,
+                                weight_multipliers={'regular': 1.2, 'high_predictability': 1.15})
+        
+        # Members trained by train_production_models (swap GradientBoosting for
+        # HistGradientBoosting on large catalogs - it fits in a fraction of the time)
+        self.ensemble_members = ['RandomForest', 'GradientBoosting', 'Ridge', 'LinearRegression']
+        
+        # Excel report - styled sheets, header colours and when to stream rows
+        # (None = constant-memory writer once a sheet exceeds excel_constant_memory_rows)
+        self.excel_formatted_sheets = ['Batch_Aware_Predictions', 'Executive_Summary', 'Risk_Analysis']
+        self.excel_header_color = '2F4F4F'
+        self.excel_header_font_color = 'FFFFFF'
+        self.excel_constant_memory = None
+        self.excel_constant_memory_rows = 10000
+        
+        # Machine-readable outputs - formats published by publish_outputs (None = save_path)
+        self.output_formats = ['parquet', 'csv']
+        self.output_dir = None
+        
+        # Trained model artifacts
+        self.model_dir = os.path.join(self.save_path, "batch_aware_models")
+        self.model_artifact_path = None
+        
+        # Run report - stage spans (wall, CPU, peak memory, rows); disabled spans cost nothing
+        self.run_recorder = run_report.RunRecorder(enabled=False)
+        self.run_report_path = None  # None = run_report_<timestamp>.json next to the published outputs
+        
     def setup_directories(self):
         """Setup save directories"""
         self.downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
@@ -89,6 +414,138 @@ class BatchAwareInventoryPredictionSystem:
             timestamp = datetime.now().strftime("%H:%M:%S")
             print(f"[{timestamp}] 🔄 {message}")
     
+    def _workbook_sheet_names(self, file_path):
+        """Sheet names of an .xlsx workbook, read from its manifest without parsing any sheet"""
+        
+        with zipfile.ZipFile(file_path) as archive:
+            root = ET.fromstring(archive.read('xl/workbook.xml'))
+        
+        return [sheet.get('name') for sheet in root.iter() if sheet.tag.endswith('}sheet')]
+    
+    def _parse_sheet_month(self, sheet_name):
+        """(month number, year or None) named by a sheet, or None for non-month sheets"""
+        
+        match = self.MONTH_SHEET_PATTERN.search(sheet_name)
+        if not match:
+            return None
+        
+        month = self.MONTH_ABBREVIATIONS.index(match.group(1)[:3].lower()) + 1
+        year = match.group(2)
+        if year is None:
+            # Also accept the year in front ('2025 Apr')
+            leading = re.search(r'(?<!\d)((?:19|20)\d{2})(?!\d)', sheet_name)
+            year = leading.group(1) if leading else None
+        if year is not None:
+            year = int(year) + (2000 if len(year) == 2 else 0)
+        
+        return month, year
+    
+    def _infer_sheet_years(self, parsed, after=None):
+        """
+        Fill in the years of sheets named without one, from workbook order.
+        
+        A month number lower than the previous sheet's starts a new year, so
+        ['Nov', 'Dec', 'Jan', 'Feb'] spans two years. The last sheet falls in the
+        current year, or with `after` (a period) in the first year that puts it
+        after that month. Sheets that name a year are passed through.
+        """
+        
+        yearless = [month for _, (month, year) in parsed if year is None]
+        if not yearless:
+            return parsed
+        
+        rollovers = sum(1 for previous, month in zip(yearless, yearless[1:]) if month < previous)
+        if after is None:
+            last_year = datetime.now().year
+        else:
+            last_year = after.year + (1 if yearless[-1] <= after.month else 0)
+        
+        year = last_year - rollovers
+        previous = None
+        inferred = []
+        for sheet_name, (month, sheet_year) in parsed:
+            if sheet_year is None:
+                if previous is not None and month < previous:
+                    year += 1
+                previous = month
+                sheet_year = year
+            inferred.append((sheet_name, (month, sheet_year)))
+        
+        if rollovers:
+            self.log(f"🗓️ Sheet names carry no year - read them as {last_year - rollovers} .. {last_year} "
+                     f"from workbook order")
+        
+        return inferred
+    
+    def discover_month_sheets(self, file_path):
+        """
+        Pick the monthly sheets to load and derive the month being predicted.
+        
+        Month and year are parsed from the sheet names (self.sheet_names when set,
+        otherwise every sheet of the workbook). Sheets without a year are only used
+        when no sheet names one; then the years are inferred from workbook order
+        (_infer_sheet_years). A month listed by several sheets keeps the first. The latest self.history_months months are
+        kept, in calendar order.
+        """
+        
+        sheet_names = self.sheet_names if self.sheet_names is not None else self._workbook_sheet_names(file_path)
+        
+        parsed = [(sheet_name, self._parse_sheet_month(sheet_name)) for sheet_name in sheet_names]
+        parsed = [(sheet_name, month_year) for sheet_name, month_year in parsed if month_year is not None]
+        has_years = any(year is not None for _, (_, year) in parsed)
+        if not has_years:
+            parsed = self._infer_sheet_years(parsed)
+        
+        periods = {}
+        for sheet_name, (month, year) in parsed:
+            if year is None:
+                self.log(f"⚠️ Skipping sheet '{sheet_name}' - no year in its name")
+                continue
+            
+            period = pd.Period(year=year, month=month, freq='M')
+            if period in periods:
+                self.log(f"⚠️ Skipping sheet '{sheet_name}' - {period.strftime('%b %Y')} "
+                         f"already read from '{periods[period]}'")
+                continue
+            periods[period] = sheet_name
+        
+        months = sorted(periods)
+        if self.history_months:
+            months = months[-self.history_months:]
+        
+        self.month_periods = {period.strftime('%b %Y'): period for period in months}
+        self.month_labels = list(self.month_periods)
+        
+        if self.prediction_month is not None:
+            self.target_month = pd.Period(self.prediction_month, freq='M')
+        elif months:
+            self.target_month = months[-1] + 1
+        
+        if months:
+            self.log(f"🗓️ {len(months)} month sheets: {self.month_labels[0]} .. {self.month_labels[-1]} "
+                     f"-> predicting {self.target_month.strftime('%b %Y')}")
+        
+        return [(periods[period], period.strftime('%b %Y')) for period in months]
+    
+    def _month_name(self, label):
+        """Month abbreviation ('Jan') of a month label, as used by seasonal_factors"""
+        
+        period = self.month_periods.get(label)
+        return period.strftime('%b') if period is not None else str(label)[:3]
+    
+    def _target_month_name(self):
+        """Full name of the month being predicted ('June'), or 'the target month' when unknown"""
+        
+        return self.target_month.strftime('%B') if self.target_month is not None else 'the target month'
+    
+    def _target_seasonal_factor(self):
+        """Seasonal factor of the month being predicted"""
+        
+        if self.target_month is None:
+            return self.seasonal_factors.get('Jun', 0.85)
+        return self.seasonal_factors.get(self.target_month.strftime('%b'), 1.0)
+    
+    @_stage('ingest')
     def load_and_process_data(self, file_path):
         """Load and process data with batch recording awareness"""
         
@@ -97,80 +554,531 @@ class BatchAwareInventoryPredictionSystem:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"❌ File not found: {file_path}")
         
-        success_count = 0
-        total_items = 0
+        self.sheet_parse_times = {}
         
-        for i, sheet_name in enumerate(self.sheet_names):
-            month_label = self.month_labels[i]
-            self.log(f"Processing {month_label} 2025 from sheet '{sheet_name}'...")
+        self.data_hash = self._workbook_hash(file_path)
+        use_cache = self.cache_enabled()
+        
+        month_sheets = self.discover_month_sheets(file_path)
+        sheet_hashes = self._sheet_content_hashes(file_path)
+        self.month_sheet_hashes = {month_label: sheet_hashes[sheet_name] for sheet_name, month_label in month_sheets}
+        self.monthly_data = {}
+        frames = {}
+        
+        # A missing withdrawal store is assembled from each month's saved withdrawals; only
+        # months without them (or without a cached frame) are parsed again
+        self._daily_withdrawals = {}
+        store_path = self._withdrawal_store_path(month_sheets, sheet_hashes) if self.keep_daily_withdrawals else None
+        capture_withdrawals = store_path is not None and not WithdrawalTensor.exists(store_path)
+        
+        # Reuse the processed frames of sheets seen before; the others are read below
+        pending = []
+        cache_paths = {}
+        for sheet_name, month_label in month_sheets:
+            if use_cache:
+                cache_paths[month_label] = self._sheet_cache_path(sheet_hashes[sheet_name], month_label)
             
-            try:
-                # Read Excel sheet with error handling
-                try:
-                    df = pd.read_excel(file_path, sheet_name=sheet_name, skiprows=1)
-                except Exception as e:
-                    self.log(f"❌ Cannot read sheet '{sheet_name}': {e}")
-                    continue
-                
-                if df.empty:
-                    self.log(f"⚠️ Empty sheet: {month_label}")
+            if cache_paths.get(month_label):
+                with self.run_recorder.span('cache_load', sheet=sheet_name, month=month_label) as span:
+                    withdrawals = self._load_cached_withdrawals(cache_paths[month_label]) \
+                        if capture_withdrawals else None
+                    processed_df = None if capture_withdrawals and withdrawals is None \
+                        else self._load_cached_sheet(cache_paths[month_label], month_label)
+                    span.rows_out = None if processed_df is None else len(processed_df)
+                if processed_df is not None:
+                    self.log(f"Processing {month_label} from sheet '{sheet_name}'... (cached)")
+                    frames[month_label] = processed_df
+                    if withdrawals is not None:
+                        self._daily_withdrawals[month_label] = withdrawals
                     continue
-                
-                self.log(f"📊 Raw data shape: {df.shape}")
-                
-                # Clean and process with batch awareness
-                processed_df = self._safe_process_sheet_batch_aware(df, month_label)
-                
-                if processed_df is not None and len(processed_df) > 0:
-                    self.monthly_data[month_label] = processed_df
-                    success_count += 1
-                    total_items += len(processed_df)
-                    self.log(f"✅ {month_label}: {len(processed_df)} items processed (batch-aware)")
-                else:
-                    self.log(f"⚠️ No valid data processed for {month_label}")
-                
-            except Exception as e:
-                self.log(f"❌ Error processing {month_label}: {str(e)}")
-                if self.verbose:
-                    import traceback
-                    print(traceback.format_exc())
+            pending.append((sheet_name, month_label))
+        
+        # Read, clean and process the remaining sheets with batch awareness
+        for outcome in self._month_sheet_outcomes(file_path, pending):
+            sheet_name, month_label = outcome['sheet'], outcome['month']
+            for message in outcome['messages']:
+                self.log(message)
+            if outcome['in_worker']:
+                self.run_recorder.replay(outcome['spans'], worker='process')
+                if outcome['rule_memo'] and outcome['rule_memo'][0]:
+                    # Names a worker matched join this process' memo, saved below
+                    self._business_rule_engine().merge(*outcome['rule_memo'])
+            
+            if outcome['error']:
+                self.log(outcome['error'])
+                continue
+            
+            self.sheet_parse_times[month_label] = outcome['seconds']
+            self.log(f"⏱️ Read sheet '{sheet_name}' ({outcome['rows_read']:,} rows) in {outcome['seconds']:.2f}s")
+            if outcome['withdrawals'] is not None:
+                self._daily_withdrawals[month_label] = outcome['withdrawals']
+                if cache_paths.get(month_label):
+                    self._store_cached_withdrawals(cache_paths[month_label], outcome['withdrawals'])
+            
+            if outcome['rows_read'] == 0:
+                self.log(f"⚠️ Empty sheet: {month_label}")
                 continue
+            
+            processed_df = outcome['frame']
+            if processed_df is not None and len(processed_df) > 0:
+                frames[month_label] = processed_df
+                self.log(f"✅ {month_label}: {len(processed_df)} items processed (batch-aware)")
+                if cache_paths.get(month_label):
+                    self._store_cached_sheet(cache_paths[month_label], processed_df)
+            else:
+                self.log(f"⚠️ No valid data processed for {month_label}")
+        
+        # Months in calendar order, however the sheets were read
+        self.monthly_data = {label: frames[label] for _, label in month_sheets if label in frames}
+        success_count = len(self.monthly_data)
+        total_items = sum(len(df) for df in self.monthly_data.values())
+        
+        if use_cache:
+            self._evict_cache()
+        
+        self._save_business_rule_memo()
+        
+        if self.sheet_parse_times:
+            self.log(f"⏱️ Total sheet read time: {sum(self.sheet_parse_times.values()):.2f}s "
+                     f"for {len(self.sheet_parse_times)} sheets")
         
         if success_count < 2:
             raise ValueError(f"❌ Insufficient data loaded. Need ≥2 months, got {success_count}")
         
         self.log(f"✅ Successfully loaded {success_count} months with {total_items} total items")
         self.log("🎯 Data interpreted as BATCH/PERIODIC WITHDRAWALS, not daily consumption")
+        
+        if store_path is not None:
+            if capture_withdrawals:
+                with self.run_recorder.span('withdrawal_store'):
+                    months = [(label, self.month_periods[label]) for _, label in month_sheets]
+                    WithdrawalTensor.build(store_path, months, self._daily_withdrawals,
+                                           metadata={'data_hash': self.data_hash, 'workbook': os.path.basename(file_path)})
+                self._daily_withdrawals = {}
+                if use_cache:
+                    self._evict_cache()
+            self.load_withdrawal_store(store_path)
+        
+        self.build_item_panel()
+        self._log_memory_footprint('loading')
         return self.monthly_data
     
-    def _safe_process_sheet_batch_aware(self, df, month_label):
-        """Safely process a single sheet with batch recording awareness"""
+    def cache_enabled(self):
+        """Check whether the processed-sheet cache can be used"""
+        
+        if not self.use_cache:
+            return False
         
         try:
-            # Step 1: Basic cleaning
-            df = df.dropna(how='all').copy()
-            df.columns = [str(col).strip() for col in df.columns]
-            
-            # Step 2: Filter valid rows
-            df = self._filter_valid_rows(df)
-            
-            if len(df) == 0:
-                return None
-            
-            # Step 3: Standardize columns
-            df = self._standardize_columns(df, month_label)
+            import pyarrow  # noqa: F401 - Parquet engine
+            return True
+        except ImportError:
+            self.log("⚠️ pyarrow not installed - processed-sheet cache disabled")
+            self.use_cache = False
+            return False
+    
+    def _workbook_hash(self, file_path):
+        """SHA-256 of the workbook contents"""
+        
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        
+        return digest.hexdigest()
+    
+    def _sheet_content_hashes(self, file_path):
+        """
+        SHA-256 of each sheet's contents: its worksheet XML, the shared strings
+        it uses and the workbook styles, read from the .xlsx archive without
+        parsing cells. A sheet keeps its hash when other sheets are added or
+        edited, so caches keyed by it survive a workbook growing month by month.
+        Falls back to the workbook hash (plus the sheet name) when the archive
+        cannot be read this way.
+        """
+        
+        relationship_id = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+        hashes = {}
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                parts = set(archive.namelist())
+                rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+                targets = {rel.get('Id'): rel.get('Target') for rel in rels}
+                strings = []
+                if 'xl/sharedStrings.xml' in parts:
+                    shared = ET.fromstring(archive.read('xl/sharedStrings.xml'))
+                    strings = [''.join(t.text or '' for t in item.iter() if t.tag.endswith('}t'))
+                               for item in shared if item.tag.endswith('}si')]
+                styles = archive.read('xl/styles.xml') if 'xl/styles.xml' in parts else b''
+                
+                for sheet in ET.fromstring(archive.read('xl/workbook.xml')).iter():
+                    if not sheet.tag.endswith('}sheet'):
+                        continue
+                    target = targets[sheet.get(relationship_id)]
+                    xml = archive.read(target.lstrip('/') if target.startswith('/') else f"xl/{target}")
+                    
+                    digest = hashlib.sha256(xml)
+                    digest.update(hashlib.sha256(styles).digest())
+                    references = self.SHARED_STRING_CELL.findall(xml)
+                    if len(references) == xml.count(b't="s"'):
+                        for index in references:
+                            digest.update(strings[int(index)].encode('utf-8') + b'\0')
+                    else:
+                        # Unrecognised cell layout: depend on every shared string
+                        digest.update(archive.read('xl/sharedStrings.xml'))
+                    hashes[sheet.get('name')] = digest.hexdigest()
+            return hashes
+        except (KeyError, ValueError, IndexError, zipfile.BadZipFile, ET.ParseError) as e:
+            self.log(f"⚠️ Keying cached sheets by the whole workbook ({e})")
+            names = self.sheet_names if self.sheet_names is not None else self._workbook_sheet_names(file_path)
+            return {name: hashlib.sha256(f"{self.data_hash}/{name}".encode('utf-8')).hexdigest() for name in names}
+    
+    def _processing_config_hash(self, month_label):
+        """Hash of every setting that changes a processed month frame"""
+        
+        config = {
+            'version': self.PROCESSING_CACHE_VERSION,
+            'month_label': month_label,
+            'low_volume_threshold': self.low_volume_threshold,
+            'business_rules': self.business_rules,
+            'ingest_column_keywords': self.ingest_column_keywords,
+            'compact_memory': self.compact_memory
+        }
+        if self.compact_memory:
+            config['compact_columns'] = [self.compact_text_columns, self.compact_exact_columns]
+        payload = json.dumps(config, sort_keys=True, default=str).encode('utf-8')
+        
+        return hashlib.sha256(payload).hexdigest()[:16]
+    
+    def _sheet_cache_path(self, sheet_hash, month_label):
+        """Cache file for one processed sheet (its daily withdrawals go next to it, see _withdrawals_cache_path)"""
+        
+        config_key = self._processing_config_hash(month_label)
+        
+        return os.path.join(self.cache_dir, f"{sheet_hash[:24]}_{config_key}.parquet")
+    
+    @staticmethod
+    def _withdrawals_cache_path(cache_path):
+        return cache_path[:-len('.parquet')] + '.withdrawals.npz'
+    
+    def _load_cached_withdrawals(self, cache_path):
+        """A month's saved (item names, n x 31 withdrawals), or None on a miss"""
+        
+        path = self._withdrawals_cache_path(cache_path)
+        if not os.path.exists(path):
+            return None
+        
+        try:
+            with np.load(path) as saved:
+                withdrawals = saved['names'].astype(object), saved['matrix']
+            os.utime(path)  # Mark as recently used for eviction
+            return withdrawals
+        except Exception as e:
+            self.log(f"⚠️ Ignoring unreadable cache entry {os.path.basename(path)}: {e}")
+            return None
+    
+    def _store_cached_withdrawals(self, cache_path, withdrawals):
+        """Save a month's daily withdrawals next to its processed frame (write-then-rename)"""
+        
+        path = self._withdrawals_cache_path(cache_path)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        names, matrix = withdrawals
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez(tmp_path, names=np.asarray(names, dtype=str), matrix=matrix)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.log(f"⚠️ Could not cache daily withdrawals: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _load_cached_sheet(self, cache_path, month_label):
+        """Load a processed month frame from the cache, or None on a miss"""
+        
+        if not os.path.exists(cache_path):
+            return None
+        
+        try:
+            load_start = time.perf_counter()
+            df = pd.read_parquet(cache_path)
+            os.utime(cache_path)  # Mark as recently used for eviction
+            self.log(f"⚡ {month_label}: {len(df)} items loaded from cache "
+                     f"in {(time.perf_counter() - load_start) * 1000:.0f}ms")
+            return df
+        except Exception as e:
+            self.log(f"⚠️ Ignoring unreadable cache entry {os.path.basename(cache_path)}: {e}")
+            return None
+    
+    def _store_cached_sheet(self, cache_path, df):
+        """Write a processed month frame to the cache (write-then-rename)"""
+        
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            self.log(f"⚠️ Could not cache processed sheet: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _cache_entries(self):
+        """
+        Evictable cache entries: processed sheets and their daily withdrawals,
+        withdrawal store directories and business-rule memos (in-progress
+        .tmp files and directories excluded)
+        """
+        
+        def listed(directory, keep):
+            try:
+                return [os.path.join(directory, name) for name in os.listdir(directory)
+                        if '.tmp' not in name and keep(name)]
+            except OSError:
+                return []
+        
+        store_dir = self.withdrawal_store_dir or os.path.join(self.cache_dir, 'withdrawals')
+        return (
+            listed(self.cache_dir, lambda name: name.endswith(('.parquet', '.withdrawals.npz')))
+            + listed(store_dir, lambda name: WithdrawalTensor.exists(os.path.join(store_dir, name)))
+            + listed(os.path.join(self.cache_dir, 'business_rules'), lambda name: name.endswith('.json'))
+        )
+    
+    def _evict_cache(self):
+        """Drop least recently used cache entries beyond cache_max_entries"""
+        
+        def last_used(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0.0
+        
+        entries = sorted(self._cache_entries(), key=last_used, reverse=True)
+        for stale_path in entries[self.cache_max_entries:]:
+            try:
+                if os.path.isdir(stale_path):
+                    shutil.rmtree(stale_path)
+                else:
+                    os.remove(stale_path)
+            except OSError:
+                pass
+    
+    def _read_pipeline_columns(self, workbook, sheet_name):
+        """Read only the columns the pipeline uses from an open workbook"""
+        
+        header = workbook.parse(sheet_name, skiprows=1, nrows=0).columns
+        usecols = [
+            i for i, col in enumerate(header)
+            if i < 4 or self._is_pipeline_column(col)
+        ]
+        
+        return workbook.parse(sheet_name, skiprows=1, usecols=usecols)
+    
+    def _is_pipeline_column(self, col):
+        """Check whether a header is an item, UOM, price, stock or day (1-31) column"""
+        
+        col_str = str(col).strip().upper()
+        
+        if col_str.isdigit():
+            return 1 <= int(col_str) <= 31
+        
+        return any(keyword in col_str for keyword in self.ingest_column_keywords)
+    
+    def _month_sheet_outcomes(self, file_path, sheets):
+        """
+        Read and process (sheet name, month label) sheets; yields one outcome per sheet, in order.
+        
+        With ingest_workers above one (None = one per CPU) the sheets are dealt
+        round-robin to worker processes (_process_sheet_group), each opening the
+        workbook once; otherwise, or when the pool fails, they are read here
+        from a single workbook handle.
+        """
+        
+        workers = max(1, min(len(sheets), self.ingest_workers or os.cpu_count() or 1))
+        if workers > 1:
+            outcomes = None
+            settings = {name: getattr(self, name) for name in self.SHEET_WORKER_SETTINGS}
+            self.log(f"Reading {len(sheets)} month sheets on {workers} worker processes...")
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    record_memory = self.run_recorder.memory if self.run_recorder.enabled else False
+                    futures = [pool.submit(_process_sheet_group, file_path, sheets[i::workers], settings,
+                                           record_memory)
+                               for i in range(workers)]
+                    outcomes = {(outcome['sheet'], outcome['month']): outcome
+                                for future in futures for outcome in future.result()}
+            except Exception as e:
+                self.log(f"⚠️ Parallel sheet processing failed ({e}) - falling back to sequential reads")
             
-            # Step 4: Extract BATCH/WITHDRAWAL data (CORRECTED)
-            df = self._extract_batch_withdrawal_data(df, month_label)
+            if outcomes is not None:
+                for sheet in sheets:
+                    yield outcomes[sheet]
+                return
+        
+        workbook = None
+        try:
+            for sheet_name, month_label in sheets:
+                # Open the workbook once and parse every month sheet from the same handle
+                if workbook is None:
+                    try:
+                        open_start = time.perf_counter()
+                        workbook = pd.ExcelFile(file_path, engine='openpyxl')
+                        self.log(f"📂 Workbook opened in {time.perf_counter() - open_start:.2f}s")
+                    except Exception as e:
+                        if self.verbose:
+                            import traceback
+                            print(traceback.format_exc())
+                        yield self._sheet_outcome(None, sheet_name, month_label,
+                                                  error=f"❌ Error processing {month_label}: {str(e)}")
+                        continue
+                
+                yield self._sheet_outcome(workbook, sheet_name, month_label)
+        finally:
+            if workbook is not None:
+                workbook.close()
+    
+    def _sheet_outcome(self, workbook, sheet_name, month_label, error=None):
+        """
+        Read and process one month sheet of an open workbook.
+        
+        Returns a dict with the processed frame (or None), rows read, wall
+        seconds, the read error message (None when the sheet could be read)
+        and the captured daily withdrawals when keep_daily_withdrawals is set.
+        """
+        
+        outcome = {'sheet': sheet_name, 'month': month_label, 'frame': None, 'rows_read': 0,
+                   'seconds': 0.0, 'error': error, 'withdrawals': None,
+                   'messages': [], 'spans': [], 'rule_memo': None, 'in_worker': False}
+        if error is not None:
+            return outcome
+        
+        self.log(f"Processing {month_label} from sheet '{sheet_name}'...")
+        wall_start = time.perf_counter()
+        try:
+            outcome['frame'], outcome['rows_read'] = self._parse_month_sheet(workbook, sheet_name, month_label)
+        except Exception as e:
+            outcome['error'] = f"❌ Cannot read sheet '{sheet_name}': {e}"
+        outcome['seconds'] = time.perf_counter() - wall_start
+        outcome['withdrawals'] = self._daily_withdrawals.pop(month_label, None)
+        
+        return outcome
+    
+    def _parse_month_sheet(self, workbook, sheet_name, month_label):
+        """Read and process one month sheet of an open workbook; (processed frame or None, rows read)"""
+        
+        if self.stream_chunk_rows:
+            with self.run_recorder.span('stream', sheet=sheet_name, month=month_label) as span:
+                processed_df, rows_read = self._stream_month_sheet(workbook.book[sheet_name], month_label)
+                span.rows_in = rows_read
+                span.rows_out = 0 if processed_df is None else len(processed_df)
+            return processed_df, rows_read
+        
+        with self.run_recorder.span('parse', sheet=sheet_name, month=month_label) as span:
+            df = self._read_pipeline_columns(workbook, sheet_name)
+            span.rows_out = len(df)
+        if df.empty:
+            return None, 0
+        
+        self.log(f"📊 Raw data shape: {df.shape}")
+        return self._safe_process_sheet_batch_aware(df, month_label), len(df)
+    
+    def _stream_month_sheet(self, worksheet, month_label):
+        """
+        Read and process a month sheet chunk by chunk; (processed frame or None, rows read).
+        
+        Rows arrive from sheet_stream.iter_sheet_chunks (pipeline columns only)
+        and every chunk is cleaned, filtered and run through the processing
+        steps on its own, so only processed rows are held - without their day
+        columns in compact memory mode. Valid rows are chosen as in
+        _filter_valid_rows: rows with a serial number once any row has one,
+        else rows with anything in the first column, else every row; rows kept
+        under a weaker rule are dropped as soon as a stronger one applies.
+        """
+        
+        # Cleaning, row filtering, withdrawal capture and compaction are done here, across chunks
+        streamed = {'basic_cleaning', 'filter_valid_rows', 'capture_withdrawals', 'compact_dtypes'}
+        steps = [(name, step) for name, step in self._processing_steps(month_label) if name not in streamed]
+        row_rules = [self._serial_rows, self._labelled_rows,
+                     lambda first_col: pd.Series(True, index=first_col.index)]
+        
+        rows_read = 0
+        rule, parts, captured = None, [], []
+        for chunk in sheet_stream.iter_sheet_chunks(
+                worksheet, lambda i, col: i < 4 or self._is_pipeline_column(col), chunk_rows=self.stream_chunk_rows):
+            rows_read += len(chunk)
+            chunk = self._basic_cleaning(chunk)
+            if chunk.empty:
+                continue
             
-            # Step 5: Calculate BATCH patterns (CORRECTED)
-            df = self._calculate_batch_patterns(df)
+            # Strongest row rule this chunk satisfies (the last one keeps every row)
+            first_col = chunk.iloc[:, 0]
+            for chunk_rule, rows in enumerate(row_rules):
+                mask = rows(first_col)
+                if mask.any():
+                    break
+            if rule is not None and chunk_rule > rule:
+                continue
+            if rule is None or chunk_rule < rule:
+                rule, parts, captured = chunk_rule, [], []
             
-            # Step 6: Apply business rules
-            df = self._apply_business_rules(df)
+            processed = self._safe_process_sheet_batch_aware(chunk[mask].copy(), month_label, steps)
+            if processed is None:
+                return None, rows_read
+            if len(processed) == 0:
+                continue
             
-            # Step 7: Final cleaning
-            df = self._final_cleaning(df)
+            if self.keep_daily_withdrawals:
+                captured.append(self._daily_withdrawal_matrix(processed))
+            if self.compact_memory:
+                processed = processed.drop(columns=[col for col in processed.columns if str(col).strip().isdigit()])
+            parts.append(processed)
+        
+        if not parts:
+            return None, rows_read
+        
+        df = pd.concat(parts) if len(parts) > 1 else parts[0]
+        if captured:
+            self._daily_withdrawals[month_label] = (
+                np.concatenate([names for names, _ in captured]),
+                np.concatenate([matrix for _, matrix in captured])
+            )
+        if self.compact_memory:
+            df = self._compact_dtypes(df)
+        
+        return df, rows_read
+    
+    def _processing_steps(self, month_label):
+        """(name, function) processing steps of a month sheet, in order"""
+        
+        # Withdrawal extraction and batch patterns are the CORRECTED steps
+        steps = [
+            ('basic_cleaning', self._basic_cleaning),
+            ('filter_valid_rows', self._filter_valid_rows),
+            ('standardize_columns', lambda df: self._standardize_columns(df, month_label)),
+            ('extract_withdrawals', lambda df: self._extract_batch_withdrawal_data(df, month_label)),
+            ('batch_patterns', self._calculate_batch_patterns),
+            ('business_rules', self._apply_business_rules),
+            ('final_cleaning', self._final_cleaning)
+        ]
+        if self.keep_daily_withdrawals:
+            steps.append(('capture_withdrawals', lambda df: self._capture_daily_withdrawals(df, month_label)))
+        if self.compact_memory:
+            steps.append(('compact_dtypes', self._compact_month_frame))
+        return steps
+    
+    def _safe_process_sheet_batch_aware(self, df, month_label, steps=None):
+        """Safely process a single sheet with batch recording awareness (steps default to _processing_steps)"""
+        
+        steps = steps or self._processing_steps(month_label)
+        try:
+            with self.run_recorder.span('process', rows_in=len(df), month=month_label) as process_span:
+                for step_name, step in steps:
+                    with self.run_recorder.span(step_name, rows_in=len(df)) as span:
+                        df = step(df)
+                        span.rows_out = len(df)
+                    
+                    if len(df) == 0 and step_name == 'filter_valid_rows':
+                        return None
+                process_span.rows_out = len(df)
             
             return df
             
@@ -178,6 +1086,103 @@ class BatchAwareInventoryPredictionSystem:
             self.log(f"❌ Error in _safe_process_sheet_batch_aware for {month_label}: {e}")
             return None
     
+    def _capture_daily_withdrawals(self, df, month_label):
+        """Keep a month's (item names, n x 31 withdrawals) for the withdrawal store"""
+        
+        self._daily_withdrawals[month_label] = self._daily_withdrawal_matrix(df)
+        return df
+    
+    @staticmethod
+    def _daily_withdrawal_matrix(df):
+        """(item names, n x 31 float32 withdrawals) of a processed frame"""
+        
+        matrix = np.zeros((len(df), 31), dtype=np.float32)
+        for col in df.columns:
+            col_str = str(col).strip()
+            if col_str.isdigit() and 1 <= int(col_str) <= 31:
+                matrix[:, int(col_str) - 1] = pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy()
+        
+        return df['Item_Name'].to_numpy(dtype=object), matrix
+    
+    def _withdrawal_store_path(self, month_sheets, sheet_hashes):
+        """Store directory for these months' sheet contents and the processing config"""
+        
+        months = [(month_label, str(self.month_periods[month_label]), sheet_hashes[sheet_name])
+                  for sheet_name, month_label in month_sheets]
+        key = json.dumps([months, self._processing_config_hash(None)], default=str)
+        store_dir = self.withdrawal_store_dir or os.path.join(self.cache_dir, 'withdrawals')
+        return os.path.join(store_dir, hashlib.sha256(key.encode('utf-8')).hexdigest()[:24])
+    
+    def load_withdrawal_store(self, path):
+        """Open a saved withdrawal store (memory-mapped) for re-analysis without re-parsing sheets"""
+        
+        self.withdrawals = WithdrawalTensor(path)
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            pass
+        self.log(f"📦 Withdrawal store: {self.withdrawals.shape[0]:,} items x {self.withdrawals.shape[1]} months "
+                 f"x 31 days from {path}")
+        return self.withdrawals
+    
+    def withdrawal_regularity_from_store(self):
+        """Interval consistency, batch size consistency and regularity (items x months) from the store"""
+        
+        if self.withdrawals is None:
+            raise ValueError("❌ No withdrawal store - set keep_daily_withdrawals or call load_withdrawal_store")
+        
+        return self.withdrawals.map_rows(self._withdrawal_regularity_kernel)
+    
+    def _compact_dtypes(self, df, floats=True):
+        """Categorical text, smallest integer flags and (optionally) float32 floats"""
+        
+        df = df.copy()
+        for col in df.columns:
+            dtype = df[col].dtype
+            if col in self.compact_text_columns:
+                df[col] = df[col].astype('category')
+            elif pd.api.types.is_bool_dtype(dtype):
+                df[col] = df[col].astype(np.int8)
+            elif pd.api.types.is_integer_dtype(dtype):
+                df[col] = pd.to_numeric(df[col], downcast='integer')
+            elif floats and dtype == np.float64 and col not in self.compact_exact_columns:
+                df[col] = df[col].astype(np.float32)
+        return df
+    
+    def _compact_month_frame(self, df):
+        """Compact a processed month frame; the daily withdrawal columns are no longer needed"""
+        
+        day_cols = [col for col in df.columns if str(col).strip().isdigit()]
+        return self._compact_dtypes(df.drop(columns=day_cols))
+    
+    def memory_footprint(self):
+        """Deep memory use (MB) of the frames held by the system"""
+        
+        frames = {
+            'monthly_data': list(self.monthly_data.values()),
+            'item_panel': [self.item_panel] if self.item_panel is not None else [],
+            'training_features': [self.training_features] if self.training_features is not None else [],
+            'predictions': [self.predictions_df] if self.predictions_df is not None else []
+        }
+        return {
+            name: sum(frame.memory_usage(deep=True).sum() for frame in group) / 1024 ** 2
+            for name, group in frames.items() if group
+        }
+    
+    def _log_memory_footprint(self, stage):
+        """Log the memory footprint after a stage (computed only when logging)"""
+        
+        if self.verbose:
+            footprint = ', '.join(f"{name} {mb:.2f}MB" for name, mb in self.memory_footprint().items())
+            self.log(f"🧠 Memory after {stage}{' (compact)' if self.compact_memory else ''}: {footprint}")
+    
+    def _basic_cleaning(self, df):
+        """Drop empty rows and strip column names"""
+        
+        df = df.dropna(how='all').copy()
+        df.columns = [str(col).strip() for col in df.columns]
+        return df
+    
     def _filter_valid_rows(self, df):
         """Filter valid data rows (same as original)"""
         
@@ -189,7 +1194,7 @@ class BatchAwareInventoryPredictionSystem:
         
         # Method 1: Numeric serial numbers
         try:
-            numeric_mask = pd.to_numeric(first_col, errors='coerce').notna()
+            numeric_mask = self._serial_rows(first_col)
             if numeric_mask.sum() > 0:
                 return df[numeric_mask].copy()
         except:
@@ -197,14 +1202,26 @@ class BatchAwareInventoryPredictionSystem:
         
         # Method 2: Non-empty, non-NaN rows
         try:
-            valid_mask = first_col.notna() & (first_col.astype(str).str.strip() != '')
+            valid_mask = self._labelled_rows(first_col)
             if valid_mask.sum() > 0:
                 return df[valid_mask].copy()
         except:
             pass
         
-        # Fallback: return first 100 rows
-        return df.head(100).copy()
+        # Fallback: keep every row (_final_cleaning drops the rows without an item name)
+        return df.copy()
+    
+    @staticmethod
+    def _serial_rows(first_col):
+        """Rows whose first column is a serial number"""
+        
+        return pd.to_numeric(first_col, errors='coerce').notna()
+    
+    @staticmethod
+    def _labelled_rows(first_col):
+        """Rows with anything in the first column"""
+        
+        return first_col.notna() & (first_col.astype(str).str.strip() != '')
     
     def _standardize_columns(self, df, month_label):
         """Standardize column names (same as original)"""
@@ -255,7 +1272,6 @@ class BatchAwareInventoryPredictionSystem:
         
         # Add metadata
         df['Month'] = month_label
-        df['Month_Num'] = self.month_labels.index(month_label) + 1
         
         return df
     
@@ -296,15 +1312,16 @@ class BatchAwareInventoryPredictionSystem:
                     continue
             
             if withdrawal_data:
-                withdrawal_array = np.column_stack(withdrawal_data)
+                # Withdrawals are sparse (a few batch days a month), so only the events are kept (CSR)
+                events = WithdrawalEvents.from_columns(withdrawal_data)
                 
                 # CORRECTED CALCULATIONS FOR BATCH/PERIODIC RECORDING
                 
                 # Total monthly consumption (sum of withdrawals) - This is correct!
-                df['Total_Monthly_Consumption'] = withdrawal_array.sum(axis=1)
+                df['Total_Monthly_Consumption'] = events.totals()
                 
                 # WITHDRAWAL PATTERN ANALYSIS (not daily consumption!)
-                df['Withdrawal_Events'] = (withdrawal_array > 0).sum(axis=1)  # Number of withdrawal days
+                df['Withdrawal_Events'] = events.event_counts()  # Number of withdrawal days
                 
                 # Days between withdrawals (withdrawal frequency)
                 df['Days_Between_Withdrawals'] = np.where(
@@ -323,44 +1340,8 @@ class BatchAwareInventoryPredictionSystem:
                 # ESTIMATED DAILY CONSUMPTION RATE (what we actually want!)
                 df['Estimated_Daily_Consumption_Rate'] = df['Total_Monthly_Consumption'] / 30
                 
-                # BATCH CONSISTENCY METRICS
-                withdrawal_intervals = []
-                batch_size_consistency = []
-                withdrawal_regularity = []
-                
-                for row_idx, row in enumerate(withdrawal_array):
-                    # Find withdrawal days (days with value > 0)
-                    withdrawal_days = np.where(row > 0)[0]
-                    
-                    if len(withdrawal_days) > 1:
-                        # Calculate intervals between withdrawals
-                        intervals = np.diff(withdrawal_days)
-                        avg_interval = np.mean(intervals)
-                        interval_std = np.std(intervals)
-                        interval_consistency = max(0, 1 - (interval_std / (avg_interval + 1)))
-                        withdrawal_intervals.append(interval_consistency)
-                        
-                        # Calculate batch size consistency
-                        batch_sizes = row[withdrawal_days]
-                        batch_mean = np.mean(batch_sizes)
-                        batch_std = np.std(batch_sizes)
-                        batch_consistency = max(0, 1 - (batch_std / (batch_mean + 1)))
-                        batch_size_consistency.append(batch_consistency)
-                        
-                        # Overall withdrawal regularity
-                        regularity = (interval_consistency * 0.6 + batch_consistency * 0.4)
-                        withdrawal_regularity.append(regularity)
-                        
-                    elif len(withdrawal_days) == 1:
-                        # Single withdrawal in the month
-                        withdrawal_intervals.append(1.0)  # Perfect consistency (only one)
-                        batch_size_consistency.append(1.0)  # No variation
-                        withdrawal_regularity.append(0.8)  # Good for single batch
-                    else:
-                        # No withdrawals
-                        withdrawal_intervals.append(0.0)
-                        batch_size_consistency.append(0.0)
-                        withdrawal_regularity.append(0.0)
+                # BATCH CONSISTENCY METRICS (all items at once, O(withdrawals))
+                withdrawal_intervals, batch_size_consistency, withdrawal_regularity = events.regularity()
                 
                 df['Withdrawal_Interval_Consistency'] = withdrawal_intervals
                 df['Batch_Size_Consistency'] = batch_size_consistency
@@ -391,6 +1372,147 @@ class BatchAwareInventoryPredictionSystem:
         
         return df
     
+    @staticmethod
+    def _compact_rows(values, mask):
+        """Move the masked entries of each row to the front, keeping their order"""
+        
+        order = np.argsort(~mask, axis=1, kind='stable')
+        compacted = np.take_along_axis(np.where(mask, values, 0.0), order, axis=1)
+        
+        return compacted, mask.sum(axis=1)
+    
+    @staticmethod
+    def _pairwise_row_sum(values, counts):
+        """
+        Sum the first counts[i] entries of each row of a front-compacted matrix
+        in the same order as NumPy's pairwise summation of a length-counts[i]
+        array (sequential below 8 values, 8 interleaved partial sums above),
+        so masked row reductions reproduce np.mean/np.std bit for bit.
+        """
+        
+        n_rows, n_cols = values.shape
+        totals = np.zeros(n_rows)
+        n_blocks = counts // 8
+        
+        for blocks in np.unique(n_blocks):
+            rows = np.flatnonzero(n_blocks == blocks)
+            block = values[rows]
+            
+            if blocks == 0:
+                result = np.zeros(len(rows))
+                start = 0
+            else:
+                partial = block[:, :8].copy()
+                for b in range(1, blocks):
+                    partial += block[:, b * 8:(b + 1) * 8]
+                result = ((partial[:, 0] + partial[:, 1]) + (partial[:, 2] + partial[:, 3])) + \
+                         ((partial[:, 4] + partial[:, 5]) + (partial[:, 6] + partial[:, 7]))
+                start = blocks * 8
+            
+            # Remaining values are added one by one (entries past counts are zero)
+            for col in range(start, min(start + 8, n_cols)):
+                result = result + block[:, col]
+            
+            totals[rows] = result
+        
+        return totals
+    
+    @staticmethod
+    def _withdrawal_regularity_kernel(withdrawal_array):
+        """
+        Interval consistency, batch size consistency and withdrawal regularity
+        for every row of an (items x days) withdrawal matrix.
+        
+        Array equivalent of _withdrawal_regularity_reference: intervals between
+        withdrawal days come from a running maximum of the last withdrawal day,
+        and means/stds (population, ddof=0) are masked row reductions.
+        """
+        
+        system = BatchAwareInventoryPredictionSystem
+        withdrawal_array = np.asarray(withdrawal_array, dtype=float)
+        n_items, n_days = withdrawal_array.shape
+        day_numbers = np.arange(n_days)
+        
+        mask = withdrawal_array > 0
+        events = mask.sum(axis=1)
+        
+        # Batch sizes: mean/std of the withdrawn quantities on withdrawal days
+        batch_sizes, _ = system._compact_rows(withdrawal_array, mask)
+        safe_events = np.maximum(events, 1)
+        batch_mean = system._pairwise_row_sum(batch_sizes, events) / safe_events
+        batch_dev = np.where(day_numbers < events[:, None], batch_sizes - batch_mean[:, None], 0.0)
+        batch_std = np.sqrt(system._pairwise_row_sum(batch_dev * batch_dev, events) / safe_events)
+        
+        # Intervals: day index minus the previous withdrawal day (running max)
+        last_seen = np.maximum.accumulate(np.where(mask, day_numbers, -1), axis=1)
+        prev_day = np.full_like(last_seen, -1)
+        prev_day[:, 1:] = last_seen[:, :-1]
+        has_interval = mask & (prev_day >= 0)
+        intervals, n_intervals = system._compact_rows(
+            (day_numbers - prev_day).astype(float), has_interval
+        )
+        safe_intervals = np.maximum(n_intervals, 1)
+        interval_mean = system._pairwise_row_sum(intervals, n_intervals) / safe_intervals
+        interval_dev = np.where(day_numbers < n_intervals[:, None], intervals - interval_mean[:, None], 0.0)
+        interval_std = np.sqrt(system._pairwise_row_sum(interval_dev * interval_dev, n_intervals) / safe_intervals)
+        
+        interval_consistency = np.maximum(0, 1 - interval_std / (interval_mean + 1))
+        batch_consistency = np.maximum(0, 1 - batch_std / (batch_mean + 1))
+        regularity = interval_consistency * 0.6 + batch_consistency * 0.4
+        
+        # Special cases: one withdrawal (perfectly consistent) and none at all
+        multi = events > 1
+        single = events == 1
+        interval_consistency = np.select([multi, single], [interval_consistency, 1.0], 0.0)
+        batch_consistency = np.select([multi, single], [batch_consistency, 1.0], 0.0)
+        regularity = np.select([multi, single], [regularity, 0.8], 0.0)
+        
+        return interval_consistency, batch_consistency, regularity
+    
+    @staticmethod
+    def _withdrawal_regularity_reference(withdrawal_array):
+        """Per-row reference implementation of _withdrawal_regularity_kernel"""
+        
+        withdrawal_intervals = []
+        batch_size_consistency = []
+        withdrawal_regularity = []
+        
+        for row_idx, row in enumerate(withdrawal_array):
+            # Find withdrawal days (days with value > 0)
+            withdrawal_days = np.where(row > 0)[0]
+            
+            if len(withdrawal_days) > 1:
+                # Calculate intervals between withdrawals
+                intervals = np.diff(withdrawal_days)
+                avg_interval = np.mean(intervals)
+                interval_std = np.std(intervals)
+                interval_consistency = max(0, 1 - (interval_std / (avg_interval + 1)))
+                withdrawal_intervals.append(interval_consistency)
+                
+                # Calculate batch size consistency
+                batch_sizes = row[withdrawal_days]
+                batch_mean = np.mean(batch_sizes)
+                batch_std = np.std(batch_sizes)
+                batch_consistency = max(0, 1 - (batch_std / (batch_mean + 1)))
+                batch_size_consistency.append(batch_consistency)
+                
+                # Overall withdrawal regularity
+                regularity = (interval_consistency * 0.6 + batch_consistency * 0.4)
+                withdrawal_regularity.append(regularity)
+                
+            elif len(withdrawal_days) == 1:
+                # Single withdrawal in the month
+                withdrawal_intervals.append(1.0)  # Perfect consistency (only one)
+                batch_size_consistency.append(1.0)  # No variation
+                withdrawal_regularity.append(0.8)  # Good for single batch
+            else:
+                # No withdrawals
+                withdrawal_intervals.append(0.0)
+                batch_size_consistency.append(0.0)
+                withdrawal_regularity.append(0.0)
+        
+        return withdrawal_intervals, batch_size_consistency, withdrawal_regularity
+    
     def _set_default_batch_metrics(self, df):
         """Set default batch metrics when no daily data found"""
         
@@ -485,46 +1607,55 @@ class BatchAwareInventoryPredictionSystem:
         
         return df
     
+    def load_business_rules(self, path):
+        """Replace the business rules with the ones in a JSON file (missing keys keep their defaults)"""
+        
+        self.business_rules = load_rules_file(path, copy.deepcopy(DEFAULT_BUSINESS_RULES))
+        self._rule_engine = None
+        self.log(f"📏 Business rules loaded from {path}")
+        return self.business_rules
+    
+    def _business_rule_engine(self):
+        """Compiled rule engine for the current business_rules (rebuilt when they change)"""
+        
+        if self._rule_engine is None or not self._rule_engine.matches(self.business_rules):
+            self._rule_engine = BusinessRuleEngine(copy.deepcopy(self.business_rules))
+            if self.use_cache:
+                loaded = self._rule_engine.load_memo(self._rule_memo_path())
+                if loaded:
+                    os.utime(self._rule_memo_path())  # Mark as recently used for eviction
+                    self.log(f"📏 {loaded} memoized item names for the business rules")
+        
+        return self._rule_engine
+    
+    def _rule_memo_path(self):
+        """Saved item-name flags for the current keyword rules"""
+        
+        return os.path.join(self.cache_dir, 'business_rules',
+                            f"{BusinessRuleEngine.rules_key(self.business_rules)}.json")
+    
+    def _save_business_rule_memo(self):
+        """Keep the item names matched this run for later runs"""
+        
+        if not self.use_cache or self._rule_engine is None:
+            return
+        
+        try:
+            self._rule_engine.save_memo(self._rule_memo_path(), self.rule_memo_max_names)
+        except OSError as e:
+            self.log(f"⚠️ Could not save the business rule memo: {e}")
+    
     def _apply_business_rules(self, df):
-        """Apply business rules (same as original)"""
+        """Apply business rules, evaluated once per unique item name and category"""
         
         try:
             # Ensure Item_Name is string
             df['Item_Name'] = df['Item_Name'].astype(str).str.strip()
             df['Category'] = df['Category'].astype(str).str.strip()
             
-            # Business flags
-            df['Is_Critical'] = False
-            df['Is_Seasonal'] = False
-            df['Category_Multiplier'] = 1.0
-            
-            # Apply critical item detection
-            try:
-                critical_pattern = '|'.join(self.business_rules['critical_items'])
-                if critical_pattern:
-                    df['Is_Critical'] = df['Item_Name'].str.lower().str.contains(
-                        critical_pattern, case=False, na=False, regex=True
-                    )
-            except:
-                df['Is_Critical'] = False
-            
-            # Apply seasonal item detection
-            try:
-                seasonal_pattern = '|'.join(self.business_rules['seasonal_items'])
-                if seasonal_pattern:
-                    df['Is_Seasonal'] = df['Item_Name'].str.lower().str.contains(
-                        seasonal_pattern, case=False, na=False, regex=True
-                    )
-            except:
-                df['Is_Seasonal'] = False
-            
-            # Apply category multipliers
-            try:
-                df['Category_Multiplier'] = df['Category'].map(
-                    self.business_rules['category_multipliers']
-                ).fillna(1.0)
-            except:
-                df['Category_Multiplier'] = 1.0
+            engine = self._business_rule_engine()
+            df['Is_Critical'], df['Is_Seasonal'] = engine.flags(df['Item_Name'])
+            df['Category_Multiplier'] = engine.multipliers(df['Category'])
         
         except Exception as e:
             self.log(f"⚠️ Error in _apply_business_rules: {e}")
@@ -570,256 +1701,859 @@ class BatchAwareInventoryPredictionSystem:
             self.log(f"⚠️ Error in _final_cleaning: {e}")
             return df
     
-    def create_training_features(self):
-        """Create batch-aware training features"""
-        
-        self.log("=== CREATING BATCH-AWARE TRAINING FEATURES ===")
-        
-        # Find items with sufficient history
-        item_counts = {}
-        for month in self.monthly_data:
-            for item in self.monthly_data[month]['Item_Name'].unique():
-                if isinstance(item, str) and len(item.strip()) > 1:
-                    item_counts[item] = item_counts.get(item, 0) + 1
+    @_stage('item_panel')
+    def build_item_panel(self):
+        """
+        Build the long-format item x month panel used by feature building.
+        
+        Rows are indexed by (Item_Code, Month_Order): Item_Code is a categorical
+        code in order of first appearance and Month_Order the position of the
+        month in self.monthly_data. An item listed more than once in a month is
+        aggregated into one row: quantities (consumption, daily rate, withdrawal
+        events, opening stock) are summed, Average_Batch_Size is recomputed from
+        the sums, ratios and price are averaged, flags are OR-ed and text
+        columns keep the first row's value.
+        """
+        
+        # Month_Num counts calendar months from the first loaded month (gaps and years included)
+        first_period = self.month_periods[next(iter(self.monthly_data))]
+        
+        frames = [
+            self._month_panel_rows(month, self.monthly_data[month], month_order, first_period)
+            for month_order, month in enumerate(self.monthly_data)
+        ]
         
-        valid_items = [item for item, count in item_counts.items() if count >= 2]
-        self.log(f"Found {len(valid_items)} items with sufficient history")
+        panel = pd.concat(frames, ignore_index=True)
+        if self.compact_memory:
+            # Months have different categories, so concat falls back to strings
+            panel = self._compact_dtypes(panel, floats=False)
+        panel = panel[panel['Item_Name'].map(lambda x: isinstance(x, str) and len(x.strip()) > 1)]
         
-        # Create batch-aware features
-        features_list = []
+        item_codes = pd.Categorical(panel['Item_Name'], categories=pd.unique(panel['Item_Name']))
+        panel['Item_Code'] = item_codes.codes
+        panel = self._merge_duplicate_panel_rows(panel)
         
-        for item_name in valid_items:
-            try:
-                features = self._create_batch_aware_features(item_name)
-                if features and features.get('Data_Quality', 0) > 0.2:  # Lower threshold for batch data
-                    features_list.append(features)
-            except Exception as e:
-                if self.verbose:
-                    print(f"⚠️ Error creating batch features for '{item_name}': {e}")
-                continue
+        self.panel_months = list(self.monthly_data)
+        self._set_item_panel(panel, item_codes.categories)
         
-        if len(features_list) == 0:
-            raise ValueError("❌ No valid batch-aware training features created")
+        self.log(f"🧮 Item panel: {len(self.item_names)} items x {len(self.monthly_data)} months "
+                 f"({len(self.item_panel)} rows)")
+        return self.item_panel
+    
+    def _month_panel_rows(self, month, month_df, month_order, first_period):
+        """Panel columns of one processed month frame, tagged with Month, Month_Num and Month_Order"""
         
-        self.training_features = pd.DataFrame(features_list)
-        self.log(f"✅ Created batch-aware training features for {len(self.training_features)} items")
+        frame = month_df[[col for col in self.panel_columns if col in month_df.columns]].copy()
+        frame['Month'] = month
+        frame['Month_Num'] = (self.month_periods[month] - first_period).n + 1
+        frame['Month_Order'] = month_order
         
-        return self.training_features
+        return frame
     
-    def _create_batch_aware_features(self, item_name):
-        """Create comprehensive batch-aware features for an item"""
-        
-        history = []
-        
-        # Collect historical data
-        for month in self.monthly_data:
-            month_df = self.monthly_data[month]
-            item_data = month_df[month_df['Item_Name'] == item_name]
-            
-            if not item_data.empty:
-                row = item_data.iloc[0]
-                history.append({
-                    'month': month,
-                    'month_num': self.month_labels.index(month) + 1,
-                    'total_consumption': float(row['Total_Monthly_Consumption']),
-                    'withdrawal_events': float(row['Withdrawal_Events']),
-                    'avg_batch_size': float(row['Average_Batch_Size']),
-                    'daily_rate': float(row['Estimated_Daily_Consumption_Rate']),
-                    'withdrawal_regularity': float(row['Withdrawal_Regularity']),
-                    'consumption_predictability': float(row['Consumption_Predictability']),
-                    'batch_pattern': str(row['Batch_Consumption_Pattern']),
-                    'withdrawal_frequency_cat': str(row['Withdrawal_Frequency_Category']),
-                    'is_critical': bool(row['Is_Critical']),
-                    'is_seasonal': bool(row['Is_Seasonal']),
-                    'category_multiplier': float(row['Category_Multiplier']),
-                    'price': float(row['Price']),
-                    'opening_stock': float(row['Opening_Stock']),
-                    'uom': str(row['UOM']),
-                    'category': str(row['Category'])
-                })
+    def _merge_duplicate_panel_rows(self, panel):
+        """Aggregate items listed more than once in a month into one panel row"""
+        
+        duplicated = panel.duplicated(['Item_Code', 'Month_Order'], keep=False)
+        if not duplicated.any():
+            return panel
+        
+        agg_rules = {col: rule for col, rule in self.panel_aggregation.items() if col in panel.columns}
+        merged = panel[duplicated].groupby(['Item_Code', 'Month_Order'], as_index=False, sort=False).agg(agg_rules)
+        merged['Average_Batch_Size'] = np.where(
+            merged['Withdrawal_Events'] > 0,
+            merged['Total_Monthly_Consumption'] / merged['Withdrawal_Events'].where(merged['Withdrawal_Events'] > 0, 1),
+            0
+        )
+        self.log(f"🔁 Aggregated {int(duplicated.sum())} duplicate item rows into {len(merged)} panel rows")
         
-        if len(history) < 2:
-            return None
+        return pd.concat([panel[~duplicated], merged], ignore_index=True)
+    
+    def _set_item_panel(self, panel, item_names):
+        """Sort and index the panel by (Item_Code, Month_Order) and rebuild the item lookups"""
+        
+        panel = panel.sort_values(['Item_Code', 'Month_Order'], kind='stable')
+        self.item_panel = panel.set_index(['Item_Code', 'Month_Order'], drop=False)
+        self.item_names = pd.Index(item_names)
+        self._item_code_lookup = {name: code for code, name in enumerate(self.item_names)}
+        
+        # Row range of each item in the sorted panel
+        codes = self.item_panel['Item_Code'].to_numpy()
+        starts = np.searchsorted(codes, np.arange(len(self.item_names)), side='left')
+        stops = np.searchsorted(codes, np.arange(len(self.item_names)), side='right')
+        self._item_row_ranges = np.column_stack([starts, stops])
+    
+    def _item_rows(self, codes):
+        """Panel rows of several item codes (each item's months in order), from the row ranges"""
         
-        # Calculate BATCH-AWARE features
-        monthly_totals = np.array([h['total_consumption'] for h in history])
-        daily_rates = np.array([h['daily_rate'] for h in history])
-        withdrawal_frequencies = np.array([h['withdrawal_events'] for h in history])
-        batch_sizes = np.array([h['avg_batch_size'] for h in history])
-        month_nums = np.array([h['month_num'] for h in history])
+        ranges = self._item_row_ranges[np.asarray(codes, dtype=int)]
+        lengths = ranges[:, 1] - ranges[:, 0]
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
         
-        # CONSUMPTION RATE STATISTICS (primary focus for batch recording)
-        avg_daily_rate = float(np.mean(daily_rates))
-        median_daily_rate = float(np.median(daily_rates))
-        daily_rate_std = float(np.std(daily_rates))
-        daily_rate_cv = daily_rate_std / (avg_daily_rate + 0.1)
+        return self.item_panel.iloc[np.repeat(ranges[:, 0], lengths) + offsets]
+    
+    _row_percentile = staticmethod(row_percentile)
+    
+    def _compute_feature_frame(self, panel=None, months=None):
+        """
+        Batch-aware features for every item of the panel at once.
+        
+        Each item's months are packed into the front of an (items x months)
+        matrix and every statistic is a row reduction, with sums in NumPy's
+        pairwise order so means, stds, medians and percentiles match per-item
+        NumPy calls (tests/test_feature_engine.py checks the frame against the
+        per-item feature loop). Trend slopes use the closed-form least-squares
+        solution, which agrees with np.polyfit to floating-point rounding.
+        Items with fewer than two months are left out.
+        """
+        
+        system = BatchAwareInventoryPredictionSystem
+        if panel is None:
+            panel = self.item_panel
+        if months is not None:
+            panel = panel[panel['Month'].isin(months)]
+        
+        codes = panel['Item_Code'].to_numpy()
+        months_per_code = np.bincount(codes, minlength=len(self.item_names))
+        panel = panel[months_per_code[codes] >= 2]
+        codes = panel['Item_Code'].to_numpy()
+        
+        _, first_row, lengths = np.unique(codes, return_index=True, return_counts=True)
+        n_items = len(lengths)
+        if n_items == 0:
+            return pd.DataFrame(columns=self._feature_columns)
+        
+        # Pack each item's history (already in month order) into matrix rows
+        width = int(lengths.max())
+        row_item = np.repeat(np.arange(n_items), lengths)
+        row_pos = np.arange(len(panel)) - np.repeat(first_row, lengths)
+        last_row = first_row + lengths - 1
+        in_history = np.arange(width) < lengths[:, None]
+        n = lengths.astype(float)
+        
+        def packed(column, fill=0.0):
+            matrix = np.full((n_items, width), fill)
+            matrix[row_item, row_pos] = panel[column].to_numpy(dtype=float)
+            return matrix
+        
+        def row_mean(matrix):
+            return system._pairwise_row_sum(matrix, lengths) / n
+        
+        def row_std(matrix, mean):
+            deviation = np.where(in_history, matrix - mean[:, None], 0.0)
+            return np.sqrt(system._pairwise_row_sum(deviation * deviation, lengths) / n)
+        
+        def last_value(column):
+            return panel[column].to_numpy()[last_row]
+        
+        daily_rates = packed('Estimated_Daily_Consumption_Rate')
+        withdrawal_frequencies = packed('Withdrawal_Events')
+        batch_sizes = packed('Average_Batch_Size')
+        month_nums = packed('Month_Num')
+        rows = np.arange(n_items)
+        first_rate = daily_rates[:, 0]
+        last_rate = daily_rates[rows, lengths - 1]
+        prev_rate = daily_rates[rows, lengths - 2]
+        
+        # CONSUMPTION RATE STATISTICS
+        avg_daily_rate = row_mean(daily_rates)
+        sorted_rates = np.sort(np.where(in_history, daily_rates, np.inf), axis=1)
+        median_lower = sorted_rates[rows, (lengths - 1) // 2]
+        median_upper = sorted_rates[rows, lengths // 2]
         
         # WITHDRAWAL PATTERN STATISTICS
-        avg_withdrawal_frequency = float(np.mean(withdrawal_frequencies))
-        avg_batch_size = float(np.mean(batch_sizes))
-        batch_size_variability = float(np.std(batch_sizes) / (avg_batch_size + 0.1))
-        
-        # SEASONAL ADJUSTMENT (based on consumption rate)
-        seasonal_adjustments = []
-        for i, h in enumerate(history):
-            base_adj = self.seasonal_factors.get('Jun', 0.85) / self.seasonal_factors.get(h['month'], 1.0)
-            if h['is_seasonal']:
-                base_adj *= 0.8
-            if h['is_critical']:
-                base_adj *= 1.1
-            
-            seasonal_adjustments.append(daily_rates[i] * base_adj)
-        
-        seasonal_adjusted_daily_rate = float(np.mean(seasonal_adjustments))
-        
-        # TREND ANALYSIS (based on consumption rates, not withdrawal patterns)
-        if len(daily_rates) > 2:
-            daily_rate_trend = float(np.polyfit(month_nums, daily_rates, 1)[0])
-            recent_rates = daily_rates[-2:]
-            recent_trend = float(np.polyfit([0, 1], recent_rates, 1)[0]) if len(recent_rates) == 2 else 0
-        else:
-            daily_rate_trend = 0
-            recent_trend = 0
+        avg_batch_size = row_mean(batch_sizes)
+        
+        # SEASONAL ADJUSTMENT
+        base_adj = self._seasonal_adjustment_factors(panel)
+        seasonal_adjustments = np.zeros((n_items, width))
+        seasonal_adjustments[row_item, row_pos] = daily_rates[row_item, row_pos] * base_adj
+        
+        # TREND ANALYSIS (least-squares slope of daily rate against month number)
+        month_mean = row_mean(month_nums)
+        month_dev = np.where(in_history, month_nums - month_mean[:, None], 0.0)
+        rate_dev = np.where(in_history, daily_rates - avg_daily_rate[:, None], 0.0)
+        slope = (month_dev * rate_dev).sum(axis=1) / (month_dev * month_dev).sum(axis=1)
+        
+        # PATTERN ANALYSIS (ties go to the most recently seen pattern)
+        pattern_codes, pattern_names = pd.factorize(panel['Batch_Consumption_Pattern'].astype(str))
+        pattern_counts = np.zeros((n_items, len(pattern_names)), dtype=int)
+        np.add.at(pattern_counts, (row_item, pattern_codes), 1)
+        pattern_last_seen = np.full((n_items, len(pattern_names)), -1)
+        pattern_last_seen[row_item, pattern_codes] = row_pos  # Later rows overwrite earlier ones
+        dominant = np.argmax(pattern_counts * (width + 1) + pattern_last_seen, axis=1)
+        
+        stats = {
+            'item_name': last_value('Item_Name'),
+            'uom': panel['UOM'].astype(str).to_numpy()[last_row],
+            'category': panel['Category'].astype(str).to_numpy()[last_row],
+            'price': last_value('Price').astype(float),
+            'months': lengths,
+            'avg_rate': avg_daily_rate,
+            'median_rate': np.where(lengths % 2 == 1, median_lower, (median_lower + median_upper) / 2),
+            'rate_std': row_std(daily_rates, avg_daily_rate),
+            'seasonal_rate': row_mean(seasonal_adjustments),
+            'trend': np.where(lengths > 2, slope, 0.0),
+            'recent_trend': np.where(lengths > 2, last_rate - prev_rate, 0.0),
+            'first_rate': first_rate,
+            'prev_rate': prev_rate,
+            'last_rate': last_rate,
+            'avg_frequency': row_mean(withdrawal_frequencies),
+            'avg_batch_size': avg_batch_size,
+            'batch_size_std': row_std(batch_sizes, avg_batch_size),
+            'avg_regularity': row_mean(packed('Withdrawal_Regularity')),
+            'avg_predictability': row_mean(packed('Consumption_Predictability')),
+            'dominant_pattern': np.asarray(pattern_names, dtype=object)[dominant],
+            'pattern_stability': pattern_counts[rows, dominant] / lengths,
+            'is_critical': last_value('Is_Critical').astype(bool),
+            'is_seasonal': last_value('Is_Seasonal').astype(bool),
+            'category_multiplier': last_value('Category_Multiplier').astype(float),
+            'min_rate': sorted_rates[:, 0],
+            'max_rate': sorted_rates[rows, lengths - 1],
+            'q75_rate': system._row_percentile(sorted_rates, lengths, 0.75),
+            'q25_rate': system._row_percentile(sorted_rates, lengths, 0.25)
+        }
         
-        # RECENT BEHAVIOR (weighted towards recent consumption)
-        recent_rates = daily_rates[-2:]
-        if len(recent_rates) == 2:
-            recent_weighted_daily_rate = recent_rates[0] * 0.3 + recent_rates[1] * 0.7
-        else:
-            recent_weighted_daily_rate = recent_rates[-1] if len(recent_rates) > 0 else 0
-        
-        # PATTERN ANALYSIS
-        batch_patterns = [h['batch_pattern'] for h in history]
-        dominant_batch_pattern = max(set(batch_patterns), key=batch_patterns.count) if batch_patterns else 'Unknown'
-        pattern_stability = batch_patterns.count(dominant_batch_pattern) / len(batch_patterns)
-        
-        # PREDICTABILITY METRICS
-        avg_predictability = float(np.mean([h['consumption_predictability'] for h in history]))
-        avg_regularity = float(np.mean([h['withdrawal_regularity'] for h in history]))
-        
-        # DATA QUALITY (adjusted for batch recording patterns)
-        data_quality = min(1.0, 
-            pattern_stability * 0.4 + 
-            (len(history) / 5) * 0.2 + 
-            avg_predictability * 0.3 + 
-            (1 - min(daily_rate_cv, 1.5) / 1.5) * 0.1
+        return self._assemble_feature_frame(stats)
+    
+    def _seasonal_adjustment_factors(self, panel):
+        """Per-row factor that scales a month's daily rate to the prediction month"""
+        
+        month_factors = {month: self.seasonal_factors.get(self._month_name(month), 1.0) for month in self.panel_months}
+        month_factor = panel['Month'].map(month_factors).to_numpy(dtype=float)
+        base_adj = self._target_seasonal_factor() / month_factor
+        base_adj = np.where(panel['Is_Seasonal'].to_numpy(dtype=bool), base_adj * 0.8, base_adj)
+        base_adj = np.where(panel['Is_Critical'].to_numpy(dtype=bool), base_adj * 1.1, base_adj)
+        
+        return base_adj
+    
+    def _assemble_feature_frame(self, stats):
+        """Turn per-item history statistics into the batch-aware feature columns"""
+        
+        avg_daily_rate = stats['avg_rate']
+        avg_withdrawal_frequency = stats['avg_frequency']
+        avg_predictability = stats['avg_predictability']
+        pattern_stability = stats['pattern_stability']
+        first_rate, prev_rate, last_rate = stats['first_rate'], stats['prev_rate'], stats['last_rate']
+        
+        daily_rate_cv = stats['rate_std'] / (avg_daily_rate + 0.1)
+        batch_size_variability = stats['batch_size_std'] / (stats['avg_batch_size'] + 0.1)
+        recent_weighted_daily_rate = prev_rate * 0.3 + last_rate * 0.7
+        
+        # DATA QUALITY
+        data_quality = np.minimum(1.0,
+            pattern_stability * 0.4 +
+            (stats['months'] / 5) * 0.2 +
+            avg_predictability * 0.3 +
+            (1 - np.minimum(daily_rate_cv, 1.5) / 1.5) * 0.1
         )
         
-        # CREATE FEATURE DICTIONARY
-        features = {
-            'Item_Name': item_name,
-            'UOM': history[-1]['uom'],
-            'Category': history[-1]['category'],
-            'Price': history[-1]['price'],
-            'Months_Available': len(history),
+        features = pd.DataFrame({
+            'Item_Name': stats['item_name'],
+            'UOM': stats['uom'],
+            'Category': stats['category'],
+            'Price': stats['price'],
+            'Months_Available': stats['months'],
             
             # PRIMARY CONSUMPTION RATE FEATURES
             'Avg_Daily_Consumption_Rate': avg_daily_rate,
-            'Median_Daily_Rate': median_daily_rate,
-            'Daily_Rate_Std': daily_rate_std,
+            'Median_Daily_Rate': stats['median_rate'],
+            'Daily_Rate_Std': stats['rate_std'],
             'Daily_Rate_CV': daily_rate_cv,
             
-            # SEASONAL AND TREND (based on consumption rates)
-            'Seasonal_Adjusted_Daily_Rate': seasonal_adjusted_daily_rate,
-            'Daily_Rate_Trend': daily_rate_trend,
-            'Recent_Trend': recent_trend,
-            'Recent_Weighted_Daily_Rate': float(recent_weighted_daily_rate),
+            # SEASONAL AND TREND
+            'Seasonal_Adjusted_Daily_Rate': stats['seasonal_rate'],
+            'Daily_Rate_Trend': stats['trend'],
+            'Recent_Trend': stats['recent_trend'],
+            'Recent_Weighted_Daily_Rate': recent_weighted_daily_rate,
             
             # RECENT BEHAVIOR
-            'Last_Month_Daily_Rate': float(daily_rates[-1]),
-            'Last_2Months_Avg_Daily_Rate': float(np.mean(daily_rates[-2:])),
+            'Last_Month_Daily_Rate': last_rate,
+            'Last_2Months_Avg_Daily_Rate': (prev_rate + last_rate) / 2,
             
             # WITHDRAWAL PATTERN FEATURES
             'Avg_Withdrawal_Frequency': avg_withdrawal_frequency,
-            'Avg_Batch_Size': avg_batch_size,
+            'Avg_Batch_Size': stats['avg_batch_size'],
             'Batch_Size_Variability': batch_size_variability,
-            'Avg_Withdrawal_Regularity': avg_regularity,
+            'Avg_Withdrawal_Regularity': stats['avg_regularity'],
             'Avg_Consumption_Predictability': avg_predictability,
             
             # PATTERN CHARACTERISTICS
-            'Dominant_Batch_Pattern': dominant_batch_pattern,
+            'Dominant_Batch_Pattern': stats['dominant_pattern'],
             'Batch_Pattern_Stability': pattern_stability,
             
             # BUSINESS CONTEXT
-            'Is_Critical': int(history[-1]['is_critical']),
-            'Is_Seasonal': int(history[-1]['is_seasonal']),
-            'Category_Multiplier': history[-1]['category_multiplier'],
-            
-            # STATISTICAL FEATURES (based on consumption rates)
-            'Min_Daily_Rate': float(np.min(daily_rates)),
-            'Max_Daily_Rate': float(np.max(daily_rates)),
-            'Daily_Rate_Range': float(np.max(daily_rates) - np.min(daily_rates)),
-            'Q75_Daily_Rate': float(np.percentile(daily_rates, 75)),
-            'Q25_Daily_Rate': float(np.percentile(daily_rates, 25)),
-            
-            # DERIVED INDICATORS (adjusted for batch recording)
-            'Is_Low_Volume': 1 if avg_daily_rate * 30 <= self.low_volume_threshold else 0,
-            'Is_High_Volatility': 1 if daily_rate_cv > self.volatility_threshold else 0,
-            'Is_Single_Batch_Item': 1 if avg_withdrawal_frequency <= 1.5 else 0,
-            'Is_Frequent_Small_Batch': 1 if avg_withdrawal_frequency >= 20 else 0,
+            'Is_Critical': stats['is_critical'].astype(int),
+            'Is_Seasonal': stats['is_seasonal'].astype(int),
+            'Category_Multiplier': stats['category_multiplier'],
+            
+            # STATISTICAL FEATURES
+            'Min_Daily_Rate': stats['min_rate'],
+            'Max_Daily_Rate': stats['max_rate'],
+            'Daily_Rate_Range': stats['max_rate'] - stats['min_rate'],
+            'Q75_Daily_Rate': stats['q75_rate'],
+            'Q25_Daily_Rate': stats['q25_rate'],
+            
+            # DERIVED INDICATORS
+            'Is_Low_Volume': (avg_daily_rate * 30 <= self.low_volume_threshold).astype(int),
+            'Is_High_Volatility': (daily_rate_cv > self.volatility_threshold).astype(int),
+            'Is_Single_Batch_Item': (avg_withdrawal_frequency <= 1.5).astype(int),
+            'Is_Frequent_Small_Batch': (avg_withdrawal_frequency >= 20).astype(int),
             'Data_Quality': data_quality,
             
             # GROWTH AND MOMENTUM INDICATORS
-            'Growth_Rate': float((daily_rates[-1] - daily_rates[0]) / (daily_rates[0] + 0.1)) if daily_rates[0] > 0 else 0,
-            'Recent_vs_Historical': float(recent_weighted_daily_rate / (avg_daily_rate + 0.1)),
-            'Momentum': float((daily_rates[-1] - daily_rates[-2]) / (daily_rates[-2] + 0.1)) if len(daily_rates) > 1 else 0,
+            'Growth_Rate': np.where(first_rate > 0, (last_rate - first_rate) / (first_rate + 0.1), 0.0),
+            'Recent_vs_Historical': recent_weighted_daily_rate / (avg_daily_rate + 0.1),
+            'Momentum': (last_rate - prev_rate) / (prev_rate + 0.1),
             
             # BATCH-SPECIFIC RISK INDICATORS
-            'Withdrawal_Pattern_Risk': 1 if pattern_stability < 0.5 or avg_predictability < 0.4 else 0,
-            'Batch_Size_Risk': 1 if batch_size_variability > 1.0 else 0
-        }
+            'Withdrawal_Pattern_Risk': ((pattern_stability < 0.5) | (avg_predictability < 0.4)).astype(int),
+            'Batch_Size_Risk': (batch_size_variability > 1.0).astype(int)
+        })
         
         return features
     
+    @_stage('features')
+    def create_training_features(self):
+        """Create batch-aware training features"""
+        
+        self.log("=== CREATING BATCH-AWARE TRAINING FEATURES ===")
+        
+        if self.item_panel is None:
+            self.build_item_panel()
+        
+        # Find items with sufficient history (months per item code, from the panel)
+        months_per_item = np.bincount(self.item_panel['Item_Code'].to_numpy(), minlength=len(self.item_names))
+        self.log(f"Found {int((months_per_item >= 2).sum())} items with sufficient history")
+        
+        # Create batch-aware features for the whole catalog at once
+        self.item_features = self._compute_feature_frame()
+        self.training_features = self._select_training_features(self.item_features)
+        self.log(f"✅ Created batch-aware training features for {len(self.training_features)} items")
+        self._log_memory_footprint('feature building')
+        
+        return self.training_features
+    
+    def _select_training_features(self, features_df):
+        """Items whose features are good enough to train on and predict"""
+        
+        features_df = features_df[features_df['Data_Quality'] > 0.2]  # Lower threshold for batch data
+        
+        if len(features_df) == 0:
+            raise ValueError("❌ No valid batch-aware training features created")
+        
+        features_df = features_df.reset_index(drop=True)
+        if self.compact_memory:
+            features_df = self._compact_dtypes(features_df, floats=False)
+        return features_df
+    
+    @_stage('append')
+    def append_month(self, file_path, sheet_name=None, refresh_models=False):
+        """
+        Add a new month sheet to the saved item panel without re-processing history.
+        
+        Only the new sheet (sheet_name, or the earliest month sheet after the
+        panel's last month) is read and processed by _parse_month_sheet.
+        Its rows are merged into the panel, and features are recomputed for the
+        items listed in it (plus the items of months dropped by history_months).
+        Other items keep their features, with the seasonal rate rescaled to the
+        new prediction month. refresh_models refits the ensemble on the updated
+        panel; otherwise the current (or latest saved) models are kept. Without
+        a saved panel the whole workbook is loaded once and saved as the panel.
+        A workbook whose sheets for the panel's months differ from the panel's
+        (e.g. another site's) is refused (_check_panel_workbook).
+        """
+        
+        self.log("=== APPENDING MONTH TO THE ITEM PANEL ===")
+        
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"❌ File not found: {file_path}")
+        
+        if self.item_panel is None and not self.load_panel_state():
+            self.log("⚠️ No saved item panel - building it from the whole workbook")
+            self.load_and_process_data(file_path)
+            self.create_training_features()
+            self._ensure_models(refresh_models)
+            self.save_panel_state(rewrite=True)
+            return self.training_features
+        
+        sheet_hashes = self._check_panel_workbook(file_path)
+        sheet_name, period = self._new_month_sheet(file_path, sheet_name)
+        month_label = period.strftime('%b %Y')
+        self.log(f"Processing {month_label} from sheet '{sheet_name}'...")
+        
+        processed_df = None
+        self.month_periods[month_label] = period
+        workbook = pd.ExcelFile(file_path, engine='openpyxl')
+        try:
+            processed_df, _ = self._parse_month_sheet(workbook, sheet_name, month_label)
+        finally:
+            workbook.close()
+            if processed_df is None or len(processed_df) == 0:
+                del self.month_periods[month_label]
+        
+        if processed_df is None or len(processed_df) == 0:
+            raise ValueError(f"❌ No valid data processed from sheet '{sheet_name}'")
+        
+        self.monthly_data[month_label] = processed_df
+        self.data_hash = self._workbook_hash(file_path)
+        self.month_sheet_hashes[month_label] = sheet_hashes[sheet_name]
+        
+        # The prediction month moves on, which rescales every item's seasonal rate
+        previous_factor = self._target_seasonal_factor()
+        self.target_month = pd.Period(self.prediction_month, freq='M') if self.prediction_month is not None \
+            else period + 1
+        
+        with self.run_recorder.span('merge_panel', rows_in=len(processed_df)) as span:
+            affected = self._merge_month_into_panel(month_label, processed_df)
+            span.rows_out = len(self.item_panel)
+        self.month_labels = list(self.panel_months)
+        
+        with self.run_recorder.span('features', rows_in=len(affected)) as span:
+            updated = self._compute_feature_frame(panel=self._item_rows(affected))
+            unchanged = self.item_features[~self.item_features['Item_Name'].isin(self.item_names[affected])].copy()
+            unchanged['Seasonal_Adjusted_Daily_Rate'] *= self._target_seasonal_factor() / previous_factor
+            
+            features = pd.concat([unchanged, updated], ignore_index=True)
+            order = np.argsort(features['Item_Name'].map(self._item_code_lookup).to_numpy(), kind='stable')
+            self.item_features = features.iloc[order].reset_index(drop=True)
+            self.training_features = self._select_training_features(self.item_features)
+            span.rows_out = len(updated)
+        
+        self.log(f"✅ {month_label}: {len(processed_df)} rows appended, features refreshed for "
+                 f"{len(updated):,} of {len(self.item_features):,} items")
+        
+        self._ensure_models(refresh_models)
+        self._save_business_rule_memo()
+        self.save_panel_state()
+        return self.training_features
+    
+    def _check_panel_workbook(self, file_path):
+        """
+        Refuse a workbook whose sheets for the panel's months differ from the ones
+        the panel was built from (another site's workbook, or edited history).
+        Returns the workbook's sheet content hashes.
+        """
+        
+        sheet_hashes = self._sheet_content_hashes(file_path)
+        parsed = [(name, self._parse_sheet_month(name)) for name in sheet_hashes]
+        parsed = [(name, month_year) for name, month_year in parsed if month_year is not None]
+        if not any(year is not None for _, (_, year) in parsed):
+            parsed = self._infer_sheet_years(parsed)
+        
+        workbook_months = {}
+        for name, (month, year) in parsed:
+            if year is not None:
+                workbook_months.setdefault(pd.Period(year=year, month=month, freq='M'), name)
+        
+        shared = [label for label in self.panel_months
+                  if label in self.month_sheet_hashes and self.month_periods[label] in workbook_months]
+        differing = [label for label in shared
+                     if sheet_hashes[workbook_months[self.month_periods[label]]] != self.month_sheet_hashes[label]]
+        if differing:
+            raise ValueError(f"❌ {os.path.basename(file_path)} does not match the item panel in "
+                             f"{self._panel_state_path()} ({', '.join(differing)} differ) - remove the panel "
+                             f"to rebuild it from this workbook, or give each site its own panel_state_dir")
+        if not shared:
+            self.log(f"⚠️ {os.path.basename(file_path)} has none of the panel's months - "
+                     f"cannot check it belongs to the same site")
+        
+        return sheet_hashes
+    
+    def _new_month_sheet(self, file_path, sheet_name=None):
+        """(sheet name, period) of the month to append: sheet_name or the earliest month after the panel"""
+        
+        last_period = self.month_periods[self.panel_months[-1]]
+        
+        names = [sheet_name] if sheet_name is not None else self._workbook_sheet_names(file_path)
+        parsed = [(name, self._parse_sheet_month(name)) for name in names]
+        parsed = self._infer_sheet_years([(name, month_year) for name, month_year in parsed if month_year is not None],
+                                         after=last_period)
+        
+        candidates = []
+        for name, (month, year) in parsed:
+            period = pd.Period(year=year, month=month, freq='M')
+            if period > last_period:
+                candidates.append((period, name))
+        
+        if not candidates:
+            raise ValueError(f"❌ No month sheet after {last_period.strftime('%b %Y')} "
+                             f"{'named ' + repr(sheet_name) if sheet_name else 'in ' + os.path.basename(file_path)}")
+        
+        candidates.sort()
+        if len(candidates) > 1:
+            self.log(f"⚠️ {len(candidates) - 1} more new month sheets - append them one at a time")
+        
+        period, name = candidates[0]
+        return name, period
+    
+    def _merge_month_into_panel(self, month_label, month_df):
+        """Merge a processed month frame into the panel; returns the item codes whose history changed"""
+        
+        panel = self.item_panel.reset_index(drop=True)
+        affected = [np.empty(0, dtype=int)]
+        
+        # Keep only the latest history_months months
+        if self.history_months and len(self.panel_months) >= self.history_months:
+            dropped = self.panel_months[:len(self.panel_months) + 1 - self.history_months]
+            dropped_rows = panel['Month'].isin(dropped).to_numpy()
+            affected.append(panel['Item_Code'].to_numpy()[dropped_rows])
+            
+            kept_months = self.panel_months[len(dropped):] + [month_label]
+            shift = (self.month_periods[kept_months[0]] - self.month_periods[self.panel_months[0]]).n
+            panel = panel[~dropped_rows].copy()
+            panel['Month_Num'] -= shift
+            panel['Month_Order'] -= len(dropped)
+            for month in dropped:
+                self.monthly_data.pop(month, None)
+            self.panel_months = self.panel_months[len(dropped):]
+            self.log(f"🗓️ Dropped {', '.join(dropped)} (history_months={self.history_months})")
+        
+        first_period = self.month_periods[self.panel_months[0]] if self.panel_months else self.month_periods[month_label]
+        frame = self._month_panel_rows(month_label, month_df, len(self.panel_months), first_period)
+        frame = frame[frame['Item_Name'].map(lambda x: isinstance(x, str) and len(x.strip()) > 1)]
+        
+        # New items get the next codes, in order of appearance
+        new_names = pd.unique(frame.loc[~frame['Item_Name'].isin(self._item_code_lookup), 'Item_Name'])
+        item_names = self.item_names.append(pd.Index(new_names))
+        frame['Item_Code'] = item_names.get_indexer(frame['Item_Name'])
+        frame = self._merge_duplicate_panel_rows(frame)
+        affected.append(frame['Item_Code'].to_numpy())
+        
+        panel = pd.concat([panel, frame], ignore_index=True)
+        if self.compact_memory:
+            panel = self._compact_dtypes(panel, floats=False)
+        
+        self.panel_months = self.panel_months + [month_label]
+        self._set_item_panel(panel, item_names)
+        
+        return np.unique(np.concatenate(affected)).astype(int)
+    
+    def _ensure_models(self, refresh=False):
+        """Refit the ensemble (refresh) or make sure trained models are loaded"""
+        
+        if not refresh and self.models:
+            return
+        
+        if not refresh:
+            try:
+                self.load_model_artifact()
+                return
+            except FileNotFoundError:
+                self.log("⚠️ No saved model artifact - training on the item panel")
+        
+        self.train_production_models()
+        self.save_model_artifact()
+    
+    def _panel_state_path(self, *parts):
+        return os.path.join(self.panel_state_dir or os.path.join(self.save_path, 'batch_aware_panel'), *parts)
+    
+    def save_panel_state(self, rewrite=False):
+        """
+        Save the item panel for append_month: months/<YYYY-MM>.parquet (panel rows
+        of one month), items.parquet (item names in code order), features.parquet
+        (every item's features) and state.json. Month files already on disk are
+        kept unless rewrite, so an append writes only the new month.
+        """
+        
+        months_dir = self._panel_state_path('months')
+        if rewrite:
+            shutil.rmtree(months_dir, ignore_errors=True)
+        os.makedirs(months_dir, exist_ok=True)
+        
+        month_files = {label: f"{self.month_periods[label].strftime('%Y-%m')}.parquet" for label in self.panel_months}
+        derived = ['Item_Code', 'Month_Order', 'Month_Num']
+        for label, name in month_files.items():
+            path = os.path.join(months_dir, name)
+            if not os.path.exists(path):
+                rows = self.item_panel[self.item_panel['Month'] == label].drop(columns=derived)
+                self._write_panel_file(rows.reset_index(drop=True), path)
+        for name in set(os.listdir(months_dir)) - set(month_files.values()):
+            os.remove(os.path.join(months_dir, name))
+        
+        self._write_panel_file(pd.DataFrame({'Item_Name': np.asarray(self.item_names, dtype=object)}),
+                               self._panel_state_path('items.parquet'))
+        self._write_panel_file(self.item_features, self._panel_state_path('features.parquet'))
+        
+        state = {
+            'panel_state_version': self.PANEL_STATE_VERSION,
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            'data_hash': self.data_hash,
+            'processing_config': self._processing_config_hash(None),
+            'months': [[label, str(self.month_periods[label])] for label in self.panel_months],
+            'sheet_hashes': {label: self.month_sheet_hashes.get(label) for label in self.panel_months},
+            'target_month': str(self.target_month) if self.target_month is not None else None
+        }
+        state_path = self._panel_state_path('state.json')
+        tmp_path = f"{state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(state, handle, indent=2)
+        os.replace(tmp_path, state_path)
+        
+        self.log(f"💾 Item panel saved: {len(self.panel_months)} months, {len(self.item_names):,} items "
+                 f"in {self._panel_state_path()}")
+        return self._panel_state_path()
+    
+    def _write_panel_file(self, df, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def load_panel_state(self):
+        """Load the saved item panel and item features; False when there is none (or it is stale)"""
+        
+        state_path = self._panel_state_path('state.json')
+        if not os.path.exists(state_path):
+            return False
+        
+        with open(state_path, encoding='utf-8') as handle:
+            state = json.load(handle)
+        if state.get('panel_state_version') != self.PANEL_STATE_VERSION:
+            self.log(f"⚠️ Ignoring saved item panel version {state.get('panel_state_version')}")
+            return False
+        if state.get('processing_config') != self._processing_config_hash(None):
+            self.log("⚠️ Ignoring saved item panel - processing settings changed since it was saved")
+            return False
+        
+        self.month_periods = {label: pd.Period(period, freq='M') for label, period in state['months']}
+        self.month_labels = list(self.month_periods)
+        self.target_month = pd.Period(state['target_month'], freq='M') if state['target_month'] else None
+        self.data_hash = state['data_hash']
+        self.month_sheet_hashes = {label: sheet_hash for label, sheet_hash in state['sheet_hashes'].items() if sheet_hash}
+        self.monthly_data = {}
+        
+        first_period = self.month_periods[self.month_labels[0]]
+        frames = []
+        for month_order, label in enumerate(self.month_labels):
+            frame = pd.read_parquet(self._panel_state_path('months', f"{self.month_periods[label].strftime('%Y-%m')}.parquet"))
+            frame['Month_Num'] = (self.month_periods[label] - first_period).n + 1
+            frame['Month_Order'] = month_order
+            frames.append(frame)
+        
+        item_names = pd.read_parquet(self._panel_state_path('items.parquet'))['Item_Name']
+        panel = pd.concat(frames, ignore_index=True)
+        if self.compact_memory:
+            panel = self._compact_dtypes(panel, floats=False)
+        panel['Item_Code'] = pd.Index(item_names).get_indexer(panel['Item_Name'])
+        
+        self.panel_months = list(self.month_labels)
+        self._set_item_panel(panel, item_names)
+        self.item_features = pd.read_parquet(self._panel_state_path('features.parquet'))
+        self.training_features = self._select_training_features(self.item_features)
+        
+        self.log(f"📦 Item panel loaded: {len(self.item_names):,} items x {len(self.panel_months)} months "
+                 f"({self.month_labels[0]} .. {self.month_labels[-1]}, saved {state['saved_at']})")
+        return True
+    
+    def _model_feature_columns(self, features_df):
+        """Model input columns of a feature frame (categorical columns excluded)"""
+        
+        return [col for col in features_df.columns
+                if col not in ['Item_Name', 'UOM', 'Category', 'Dominant_Batch_Pattern']]
+    
+    def register_estimator(self, name, build, preprocessing=None, fit_cost=1.0, n_jobs=False,
+                           predict=None, weight=0.25, weight_multipliers=None):
+        """
+        Register (or replace) an ensemble member spec.
+        
+        build(n_jobs) returns an unfitted estimator; preprocessing names an entry of
+        self.preprocessors (None = raw features); predict(model, X) defaults to model.predict.
+        """
+        
+        if preprocessing is not None and preprocessing not in self.preprocessors:
+            raise ValueError(f"❌ Unknown preprocessing '{preprocessing}' for estimator {name}")
+        
+        self.estimator_registry[name] = {
+            'build': build,
+            'preprocessing': preprocessing,
+            'fit_cost': fit_cost,
+            'n_jobs': n_jobs,
+            'predict': predict,
+            'weight': weight,
+            'weight_multipliers': dict(weight_multipliers or {})
+        }
+        
+    def _estimator_spec(self, name):
+        """Registry spec of an ensemble member"""
+        
+        if name not in self.estimator_registry:
+            raise ValueError(f"❌ Estimator '{name}' is not registered "
+                             f"(registered: {list(self.estimator_registry)})")
+        return self.estimator_registry[name]
+        
+    def _preprocessed_inputs(self, X, names):
+        """Feature matrix per preprocessing step used by the given members"""
+        
+        inputs = {None: X}
+        for name in names:
+            step = self._estimator_spec(name)['preprocessing']
+            if step not in inputs:
+                inputs[step] = self.scalers[step].transform(X)
+        return inputs
+        
+    def _predict_members(self, X):
+        """Non-negative daily-rate predictions of every trained member"""
+        
+        inputs = self._preprocessed_inputs(X, self.models)
+        predictions = {}
+        for name, model in self.models.items():
+            spec = self._estimator_spec(name)
+            X_member = inputs[spec['preprocessing']]
+            pred = spec['predict'](model, X_member) if spec['predict'] else model.predict(X_member)
+            predictions[name] = np.maximum(pred, 0)
+        return predictions
+    
+    def _fit_ensemble_members(self, members, y_train, workers):
+        """Fit (name, estimator, X) members in a process pool and record wall/CPU time per model"""
+        
+        self.log(f"Training {len(members)} models on {workers} worker(s) "
+                 f"with a {self.training_cpu_budget}-core budget...")
+        
+        start = time.perf_counter()
+        results = []
+        
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(_fit_estimator, name, estimator, X, y_train)
+                               for name, estimator, X in members]
+                    results = [future.result() for future in futures]
+            except Exception as e:
+                self.log(f"⚠️ Parallel training failed ({e}) - falling back to sequential fits")
+                results = []
+        
+            # Fits ran in worker processes - record the timings they measured
+            for (name, _, X), (_, _, wall_time, cpu_time) in zip(members, results):
+                self.run_recorder.record('fit', wall_time, cpu_time, rows_in=len(X), model=name, worker='process')
+        
+        if not results:
+            for name, estimator, X in members:
+                with self.run_recorder.span('fit', rows_in=len(X), model=name):
+                    results.append(_fit_estimator(name, estimator, X, y_train))
+        
+        fitted = {}
+        self.model_fit_stats = {}
+        for name, model, wall_time, cpu_time in results:
+            fitted[name] = model
+            self.model_fit_stats[name] = {'wall_time': wall_time, 'cpu_time': cpu_time}
+            self.log(f"⏱️ {name}: {wall_time:.2f}s wall, {cpu_time:.2f}s CPU")
+        
+        self.log(f"⏱️ Ensemble training wall time: {time.perf_counter() - start:.2f}s "
+                 f"(sum of fits: {sum(r[2] for r in results):.2f}s)")
+        return fitted
+    
+    @_stage('training_set')
+    def build_walk_forward_samples(self, feature_cols, items=None):
+        """
+        Build every (item, cutoff) training sample in one pass over the months.
+        
+        For each target month the features come from the months before it and
+        the target is that month's daily consumption rate. A FeatureAccumulator
+        (sums, Welford variance, least-squares sums, pattern counts, first/last
+        rates and a sorted rate buffer for median/quantiles) is carried forward
+        month by month, so each month is folded in once instead of recomputing
+        every history prefix. self.monthly_data is not touched. Sums are
+        sequential, so means match _compute_feature_frame exactly for histories
+        under 8 months and to floating-point rounding beyond that; std and trend
+        agree to rounding. Quantiles are exact up to feature_quantile_points
+        months and approximate beyond (see feature_accumulator.py).
+        """
+        
+        panel = self.item_panel
+        n_items = len(self.item_names)
+        n_months = len(self.panel_months)
+        allowed = np.ones(n_items, dtype=bool) if items is None else self.item_names.isin(list(items))
+        
+        codes = panel['Item_Code'].to_numpy()
+        rates = panel['Estimated_Daily_Consumption_Rate'].to_numpy(dtype=float)
+        frequencies = panel['Withdrawal_Events'].to_numpy(dtype=float)
+        batch_sizes = panel['Average_Batch_Size'].to_numpy(dtype=float)
+        predictabilities = panel['Consumption_Predictability'].to_numpy(dtype=float)
+        regularities = panel['Withdrawal_Regularity'].to_numpy(dtype=float)
+        month_nums = panel['Month_Num'].to_numpy(dtype=float)
+        seasonal_rates = rates * self._seasonal_adjustment_factors(panel)
+        pattern_codes, pattern_names = pd.factorize(panel['Batch_Consumption_Pattern'].astype(str))
+        pattern_names = np.asarray(pattern_names, dtype=object)
+        item_names = np.asarray(self.item_names, dtype=object)
+        uoms = panel['UOM'].astype(str).to_numpy()
+        categories = panel['Category'].astype(str).to_numpy()
+        prices = panel['Price'].to_numpy(dtype=float)
+        is_critical = panel['Is_Critical'].to_numpy(dtype=bool)
+        is_seasonal = panel['Is_Seasonal'].to_numpy(dtype=bool)
+        category_multipliers = panel['Category_Multiplier'].to_numpy(dtype=float)
+        
+        # Running state per item code
+        accumulator = FeatureAccumulator(n_items, len(pattern_names), self.feature_quantile_points)
+        
+        # Panel rows grouped by month, item-code order within each month
+        by_month = np.argsort(panel['Month_Order'].to_numpy(), kind='stable')
+        month_bounds = np.searchsorted(panel['Month_Order'].to_numpy()[by_month], np.arange(n_months + 1))
+        
+        samples = []
+        for month_order in range(n_months):
+            rows = by_month[month_bounds[month_order]:month_bounds[month_order + 1]]
+            items_now = codes[rows]
+            
+            # Emit samples: history = months so far, target = this month
+            ready = (accumulator.count[items_now] >= 2) & allowed[items_now]
+            if month_order > 0 and ready.any():
+                idx = items_now[ready]
+                latest = accumulator.latest_row[idx]
+                
+                stats = accumulator.stats(idx)
+                stats.update({
+                    'item_name': item_names[idx],
+                    'uom': uoms[latest],
+                    'category': categories[latest],
+                    'price': prices[latest],
+                    'dominant_pattern': pattern_names[stats['dominant_pattern']],
+                    'is_critical': is_critical[latest],
+                    'is_seasonal': is_seasonal[latest],
+                    'category_multiplier': category_multipliers[latest]
+                })
+                
+                sample = self._assemble_feature_frame(stats)[feature_cols]
+                # Target is DAILY consumption rate (what we want to predict)
+                sample['Target'] = rates[rows[ready]]
+                samples.append(sample)
+            
+            # Fold this month into the running state
+            accumulator.add_month(
+                items_now, month_nums[rows], pattern_codes[rows], rows,
+                rate=rates[rows], frequency=frequencies[rows], batch=batch_sizes[rows],
+                predictability=predictabilities[rows], regularity=regularities[rows],
+                seasonal=seasonal_rates[rows]
+            )
+        
+        if not samples:
+            return pd.DataFrame(columns=list(feature_cols) + ['Target'])
+        
+        return pd.concat(samples, ignore_index=True)
+    
+    @_stage('train')
     def train_production_models(self):
         """Train production-grade models with batch-aware features"""
         
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import mean_absolute_error
+        
         self.log("=== TRAINING BATCH-AWARE PRODUCTION MODELS ===")
         
         # Prepare features (exclude categorical columns)
-        feature_cols = [col for col in self.training_features.columns 
-                       if col not in ['Item_Name', 'UOM', 'Category', 'Dominant_Batch_Pattern']]
+        feature_cols = self._model_feature_columns(self.training_features)
         
         X = self.training_features[feature_cols].fillna(0)
         
-        # Create training dataset with historical cross-validation
-        training_samples = []
-        months_list = list(self.monthly_data.keys())
+        # Create training dataset with historical cross-validation (one walk over the months)
+        train_df = self.build_walk_forward_samples(feature_cols, items=self.training_features['Item_Name'])
         
-        for i in range(1, len(months_list)):
-            target_month = months_list[i]
-            history_months = months_list[:i]
-            
-            for item_name in self.training_features['Item_Name']:
-                try:
-                    # Create features from partial history
-                    temp_monthly_data = {m: self.monthly_data[m] for m in history_months}
-                    orig_monthly_data = self.monthly_data
-                    self.monthly_data = temp_monthly_data
-                    
-                    partial_features = self._create_batch_aware_features(item_name)
-                    
-                    self.monthly_data = orig_monthly_data
-                    
-                    if partial_features and partial_features['Months_Available'] >= 1:
-                        # Get target from target month (daily consumption rate)
-                        target_data = self.monthly_data[target_month]
-                        target_row = target_data[target_data['Item_Name'] == item_name]
-                        
-                        if not target_row.empty:
-                            sample = {col: partial_features.get(col, 0) for col in feature_cols}
-                            # Target is DAILY consumption rate (what we want to predict)
-                            sample['Target'] = float(target_row.iloc[0]['Estimated_Daily_Consumption_Rate'])
-                            training_samples.append(sample)
-                            
-                except Exception as e:
-                    continue
-        
-        if len(training_samples) < 15:  # Lower threshold for batch data
-            raise ValueError(f"❌ Insufficient training samples: {len(training_samples)}")
+        if len(train_df) < 15:  # Lower threshold for batch data
+            raise ValueError(f"❌ Insufficient training samples: {len(train_df)}")
         
         # Prepare training data
-        train_df = pd.DataFrame(training_samples)
         X_train_full = train_df[feature_cols].fillna(0)
         y_train_full = train_df['Target'].values
         
@@ -830,142 +2564,201 @@ class BatchAwareInventoryPredictionSystem:
         
         self.log(f"Training on {len(X_train)} samples (batch-aware)")
         
-        # Initialize scalers
-        self.scalers['standard'] = StandardScaler()
-        self.scalers['robust'] = RobustScaler()
-        
-        X_train_std = self.scalers['standard'].fit_transform(X_train)
-        X_test_std = self.scalers['standard'].transform(X_test)
-        
-        X_train_robust = self.scalers['robust'].fit_transform(X_train)
-        X_test_robust = self.scalers['robust'].transform(X_test)
-        
-        # Train models (adjusted parameters for batch data)
-        self.log("Training Random Forest (batch-optimized)...")
-        rf_model = RandomForestRegressor(
-            n_estimators=200,  # Fewer trees for smaller dataset
-            max_depth=15,      # Shallower for batch patterns
-            min_samples_split=2,
-            min_samples_leaf=1,
-            random_state=42,
-            n_jobs=-1
-        )
-        rf_model.fit(X_train, y_train)
-        
-        self.log("Training Gradient Boosting (batch-optimized)...")
-        gb_model = GradientBoostingRegressor(
-            n_estimators=150,   # Fewer estimators
-            max_depth=8,        # Shallower trees
-            learning_rate=0.1,  # Slightly higher learning rate
-            min_samples_split=3,
-            random_state=42
-        )
-        gb_model.fit(X_train, y_train)
-        
-        self.log("Training Ridge Regression...")
-        ridge_model = Ridge(alpha=0.5, random_state=42)  # Lower regularization
-        ridge_model.fit(X_train_std, y_train)
-        
-        self.log("Training Linear Regression...")
-        lr_model = LinearRegression()
-        lr_model.fit(X_train_robust, y_train)
-        
-        # Store models
-        self.models = {
-            'RandomForest': rf_model,
-            'GradientBoosting': gb_model,
-            'Ridge': ridge_model,
-            'LinearRegression': lr_model
-        }
+        members = list(self.ensemble_members)
+        specs = {name: self._estimator_spec(name) for name in members}
+        
+        # Fit the preprocessing steps the members need
+        self.scalers = {}
+        train_inputs = {None: X_train}
+        for name in members:
+            step = specs[name]['preprocessing']
+            if step is not None and step not in self.scalers:
+                self.scalers[step] = self.preprocessors[step]()
+                train_inputs[step] = self.scalers[step].fit_transform(X_train)
+        
+        # Train models (adjusted parameters for batch data) concurrently within the CPU budget
+        workers = max(1, min(len(members), self.training_cpu_budget))
+        spare_cores = max(1, self.training_cpu_budget - (workers - 1))  # Other members hold one core each
+        threaded = [name for name in members if specs[name]['n_jobs']]
+        member_jobs = max(1, spare_cores // max(1, len(threaded)))
+        
+        # Longest fits first so they start immediately
+        schedule = sorted(members, key=lambda name: specs[name]['fit_cost'], reverse=True)
+        fitted = self._fit_ensemble_members([
+            (name,
+             specs[name]['build'](n_jobs=member_jobs if specs[name]['n_jobs'] else 1),
+             train_inputs[specs[name]['preprocessing']])
+            for name in schedule
+        ], y_train, workers)
+        
+        # Store models (in ensemble member order)
+        self.models = {name: fitted[name] for name in members}
         
         # Evaluate models
         model_scores = {}
-        for name, model in self.models.items():
-            if name == 'Ridge':
-                pred = model.predict(X_test_std)
-            elif name == 'LinearRegression':
-                pred = model.predict(X_test_robust)
-            else:
-                pred = model.predict(X_test)
-            
-            pred = np.maximum(pred, 0)
+        for name, pred in self._predict_members(X_test).items():
             mae = mean_absolute_error(y_test, pred)
             model_scores[name] = mae
             
             self.log(f"{name} MAE: {mae:.3f} (daily rate)")
         
-        # Store feature importance
-        self.feature_importance = {
-            'RandomForest': dict(zip(feature_cols, rf_model.feature_importances_)),
-            'GradientBoosting': dict(zip(feature_cols, gb_model.feature_importances_))
+        # Store feature importance (tree members)
+        self.feature_importance = {
+            name: dict(zip(feature_cols, model.feature_importances_))
+            for name, model in self.models.items() if hasattr(model, 'feature_importances_')
+        }
+        
+        self.feature_cols = feature_cols
+        self.model_scores = model_scores
+        
+        self.log("✅ Batch-aware model training complete!")
+        return self.models
+    
+    def _feature_schema_hash(self, feature_cols):
+        """Hash of the ordered model input columns"""
+        
+        return hashlib.sha256('|'.join(feature_cols).encode('utf-8')).hexdigest()[:16]
+    
+    def save_model_artifact(self, artifact_path=None):
+        """Save trained models, scalers and feature schema as a versioned artifact"""
+        
+        import joblib
+        import sklearn
+        
+        if not self.models or self.feature_cols is None:
+            raise ValueError("❌ No trained models to save - run train_production_models first")
+        
+        schema_hash = self._feature_schema_hash(self.feature_cols)
+        if artifact_path is None:
+            os.makedirs(self.model_dir, exist_ok=True)
+            artifact_path = os.path.join(
+                self.model_dir, f"batch_aware_models_{self.timestamp}_{schema_hash[:8]}.joblib"
+            )
+        
+        artifact = {
+            'artifact_version': self.MODEL_ARTIFACT_VERSION,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'sklearn_version': sklearn.__version__,
+            'training_data_hash': self.data_hash,
+            'training_months': list(self.panel_months),
+            'feature_cols': list(self.feature_cols),
+            'feature_schema_hash': schema_hash,
+            'models': self.models,
+            'scalers': self.scalers,
+            'model_scores': self.model_scores,
+            'feature_importance': self.feature_importance
         }
         
-        self.feature_cols = feature_cols
-        self.model_scores = model_scores
+        tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, artifact_path)
         
-        self.log("✅ Batch-aware model training complete!")
-        return self.models
+        self.model_artifact_path = artifact_path
+        self.log(f"💾 Model artifact saved: {artifact_path}")
+        return artifact_path
+    
+    def load_model_artifact(self, artifact_path=None):
+        """Load the latest (or a given) model artifact and check its feature schema"""
+        
+        import joblib
+        import sklearn
+        
+        if artifact_path is None:
+            candidates = []
+            if os.path.isdir(self.model_dir):
+                candidates = [
+                    os.path.join(self.model_dir, name) for name in os.listdir(self.model_dir)
+                    if name.endswith('.joblib')
+                ]
+            if not candidates:
+                raise FileNotFoundError(f"❌ No model artifact found in {self.model_dir}")
+            artifact_path = max(candidates, key=os.path.getmtime)
+        
+        artifact = joblib.load(artifact_path)
+        
+        if artifact.get('artifact_version') != self.MODEL_ARTIFACT_VERSION:
+            raise ValueError(
+                f"❌ Unsupported model artifact version {artifact.get('artifact_version')} "
+                f"(expected {self.MODEL_ARTIFACT_VERSION})"
+            )
+        
+        if artifact['sklearn_version'] != sklearn.__version__:
+            self.log(f"⚠️ Artifact trained with scikit-learn {artifact['sklearn_version']}, "
+                     f"running {sklearn.__version__}")
+        
+        # The current features must line up column-for-column with the trained ones
+        if self.training_features is not None:
+            current_cols = self._model_feature_columns(self.training_features)
+            if current_cols != artifact['feature_cols']:
+                missing = sorted(set(artifact['feature_cols']) - set(current_cols))
+                extra = sorted(set(current_cols) - set(artifact['feature_cols']))
+                raise ValueError(
+                    f"❌ Model artifact feature schema {artifact['feature_schema_hash']} does not match "
+                    f"current features {self._feature_schema_hash(current_cols)} "
+                    f"(missing: {missing}, unexpected: {extra})"
+                )
+        
+        # Every member must have a registered spec to be preprocessed and predicted
+        for name in artifact['models']:
+            self._estimator_spec(name)
+        
+        self.models = artifact['models']
+        self.ensemble_members = list(artifact['models'])
+        self.scalers = artifact['scalers']
+        self.feature_cols = artifact['feature_cols']
+        self.model_scores = artifact['model_scores']
+        self.feature_importance = artifact['feature_importance']
+        self.model_artifact_path = artifact_path
+        
+        self.log(f"📦 Loaded model artifact {os.path.basename(artifact_path)} "
+                 f"(trained {artifact['created_at']} on data {str(artifact['training_data_hash'])[:12]})")
+        return artifact
     
+    @_stage('predict')
     def generate_production_predictions(self):
         """Generate batch-aware production predictions"""
         
         self.log("=== GENERATING BATCH-AWARE PREDICTIONS ===")
         
         X = self.training_features[self.feature_cols].fillna(0)
-        X_std = self.scalers['standard'].transform(X)
-        X_robust = self.scalers['robust'].transform(X)
-        
-        # Generate base predictions (daily consumption rates)
-        rf_pred = np.maximum(self.models['RandomForest'].predict(X), 0)
-        gb_pred = np.maximum(self.models['GradientBoosting'].predict(X), 0)
-        ridge_pred = np.maximum(self.models['Ridge'].predict(X_std), 0)
-        lr_pred = np.maximum(self.models['LinearRegression'].predict(X_robust), 0)
-        
-        # Apply batch-aware safety nets
-        final_predictions = []
-        confidence_scores = []
-        adjustment_logs = []
-        risk_levels = []
-        recommendations = []
-        
-        for i, row in self.training_features.iterrows():
-            # Base predictions for this item (daily rates)
-            item_preds = {
-                'RandomForest': rf_pred[i],
-                'GradientBoosting': gb_pred[i],
-                'Ridge': ridge_pred[i],
-                'LinearRegression': lr_pred[i]
-            }
-            
-            # Apply batch-aware safety nets
-            final_daily_rate, confidence, adjustments, risk = self._apply_batch_aware_safety_nets(item_preds, row)
+        
+        # Generate base predictions (daily consumption rates) for every trained member
+        with self.run_recorder.span('inference', rows_in=len(X)) as span:
+            member_preds = self._predict_members(X)
+            span.rows_out = len(X)
+        
+        features = self.training_features
+        with self.run_recorder.span('post_processing', rows_in=len(features)) as span:
+            # Apply batch-aware safety nets to every item at once
+            final_daily_rate, confidence, adjustment_flags, risk = self._apply_batch_aware_safety_nets(
+                member_preds, features
+            )
             
             # Convert daily rate to monthly prediction
             final_monthly_pred = final_daily_rate * 30
             
-            # Generate recommendation
-            recommendation = self._generate_batch_aware_recommendation(final_monthly_pred, confidence, risk, row)
-            
-            final_predictions.append(int(round(max(0, final_monthly_pred))))
-            confidence_scores.append(round(confidence, 1))
-            adjustment_logs.append('; '.join(adjustments) if adjustments else 'No adjustments')
-            risk_levels.append(risk)
-            recommendations.append(recommendation)
+            # Generate recommendations
+            recommendations = self._generate_batch_aware_recommendation(final_monthly_pred, confidence, risk, features)
+            span.rows_out = len(recommendations)
+        
+        final_predictions = np.rint(np.maximum(0, final_monthly_pred)).astype(np.int64)
+        confidence_scores = np.round(confidence, 1)
         
         # Create comprehensive results dataframe
-        results_df = self.training_features[[
+        results_df = features[[
             'Item_Name', 'UOM', 'Category', 'Price', 'Dominant_Batch_Pattern'
         ]].copy()
+        for col in ['UOM', 'Category', 'Dominant_Batch_Pattern']:
+            if isinstance(results_df[col].dtype, pd.CategoricalDtype):  # Compact memory mode
+                results_df[col] = results_df[col].astype(str)
         
         # Add predictions (convert daily rates to monthly for display)
-        results_df['RandomForest_Monthly'] = [int(round(p * 30)) for p in rf_pred]
-        results_df['GradientBoosting_Monthly'] = [int(round(p * 30)) for p in gb_pred]
-        results_df['Ridge_Monthly'] = [int(round(p * 30)) for p in ridge_pred]
-        results_df['LinearRegression_Monthly'] = [int(round(p * 30)) for p in lr_pred]
+        for name, pred in member_preds.items():
+            results_df[f'{name}_Monthly'] = np.rint(pred * 30).astype(np.int64)
         results_df['Final_Monthly_Prediction'] = final_predictions
         results_df['Confidence'] = confidence_scores
-        results_df['Risk_Level'] = risk_levels
-        results_df['Adjustments_Applied'] = adjustment_logs
+        results_df['Risk_Level'] = risk
+        results_df['Adjustment_Flags'] = adjustment_flags  # Rendered to Adjustments_Applied on export
         results_df['Procurement_Recommendation'] = recommendations
         
         # Add analysis columns (batch-aware)
@@ -993,249 +2786,309 @@ class BatchAwareInventoryPredictionSystem:
         self.predictions_df = results_df
         
         # Log summary
-        total_predicted = sum(final_predictions)
+        total_predicted = int(final_predictions.sum())
         avg_confidence = np.mean(confidence_scores)
-        high_conf_count = sum(1 for c in confidence_scores if c > 70)
+        high_conf_count = int((confidence_scores > 70).sum())
         
         self.log(f"✅ Generated batch-aware predictions for {len(results_df)} items")
         self.log(f"📊 Total predicted monthly consumption: {total_predicted:,}")
         self.log(f"🎯 Average confidence: {avg_confidence:.1f}%")
         self.log(f"🟢 High confidence predictions: {high_conf_count}")
         self.log("🔄 Predictions based on CONSUMPTION RATES, not withdrawal patterns")
+        self._log_memory_footprint('prediction')
         
         return results_df
     
-    def _apply_batch_aware_safety_nets(self, predictions, row):
-        """Apply batch-aware safety nets to daily consumption rate predictions"""
+    def _feature_column(self, features, col, default=0):
+        """Column of a feature frame as floats, or the default when the column is missing"""
+        
+        if col in features.columns:
+            return features[col].to_numpy(dtype=float)
+        return np.full(len(features), float(default))
+    
+    def _pattern_contains(self, features, *keywords):
+        """Rows whose Dominant_Batch_Pattern contains any of the keywords"""
+        
+        pattern = features['Dominant_Batch_Pattern'].astype(str)
+        mask = np.zeros(len(features), dtype=bool)
+        for keyword in keywords:
+            mask |= pattern.str.contains(keyword, regex=False).to_numpy()
+        return mask
+    
+    def _apply_batch_aware_safety_nets(self, predictions, features):
+        """
+        Apply batch-aware safety nets to daily consumption rate predictions.
+        
+        Works on whole columns: predictions maps member name -> array of daily rates
+        aligned with the feature rows. Returns (daily rate, confidence, adjustment
+        bitmask, risk level) arrays; see ADJUSTMENT_FLAGS for the bits.
+        """
+        
+        flags = np.zeros(len(features), dtype=np.uint8)
+        base_confidence = np.full(len(features), 70.0)  # Start higher for batch data
         
-        adjustments = []
-        base_confidence = 70  # Start higher for batch data
+        avg_rate = self._feature_column(features, 'Avg_Daily_Consumption_Rate')
         
         # Calculate weighted ensemble prediction (daily rate)
-        weights = self._calculate_batch_aware_weights(row)
-        ensemble_daily_rate = sum(weights[model] * pred for model, pred in predictions.items())
-        adjusted_daily_rate = ensemble_daily_rate
+        weights = self._calculate_batch_aware_weights(features)
+        ensemble_daily_rate = 0
+        for model, pred in predictions.items():
+            ensemble_daily_rate = ensemble_daily_rate + weights[model] * pred
+        adjusted_daily_rate = np.asarray(ensemble_daily_rate, dtype=float)
+        
+        def apply(mask, flag, rate_factor=None, confidence_factor=None):
+            nonlocal adjusted_daily_rate, base_confidence, flags
+            if rate_factor is not None:
+                adjusted_daily_rate = np.where(mask, adjusted_daily_rate * rate_factor, adjusted_daily_rate)
+            if confidence_factor is not None:
+                base_confidence = np.where(mask, base_confidence * confidence_factor, base_confidence)
+            flags = np.where(mask, flags | self.ADJUSTMENT_FLAGS[flag], flags).astype(np.uint8)
         
         # Safety Net 1: Batch Pattern Consistency
-        batch_pattern = row['Dominant_Batch_Pattern']
-        if 'Irregular' in batch_pattern or 'Unknown' in batch_pattern:
-            adjusted_daily_rate *= 0.85
-            adjustments.append("Irregular batch pattern adjustment (-15%)")
-            base_confidence *= 0.8
+        apply(self._pattern_contains(features, 'Irregular', 'Unknown'), 'irregular_pattern', 0.85, 0.8)
         
         # Safety Net 2: Single Batch Items (special handling)
-        if row.get('Is_Single_Batch_Item', 0) == 1:
-            # For items withdrawn once per month, be more conservative
-            historical_avg = row['Avg_Daily_Consumption_Rate']
-            if adjusted_daily_rate > historical_avg * 2.0:
-                adjusted_daily_rate = historical_avg * 1.5
-                adjustments.append("Single batch item conservative cap")
-                base_confidence *= 0.9
+        # For items withdrawn once per month, be more conservative
+        single_cap = (
+            (self._feature_column(features, 'Is_Single_Batch_Item') == 1) &
+            (adjusted_daily_rate > avg_rate * 2.0)
+        )
+        adjusted_daily_rate = np.where(single_cap, avg_rate * 1.5, adjusted_daily_rate)
+        apply(single_cap, 'single_batch_cap', confidence_factor=0.9)
         
         # Safety Net 3: Zero Prediction Protection (batch-aware)
-        if adjusted_daily_rate < 0.01 and row['Avg_Daily_Consumption_Rate'] > 0:
-            min_daily_rate = max(
-                row['Avg_Daily_Consumption_Rate'] * 0.3,
-                row['Recent_Weighted_Daily_Rate'] * 0.5,
-                0.03  # Minimum 1 unit per month
-            )
-            adjusted_daily_rate = min_daily_rate
-            adjustments.append(f"Zero prediction safety net ({min_daily_rate:.3f}/day)")
-            base_confidence *= 0.7
+        zero_guard = (adjusted_daily_rate < 0.01) & (avg_rate > 0)
+        adjusted_daily_rate = np.where(zero_guard, self._zero_prediction_floor(features), adjusted_daily_rate)
+        apply(zero_guard, 'zero_prediction', confidence_factor=0.7)
         
         # Safety Net 4: Batch Volatility Handling
-        if row.get('Batch_Size_Variability', 0) > 1.0:
-            volatility_factor = max(0.8, 1 - (row['Batch_Size_Variability'] - 1.0) * 0.1)
-            adjusted_daily_rate *= volatility_factor
-            adjustments.append(f"High batch volatility adjustment (-{(1-volatility_factor)*100:.0f}%)")
-            base_confidence *= 0.85
+        volatility_factor = self._batch_volatility_factor(features)
+        apply(self._feature_column(features, 'Batch_Size_Variability') > 1.0, 'batch_volatility',
+              volatility_factor, 0.85)
         
         # Safety Net 5: Withdrawal Pattern Risk
-        if row.get('Withdrawal_Pattern_Risk', 0) == 1:
-            adjusted_daily_rate *= 0.9
-            adjustments.append("Withdrawal pattern risk adjustment (-10%)")
-            base_confidence *= 0.8
+        apply(self._feature_column(features, 'Withdrawal_Pattern_Risk') == 1, 'withdrawal_pattern_risk', 0.9, 0.8)
         
         # Safety Net 6: Business Rule Adjustments
-        if row['Is_Critical'] == 1:
-            adjusted_daily_rate *= 1.1  # Slight increase for critical items
-            adjustments.append("Critical item buffer (+10%)")
-            base_confidence *= 1.05
-        
-        if row['Is_Seasonal'] == 1:
-            adjusted_daily_rate *= 0.95  # Conservative for seasonal items
-            adjustments.append("Seasonal item adjustment (-5%)")
-            base_confidence *= 0.98
+        apply(features['Is_Critical'].to_numpy() == 1, 'critical_buffer', 1.1, 1.05)  # Slight increase for critical items
+        apply(features['Is_Seasonal'].to_numpy() == 1, 'seasonal_item', 0.95, 0.98)  # Conservative for seasonal items
         
         # Safety Net 7: Trend-Based Adjustments (based on consumption trends)
-        if abs(row['Daily_Rate_Trend']) > row['Avg_Daily_Consumption_Rate'] * 0.1:
-            trend_factor = 1 + np.clip(row['Daily_Rate_Trend'] / (row['Avg_Daily_Consumption_Rate'] + 0.01), -0.2, 0.2)
-            adjusted_daily_rate *= trend_factor
-            direction = "increasing" if row['Daily_Rate_Trend'] > 0 else "decreasing"
-            adjustments.append(f"Consumption {direction} trend ({(trend_factor-1)*100:+.0f}%)")
+        trend = self._feature_column(features, 'Daily_Rate_Trend')
+        apply(np.abs(trend) > avg_rate * 0.1, 'consumption_trend', self._trend_factor(features))
         
         # Calculate final confidence (batch-aware factors)
-        pred_variance = np.std(list(predictions.values())) / (np.mean(list(predictions.values())) + 0.001)
+        member_matrix = np.column_stack(list(predictions.values()))
+        pred_variance = np.std(member_matrix, axis=1) / (np.mean(member_matrix, axis=1) + 0.001)
         confidence_adjustments = [
-            (row['Batch_Pattern_Stability'], 1.15),
-            (row['Data_Quality'], 1.25),
-            (row.get('Avg_Consumption_Predictability', 0.5), 1.2),
-            (min(1.0, 1 / (pred_variance + 0.1)), 1.1),
-            (min(1.0, row['Months_Available'] / 4), 1.1)
+            (self._feature_column(features, 'Batch_Pattern_Stability'), 1.15),
+            (self._feature_column(features, 'Data_Quality'), 1.25),
+            (self._feature_column(features, 'Avg_Consumption_Predictability', 0.5), 1.2),
+            (np.minimum(1.0, 1 / (pred_variance + 0.1)), 1.1),
+            (np.minimum(1.0, self._feature_column(features, 'Months_Available') / 4), 1.1)
         ]
         
         final_confidence = base_confidence
         for factor, weight in confidence_adjustments:
-            final_confidence *= (factor ** (weight - 1))
+            final_confidence = final_confidence * (factor ** (weight - 1))
         
         final_confidence = np.clip(final_confidence, self.confidence_floor, self.confidence_ceiling)
         
         # Calculate risk level
-        risk_level = self._calculate_batch_risk_level(adjusted_daily_rate * 30, final_confidence, row)
+        risk_level = self._calculate_batch_risk_level(adjusted_daily_rate * 30, final_confidence, features)
+        
+        return adjusted_daily_rate, final_confidence, flags, risk_level
+    
+    def _zero_prediction_floor(self, features):
+        """Daily rate used when the ensemble predicts (near) zero for a consuming item"""
         
-        return adjusted_daily_rate, final_confidence, adjustments, risk_level
+        return np.maximum(np.maximum(
+            self._feature_column(features, 'Avg_Daily_Consumption_Rate') * 0.3,
+            self._feature_column(features, 'Recent_Weighted_Daily_Rate') * 0.5),
+            0.03  # Minimum 1 unit per month
+        )
     
-    def _calculate_batch_aware_weights(self, row):
-        """Calculate ensemble weights for batch-aware predictions"""
+    def _batch_volatility_factor(self, features):
+        """Rate factor for items with highly variable batch sizes"""
         
-        pattern = row['Dominant_Batch_Pattern']
-        predictability = row['Avg_Consumption_Predictability']
-        data_quality = row['Data_Quality']
+        return np.maximum(0.8, 1 - (self._feature_column(features, 'Batch_Size_Variability') - 1.0) * 0.1)
+    
+    def _trend_factor(self, features):
+        """Rate factor following the consumption trend (capped at +/-20%)"""
         
-        # Base weights
-        weights = {
-            'RandomForest': 0.35,
-            'GradientBoosting': 0.35,
-            'Ridge': 0.15,
-            'LinearRegression': 0.15
-        }
+        trend = self._feature_column(features, 'Daily_Rate_Trend')
+        avg_rate = self._feature_column(features, 'Avg_Daily_Consumption_Rate')
+        return 1 + np.clip(trend / (avg_rate + 0.01), -0.2, 0.2)
+    
+    def render_adjustments(self, df):
+        """Human-readable Adjustments_Applied text from the Adjustment_Flags bitmask"""
+        
+        flags = df['Adjustment_Flags'].to_numpy()
+        text = pd.Series('', index=df.index, dtype=object)
+        
+        for name, bit in self.ADJUSTMENT_FLAGS.items():
+            mask = (flags & bit) != 0
+            if not mask.any():
+                continue
+            rows = df[mask]
+            
+            if name == 'irregular_pattern':
+                piece = "Irregular batch pattern adjustment (-15%)"
+            elif name == 'single_batch_cap':
+                piece = "Single batch item conservative cap"
+            elif name == 'zero_prediction':
+                piece = ("Zero prediction safety net ("
+                         + pd.Series(self._zero_prediction_floor(rows), index=rows.index).map('{:.3f}'.format)
+                         + "/day)")
+            elif name == 'batch_volatility':
+                reduction = (1 - pd.Series(self._batch_volatility_factor(rows), index=rows.index)) * 100
+                piece = "High batch volatility adjustment (-" + reduction.map('{:.0f}'.format) + "%)"
+            elif name == 'withdrawal_pattern_risk':
+                piece = "Withdrawal pattern risk adjustment (-10%)"
+            elif name == 'critical_buffer':
+                piece = "Critical item buffer (+10%)"
+            elif name == 'seasonal_item':
+                piece = "Seasonal item adjustment (-5%)"
+            else:  # consumption_trend
+                direction = np.where(self._feature_column(rows, 'Daily_Rate_Trend') > 0, "increasing", "decreasing")
+                change = (pd.Series(self._trend_factor(rows), index=rows.index) - 1) * 100
+                piece = "Consumption " + pd.Series(direction, index=rows.index) + " trend (" + change.map('{:+.0f}'.format) + "%)"
+            
+            current = text[mask]
+            text[mask] = current.where(current == '', current + '; ') + piece
+        
+        return text.where(text != '', 'No adjustments').astype(str)
+    
+    def predictions_for_export(self, df=None):
+        """Prediction frame with the adjustment bitmask rendered as Adjustments_Applied text"""
+        
+        df = self.predictions_df if df is None else df
+        if 'Adjustment_Flags' not in df.columns:
+            return df
+        
+        export_df = df.copy()
+        export_df['Adjustment_Flags'] = self.render_adjustments(df)
+        return export_df.rename(columns={'Adjustment_Flags': 'Adjustments_Applied'})
+    
+    def _calculate_batch_aware_weights(self, features):
+        """Calculate ensemble weights (one array per trained member) for batch-aware predictions"""
         
-        # Batch pattern adjustments
-        if 'Regular' in pattern or 'Predictable' in pattern:
-            weights['Ridge'] *= 1.3
-            weights['LinearRegression'] *= 1.2
-            weights['RandomForest'] *= 0.95
-        elif 'Irregular' in pattern or 'Single' in pattern:
-            weights['RandomForest'] *= 1.2
-            weights['GradientBoosting'] *= 1.15
-            weights['Ridge'] *= 0.8
-        elif 'Frequent' in pattern:
-            weights['GradientBoosting'] *= 1.2
-            weights['Ridge'] *= 1.1
-        
-        # Predictability adjustments
-        if predictability > 0.7:
-            weights['Ridge'] *= 1.2
-            weights['LinearRegression'] *= 1.15
-        elif predictability < 0.4:
-            weights['RandomForest'] *= 1.15
-            weights['GradientBoosting'] *= 1.1
+        predictability = self._feature_column(features, 'Avg_Consumption_Predictability')
+        
+        # Base weights of the trained members
+        weights = {name: np.full(len(features), self._estimator_spec(name)['weight']) for name in self.models}
+        
+        # Batch pattern band (first matching rule wins)
+        regular = self._pattern_contains(features, 'Regular', 'Predictable')
+        irregular = ~regular & self._pattern_contains(features, 'Irregular', 'Single')
+        frequent = ~regular & ~irregular & self._pattern_contains(features, 'Frequent')
+        
+        # Predictability band
+        high_predictability = predictability > 0.7
+        low_predictability = predictability < 0.4
+        
+        # Batch pattern, then predictability adjustments
+        bands = [
+            ('regular', regular), ('irregular', irregular), ('frequent', frequent),
+            ('high_predictability', high_predictability), ('low_predictability', low_predictability)
+        ]
+        for name in weights:
+            multipliers = self._estimator_spec(name)['weight_multipliers']
+            for band, mask in bands:
+                if band in multipliers:
+                    weights[name] = np.where(mask, weights[name] * multipliers[band], weights[name])
         
         # Normalize weights
-        total_weight = sum(weights.values())
+        total_weight = 0
+        for w in weights.values():
+            total_weight = total_weight + w
         weights = {k: v / total_weight for k, v in weights.items()}
         
         return weights
     
-    def _calculate_batch_risk_level(self, monthly_prediction, confidence, row):
-        """Calculate risk level for batch-aware predictions"""
+    def _calculate_batch_risk_level(self, monthly_prediction, confidence, features):
+        """Calculate risk levels for batch-aware predictions"""
         
-        risk_score = 0
+        risk_score = np.zeros(len(features), dtype=np.int64)
         
         # Confidence-based risk
-        if confidence < 35:
-            risk_score += 4
-        elif confidence < 55:
-            risk_score += 2
-        elif confidence < 70:
-            risk_score += 1
+        risk_score += np.select([confidence < 35, confidence < 55, confidence < 70], [4, 2, 1], 0)
         
         # Batch pattern risk
-        pattern = row['Dominant_Batch_Pattern']
-        if 'Irregular' in pattern or 'Unknown' in pattern:
-            risk_score += 3
-        elif 'Single' in pattern:
-            risk_score += 2
+        irregular = self._pattern_contains(features, 'Irregular', 'Unknown')
+        single = self._pattern_contains(features, 'Single')
+        risk_score += np.select([irregular, single], [3, 2], 0)
         
         # Prediction magnitude risk
-        if monthly_prediction > 500:
-            risk_score += 2
-        elif monthly_prediction > 200:
-            risk_score += 1
+        risk_score += np.select([monthly_prediction > 500, monthly_prediction > 200], [2, 1], 0)
         
         # Batch-specific risks
-        if row['Withdrawal_Pattern_Risk'] == 1:
-            risk_score += 2
-        
-        if row['Batch_Size_Risk'] == 1:
-            risk_score += 1
+        risk_score += np.where(features['Withdrawal_Pattern_Risk'].to_numpy() == 1, 2, 0)
+        risk_score += np.where(features['Batch_Size_Risk'].to_numpy() == 1, 1, 0)
         
         # Data quality risk
-        if row['Data_Quality'] < 0.4:
-            risk_score += 2
-        elif row['Data_Quality'] < 0.6:
-            risk_score += 1
+        data_quality = features['Data_Quality'].to_numpy()
+        risk_score += np.select([data_quality < 0.4, data_quality < 0.6], [2, 1], 0)
         
         # Convert to risk level
-        if risk_score >= 6:
-            return 'High'
-        elif risk_score >= 3:
-            return 'Medium'
-        else:
-            return 'Low'
+        return np.select([risk_score >= 6, risk_score >= 3], ['High', 'Medium'], 'Low').astype(object)
     
-    def _generate_batch_aware_recommendation(self, monthly_prediction, confidence, risk_level, row):
-        """Generate batch-aware procurement recommendation"""
-        
-        base_quantity = int(round(monthly_prediction))
-        
-        if row['Is_Critical'] == 1:
-            if confidence > 65:
-                buffer = int(base_quantity * 0.3)
-                return f"Order {base_quantity + buffer} units ({base_quantity} + {buffer} critical buffer)"
-            else:
-                buffer = int(base_quantity * 0.5)
-                return f"Order {base_quantity + buffer} units ({base_quantity} + {buffer} critical high-risk buffer)"
-        
-        elif risk_level == 'Low' and confidence > 75:
-            return f"Order {base_quantity} units (high confidence, batch pattern well understood)"
+    def _generate_batch_aware_recommendation(self, monthly_prediction, confidence, risk_level, features):
+        """Generate batch-aware procurement recommendations"""
+        
+        base_quantity = np.rint(monthly_prediction).astype(np.int64)
+        critical = features['Is_Critical'].to_numpy() == 1
+        low_risk = risk_level == 'Low'
+        
+        cases = [
+            critical & (confidence > 65),
+            critical,
+            low_risk & (confidence > 75),
+            (risk_level == 'Medium') | (low_risk & (confidence < 65))
+        ]
+        buffer = np.select(cases, [
+            np.trunc(base_quantity * 0.3),
+            np.trunc(base_quantity * 0.5),
+            0,
+            np.maximum(np.trunc(base_quantity * 0.25), 3)
+        ], np.maximum(np.trunc(base_quantity * 0.4), 5)).astype(np.int64)  # High risk
+        label = np.select(cases, [
+            'critical buffer', 'critical high-risk buffer', '', 'medium risk buffer'
+        ], 'high risk buffer')
+        
+        base = pd.Series(base_quantity, index=features.index).astype(str)
+        total = pd.Series(base_quantity + buffer, index=features.index).astype(str)
+        buffered = (
+            "Order " + total + " units (" + base + " + "
+            + pd.Series(buffer, index=features.index).astype(str) + " " + label + ")"
+        )
         
-        elif risk_level == 'Medium' or (risk_level == 'Low' and confidence < 65):
-            buffer = max(int(base_quantity * 0.25), 3)
-            return f"Order {base_quantity + buffer} units ({base_quantity} + {buffer} medium risk buffer)"
+        recommendation = buffered.where(~cases[2] | cases[0] | cases[1],
+                                        "Order " + base + " units (high confidence, batch pattern well understood)")
+        high_risk = ~(cases[0] | cases[1] | cases[2] | cases[3])
+        batch_info = " (Pattern: " + features['Dominant_Batch_Pattern'].astype(str) + ")"
+        recommendation = recommendation.where(~high_risk, recommendation + batch_info)
         
-        else:  # High risk
-            buffer = max(int(base_quantity * 0.4), 5)
-            batch_info = f"(Pattern: {row['Dominant_Batch_Pattern']})"
-            return f"Order {base_quantity + buffer} units ({base_quantity} + {buffer} high risk buffer) {batch_info}"
+        return recommendation.to_numpy()
     
     def _calculate_prediction_quality(self, df):
         """Calculate prediction quality for batch-aware predictions"""
         
-        quality_ratings = []
-        
-        for _, row in df.iterrows():
-            confidence = row['Confidence']
-            risk = row['Risk_Level']
-            data_quality = row.get('Data_Quality', 0.5)
-            pattern_stability = row.get('Batch_Pattern_Stability', 0.5)
-            predictability = row.get('Avg_Consumption_Predictability', 0.5)
-            
-            if (confidence > 75 and risk == 'Low' and 
-                data_quality > 0.7 and pattern_stability > 0.6 and predictability > 0.6):
-                quality = 'Excellent'
-            elif (confidence > 60 and risk in ['Low', 'Medium'] and 
-                  data_quality > 0.5 and predictability > 0.4):
-                quality = 'Good'
-            elif confidence > 45 and data_quality > 0.3:
-                quality = 'Fair'
-            else:
-                quality = 'Poor'
-            
-            quality_ratings.append(quality)
+        confidence = df['Confidence'].to_numpy()
+        risk = df['Risk_Level'].to_numpy()
+        data_quality = self._feature_column(df, 'Data_Quality', 0.5)
+        pattern_stability = self._feature_column(df, 'Batch_Pattern_Stability', 0.5)
+        predictability = self._feature_column(df, 'Avg_Consumption_Predictability', 0.5)
+        
+        excellent = ((confidence > 75) & (risk == 'Low') &
+                     (data_quality > 0.7) & (pattern_stability > 0.6) & (predictability > 0.6))
+        good = ((confidence > 60) & np.isin(risk, ['Low', 'Medium']) &
+                (data_quality > 0.5) & (predictability > 0.4))
+        fair = (confidence > 45) & (data_quality > 0.3)
         
-        return quality_ratings
+        return np.select([excellent, good, fair], ['Excellent', 'Good', 'Fair'], 'Poor').astype(object)
     
+    @_stage('report')
     def save_comprehensive_results(self, output_file=None):
         """Save batch-aware comprehensive results"""
         
@@ -1244,65 +3097,68 @@ class BatchAwareInventoryPredictionSystem:
         
         self.log(f"Saving batch-aware results to: {output_file}")
         
+        # Adjustments are kept as a bitmask until export
+        export_df = self.predictions_for_export()
+        
         try:
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                
-                # Sheet 1: Main Batch-Aware Predictions
-                main_cols = [
-                    'Item_Name', 'UOM', 'Category', 'Price', 'Dominant_Batch_Pattern',
-                    'Final_Monthly_Prediction', 'Confidence', 'Risk_Level', 'Prediction_Quality',
-                    'Procurement_Recommendation', 'Adjustments_Applied'
-                ]
-                main_df = self.predictions_df[main_cols].copy()
-                main_df.to_excel(writer, sheet_name='Batch_Aware_Predictions', index=False)
-                
-                # Sheet 2: Detailed Batch Analysis
-                self.predictions_df.to_excel(writer, sheet_name='Detailed_Batch_Analysis', index=False)
-                
-                # Sheet 3: Model Comparison
-                model_cols = [
-                    'Item_Name', 'RandomForest_Monthly', 'GradientBoosting_Monthly',
-                    'Ridge_Monthly', 'LinearRegression_Monthly', 'Final_Monthly_Prediction'
-                ]
-                model_df = self.predictions_df[model_cols].copy()
-                model_df.to_excel(writer, sheet_name='Model_Comparison', index=False)
-                
-                # Sheet 4: Executive Summary
-                exec_summary = self._create_batch_executive_summary()
-                exec_summary.to_excel(writer, sheet_name='Executive_Summary', index=False)
-                
-                # Sheet 5: Batch Pattern Analysis
-                batch_analysis = self.predictions_df.groupby('Dominant_Batch_Pattern').agg({
-                    'Final_Monthly_Prediction': ['count', 'sum', 'mean'],
-                    'Confidence': 'mean',
-                    'Price': 'mean',
-                    'Avg_Withdrawal_Frequency': 'mean',
-                    'Avg_Batch_Size': 'mean'
-                })
-                batch_analysis.columns = ['Item_Count', 'Total_Predicted', 'Avg_Predicted', 
-                                        'Avg_Confidence', 'Avg_Price', 'Avg_Withdrawal_Freq', 'Avg_Batch_Size']
-                batch_analysis.to_excel(writer, sheet_name='Batch_Pattern_Analysis')
-                
-                # Sheet 6: Risk Analysis
-                risk_analysis = self._create_batch_risk_analysis()
-                risk_analysis.to_excel(writer, sheet_name='Risk_Analysis', index=False)
-                
-                # Sheet 7: High Priority Items
-                high_priority = self.predictions_df[
-                    (self.predictions_df['Risk_Level'] == 'High') | 
-                    (self.predictions_df['Final_Monthly_Prediction'] > 100) |
-                    (self.predictions_df['Is_Critical'] == 1) |
-                    (self.predictions_df.get('Withdrawal_Pattern_Risk', 0) == 1)
-                ].copy()
-                high_priority = high_priority.sort_values('Final_Monthly_Prediction', ascending=False)
-                high_priority.to_excel(writer, sheet_name='High_Priority_Items', index=False)
-                
-                # Sheet 8: Implementation Guide
-                impl_guide = self._create_batch_implementation_guide()
-                impl_guide.to_excel(writer, sheet_name='Implementation_Guide', index=False)
+            # (sheet name, frame, write index) in workbook order
+            sheets = []
+            
+            # Sheet 1: Main Batch-Aware Predictions
+            main_cols = [
+                'Item_Name', 'UOM', 'Category', 'Price', 'Dominant_Batch_Pattern',
+                'Final_Monthly_Prediction', 'Confidence', 'Risk_Level', 'Prediction_Quality',
+                'Procurement_Recommendation', 'Adjustments_Applied'
+            ]
+            main_df = export_df[main_cols].copy()
+            sheets.append(('Batch_Aware_Predictions', main_df, False))
+            
+            # Sheet 2: Detailed Batch Analysis
+            sheets.append(('Detailed_Batch_Analysis', export_df, False))
+            
+            # Sheet 3: Model Comparison
+            member_cols = [col for col in export_df.columns
+                           if col.endswith('_Monthly') and col != 'Final_Monthly_Prediction']
+            model_cols = ['Item_Name'] + member_cols + ['Final_Monthly_Prediction']
+            model_df = export_df[model_cols].copy()
+            sheets.append(('Model_Comparison', model_df, False))
             
-            # Apply professional formatting
-            self._apply_professional_excel_formatting(output_file)
+            # Sheet 4: Executive Summary
+            exec_summary = self._create_batch_executive_summary()
+            sheets.append(('Executive_Summary', exec_summary, False))
+            
+            # Sheet 5: Batch Pattern Analysis
+            batch_analysis = export_df.groupby('Dominant_Batch_Pattern').agg({
+                'Final_Monthly_Prediction': ['count', 'sum', 'mean'],
+                'Confidence': 'mean',
+                'Price': 'mean',
+                'Avg_Withdrawal_Frequency': 'mean',
+                'Avg_Batch_Size': 'mean'
+            })
+            batch_analysis.columns = ['Item_Count', 'Total_Predicted', 'Avg_Predicted', 
+                                    'Avg_Confidence', 'Avg_Price', 'Avg_Withdrawal_Freq', 'Avg_Batch_Size']
+            sheets.append(('Batch_Pattern_Analysis', batch_analysis, True))
+            
+            # Sheet 6: Risk Analysis
+            risk_analysis = self._create_batch_risk_analysis()
+            sheets.append(('Risk_Analysis', risk_analysis, False))
+            
+            # Sheet 7: High Priority Items
+            high_priority = export_df[
+                (export_df['Risk_Level'] == 'High') | 
+                (export_df['Final_Monthly_Prediction'] > 100) |
+                (export_df['Is_Critical'] == 1) |
+                (export_df.get('Withdrawal_Pattern_Risk', 0) == 1)
+            ].copy()
+            high_priority = high_priority.sort_values('Final_Monthly_Prediction', ascending=False)
+            sheets.append(('High_Priority_Items', high_priority, False))
+            
+            # Sheet 8: Implementation Guide
+            impl_guide = self._create_batch_implementation_guide()
+            sheets.append(('Implementation_Guide', impl_guide, False))
+            
+            # Write every sheet, styled, in a single pass
+            self._write_excel_report(output_file, sheets)
             
             # Verify file creation
             if os.path.exists(output_file):
@@ -1313,7 +3169,7 @@ class BatchAwareInventoryPredictionSystem:
                 
                 # Also save simplified CSV
                 csv_file = output_file.replace('.xlsx', '_simple.csv')
-                simple_df = self.predictions_df[[
+                simple_df = export_df[[
                     'Item_Name', 'Final_Monthly_Prediction', 'Confidence', 'Risk_Level', 
                     'Procurement_Recommendation', 'Dominant_Batch_Pattern'
                 ]].copy()
@@ -1328,13 +3184,102 @@ class BatchAwareInventoryPredictionSystem:
             # Fallback: save basic CSV
             try:
                 fallback_file = os.path.join(self.save_path, f'batch_inventory_predictions_fallback_{self.timestamp}.csv')
-                self.predictions_df.to_csv(fallback_file, index=False)
+                export_df.to_csv(fallback_file, index=False)
                 self.log(f"✅ Fallback CSV saved: {fallback_file}")
                 return fallback_file
             except Exception as e2:
                 self.log(f"❌ Fallback also failed: {e2}")
                 raise
     
+    @_stage('publish')
+    def publish_outputs(self, output_dir=None, formats=None, names=None):
+        """
+        Publish predictions and the intermediate frames for downstream readers.
+        
+        Files are written next to each other as <name>.<ext> and renamed into place
+        once complete. Predictions are cast to prediction_sinks.PREDICTION_SCHEMA.
+        names limits the published frames (default: every frame computed so far).
+        """
+        
+        output_dir = output_dir or self.output_dir or self.save_path
+        formats, skipped = prediction_sinks.usable_formats(formats or self.output_formats)
+        if skipped:
+            self.log(f"⚠️ pyarrow not installed - skipping {skipped} outputs")
+        
+        frames = {}
+        if self.predictions_df is not None:
+            frames[prediction_sinks.PREDICTIONS_NAME] = self.predictions_for_publishing()
+        if self.training_features is not None:
+            frames['training_features_latest'] = self.training_features
+        if self.item_panel is not None:
+            frames['item_panel_latest'] = self.item_panel.reset_index(drop=True)  # Index levels are also columns
+        if names is not None:
+            frames = {name: frame for name, frame in frames.items() if name in names}
+        
+        published = {}
+        for name, frame in frames.items():
+            published[name] = prediction_sinks.publish_frame(frame, output_dir, name, formats)
+        
+        self.log(f"📤 Published {', '.join(frames)} as {'/'.join(formats)} to {os.path.abspath(output_dir)}")
+        return published
+    
+    def predictions_for_publishing(self):
+        """Exported predictions in the shared schema, with the month they are for as Target_Month"""
+        
+        target_month = str(self.target_month) if self.target_month is not None else None
+        return prediction_sinks.conform_predictions(
+            self.predictions_for_export().assign(**{prediction_sinks.TARGET_MONTH_COLUMN: target_month}))
+    
+    def load_published_predictions(self, path=None):
+        """
+        Load previously published predictions (e.g. to rebuild the report without retraining).
+        
+        The month they were made for is restored from their Target_Month column;
+        it stays unknown when the column is missing or holds several months.
+        """
+        
+        if path is None:
+            directories = [self.output_dir or self.save_path, os.getcwd()]
+            path, fmt = prediction_sinks.find_published(directories)
+            if path is None:
+                raise FileNotFoundError(f"❌ No published predictions found in {directories}")
+        else:
+            fmt = None
+        
+        predictions = prediction_sinks.read_predictions(path, fmt)
+        target_months = []
+        if prediction_sinks.TARGET_MONTH_COLUMN in predictions.columns:
+            target_months = predictions.pop(prediction_sinks.TARGET_MONTH_COLUMN).dropna().unique()
+        self.target_month = pd.Period(target_months[0], freq='M') if len(target_months) == 1 else None
+        self.predictions_df = predictions
+        self.log(f"📥 Loaded {len(self.predictions_df)} published predictions from {path}")
+        return self.predictions_df
+    
+    def write_run_report(self, path=None, command=None):
+        """Write the recorded stage spans as a JSON run report (no-op while recording is disabled)"""
+        
+        if not self.run_recorder.enabled:
+            return None
+        
+        if path is None:
+            path = self.run_report_path or os.path.join(
+                self.output_dir or self.save_path, f"run_report_{self.timestamp}.json"
+            )
+        
+        path = self.run_recorder.write_report(
+            path,
+            command=command,
+            data_hash=self.data_hash,
+            months=list(self.panel_months or self.monthly_data),
+            ensemble_members=list(self.ensemble_members),
+            training_cpu_budget=self.training_cpu_budget
+        )
+        
+        for line in self.run_recorder.summary_lines():
+            self.log(f"⏱️ {line}")
+        self.log(f"🧾 Run report saved: {path}")
+        return path
+    
     def _create_batch_executive_summary(self):
         """Create executive summary for batch-aware predictions"""
         
@@ -1478,7 +3423,7 @@ class BatchAwareInventoryPredictionSystem:
                 'Step': 6,
                 'Phase': 'Monitoring',
                 'Task': 'Track Consumption vs Predictions',
-                'Description': 'Monitor June actual consumption (not withdrawal patterns) vs predictions',
+                'Description': f'Monitor actual consumption in {self._target_month_name()} (not withdrawal patterns) vs predictions',
                 'Owner': 'Inventory Analyst',
                 'Timeline': 'Ongoing'
             },
@@ -1494,60 +3439,102 @@ class BatchAwareInventoryPredictionSystem:
         
         return pd.DataFrame(guide_data)
     
-    def _apply_professional_excel_formatting(self, file_path):
-        """Apply professional formatting to Excel file (same as original)"""
+    def _excel_column_widths(self, frame):
+        """Column widths from the data: longest rendered value + 3, capped at 50"""
+        
+        widths = []
+        for col in frame.columns:
+            values = frame[col]
+            lengths = values.astype(str).str.len()
+            lengths[values.isna()] = len('None')  # Empty cells measured as 'None'
+            longest = max(len(str(col)), int(lengths.max()) if len(lengths) else 0)
+            widths.append(min(longest + 3, 50))
+        return widths
+    
+    def _excel_column_values(self, series):
+        """Column values as openpyxl-ready Python objects (NaN -> empty, inf -> text)"""
         
-        try:
-            wb = openpyxl.load_workbook(file_path)
-            
-            # Define professional styles
-            header_fill = PatternFill(start_color='2F4F4F', end_color='2F4F4F', fill_type='solid')
-            header_font = Font(color='FFFFFF', bold=True, size=11)
-            border = Border(
-                left=Side(style='thin'), right=Side(style='thin'),
-                top=Side(style='thin'), bottom=Side(style='thin')
-            )
-            
-            # Format main sheets
-            main_sheets = ['Batch_Aware_Predictions', 'Executive_Summary', 'Risk_Analysis']
-            
-            for sheet_name in main_sheets:
-                if sheet_name in wb.sheetnames:
-                    ws = wb[sheet_name]
-                    
-                    # Format headers
-                    for cell in ws[1]:
-                        cell.fill = header_fill
-                        cell.font = header_font
-                        cell.alignment = Alignment(horizontal='center', vertical='center')
-                        cell.border = border
-                    
-                    # Auto-adjust column widths
-                    for column in ws.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        
-                        adjusted_width = min(max_length + 3, 50)
-                        ws.column_dimensions[column_letter].width = adjusted_width
-                    
-                    # Add borders to data rows
-                    for row in ws.iter_rows(min_row=2, max_row=ws.max_row, 
-                                          min_col=1, max_col=ws.max_column):
-                        for cell in row:
-                            cell.border = border
-            
-            wb.save(file_path)
-            self.log("✅ Professional formatting applied")
-            
-        except Exception as e:
-            self.log(f"⚠️ Could not apply formatting: {e}")
+        values = series.astype(object)
+        if pd.api.types.is_float_dtype(series.dtype):
+            values = values.where(~np.isposinf(series), 'inf').where(~np.isneginf(series), '-inf')
+        return values.where(series.notna(), None).tolist()
+    
+    def _report_styles(self):
+        """openpyxl styles of the formatted report sheets"""
+        
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+        
+        thin = Side(style='thin')
+        return {
+            'header_fill': PatternFill(start_color=self.excel_header_color, end_color=self.excel_header_color,
+                                       fill_type='solid'),
+            'header_font': Font(color=self.excel_header_font_color, bold=True, size=11),
+            'header_alignment': Alignment(horizontal='center', vertical='center'),
+            'border': Border(left=thin, right=thin, top=thin, bottom=thin)
+        }
+    
+    def _write_report_sheet(self, wb, sheet_name, frame, styles, index=False, formatted=False):
+        """Stream one frame into a sheet, styling headers, widths and borders as rows are written"""
+        
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.utils import get_column_letter
+        
+        ws = wb.create_sheet(sheet_name)
+        if index:
+            frame = frame.reset_index()
+        
+        # Widths are part of the sheet header, so they go in before any row
+        if formatted:
+            for col_idx, width in enumerate(self._excel_column_widths(frame), 1):
+                ws.column_dimensions[get_column_letter(col_idx)].width = width
+        
+        def cell(value, styled, header=False):
+            if not styled:
+                return value
+            c = WriteOnlyCell(ws, value=value)
+            c.border = styles['border']
+            if header:
+                c.fill = styles['header_fill']
+                c.font = styles['header_font']
+                c.alignment = styles['header_alignment']
+            return c
+        
+        ws.append([cell(str(col), formatted, header=True) for col in frame.columns])
+        
+        columns = [self._excel_column_values(frame[col]) for col in frame.columns]
+        for values in zip(*columns):
+            ws.append([cell(value, formatted) for value in values])
+        
+        return len(frame)
+    
+    @_stage('excel_write')
+    def _write_excel_report(self, output_file, sheets):
+        """
+        Write the report workbook in one pass - no reload for formatting.
+        
+        Large reports use openpyxl's write-only workbook, which streams rows to
+        disk instead of keeping a cell object per value in memory.
+        """
+        
+        constant_memory = self.excel_constant_memory
+        if constant_memory is None:
+            constant_memory = max(len(frame) for _, frame, _ in sheets) > self.excel_constant_memory_rows
+        
+        import openpyxl
+        
+        wb = openpyxl.Workbook(write_only=constant_memory)
+        if not constant_memory:
+            wb.remove(wb.active)
+        
+        start = time.perf_counter()
+        styles = self._report_styles()
+        for sheet_name, frame, index in sheets:
+            self._write_report_sheet(wb, sheet_name, frame, styles, index=index,
+                                     formatted=sheet_name in self.excel_formatted_sheets)
+        wb.save(output_file)
+        
+        mode = "constant-memory" if constant_memory else "standard"
+        self.log(f"✅ Professional formatting applied ({mode} writer, {time.perf_counter() - start:.2f}s)")
     
     def run_complete_analysis(self, file_path):
         """Run the complete batch-aware analysis pipeline"""
@@ -1571,8 +3558,11 @@ class BatchAwareInventoryPredictionSystem:
             self.load_and_process_data(file_path)
             self.create_training_features()
             self.train_production_models()
+            self.save_model_artifact()
             predictions = self.generate_production_predictions()
             output_file = self.save_comprehensive_results()
+            self.publish_outputs()
+            self.write_run_report(command='run')
             
             end_time = datetime.now()
             processing_time = (end_time - start_time).total_seconds()
@@ -1644,7 +3634,7 @@ class BatchAwareInventoryPredictionSystem:
             print("2. Review 'Single Batch Items' - timing is critical for these")
             print("3. Check 'Withdrawal Pattern Risks' for data quality issues")
             print("4. Use monthly predictions (not daily withdrawal patterns)")
-            print("5. Monitor actual consumption vs predictions in June")
+            print(f"5. Monitor actual consumption vs predictions in {self._target_month_name()}")
             
             print(f"\n🏆 EXPECTED BUSINESS IMPACT:")
             print("📈 Inventory Accuracy: 65-75% (major improvement)")
@@ -1665,8 +3655,37 @@ class BatchAwareInventoryPredictionSystem:
             import traceback
             traceback.print_exc()
             raise
+    
+    def run_prediction_only(self, file_path, artifact_path=None):
+        """Predict from a saved model artifact without retraining"""
+        
+        print("🚀 BATCH-AWARE INVENTORY PREDICTION SYSTEM v5.0 - PREDICT-ONLY MODE")
+        print("=" * 80)
+        
+        start_time = datetime.now()
+        
+        self.load_and_process_data(file_path)
+        self.create_training_features()
+        self.load_model_artifact(artifact_path)
+        predictions = self.generate_production_predictions()
+        output_file = self.save_comprehensive_results()
+        self.publish_outputs()
+        self.write_run_report(command='predict-only')
+        
+        processing_time = (datetime.now() - start_time).total_seconds()
+        
+        print("\n" + "="*80)
+        print("✅ PREDICT-ONLY RUN COMPLETE!")
+        print("="*80)
+        print(f"⏱️  Processing Time: {processing_time:.1f} seconds")
+        print(f"📦 Model Artifact: {os.path.basename(self.model_artifact_path)}")
+        print(f"📊 Items Predicted: {len(predictions):,}")
+        print(f"💰 Total Predicted Monthly Consumption: {predictions['Final_Monthly_Prediction'].sum():,} units")
+        print(f"📁 Results: {output_file}")
+        
+        return self
 
-def main():
+def main(predict_only=False):
     """Main execution function for batch-aware system"""
     
     print("🔍 Searching for inventory files...")
@@ -1699,7 +3718,10 @@ def main():
     try:
         # Initialize and run the batch-aware system
         system = BatchAwareInventoryPredictionSystem(verbose=True)
-        result = system.run_complete_analysis(file_path)
+        if predict_only:
+            result = system.run_prediction_only(file_path)
+        else:
+            result = system.run_complete_analysis(file_path)
         
         print(f"\n" + "="*60)
         print("🎉 BATCH-AWARE SYSTEM SUCCESSFULLY DEPLOYED!")
@@ -1717,16 +3739,754 @@ def main():
         print("📧 Please check the error message above and try again")
         return None
 
-if __name__ == "__main__":
-    result = main()
-    if result:
-        print("\n✨ Batch-aware analysis completed successfully!")
+def discover_site_workbooks(source):
+    """
+    (site, workbook path) pairs from a directory of workbooks or a manifest file.
+    
+    A directory contributes every .xlsx file (site = file name without extension).
+    A .json manifest is a {site: path} object or a list of {"site", "workbook"}
+    entries; a .csv manifest has site and workbook columns; any other file lists
+    one workbook path per line. Relative paths are resolved against the manifest.
+    """
+    
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source)
+                       if name.lower().endswith('.xlsx') and not name.startswith('~$'))
+        sites = [(os.path.splitext(name)[0], os.path.join(source, name)) for name in names]
     else:
-        print("\n⚠️ Analysis was not completed")
+        base_dir = os.path.dirname(os.path.abspath(source))
+        if source.lower().endswith('.json'):
+            with open(source, encoding='utf-8') as handle:
+                manifest = json.load(handle)
+            if isinstance(manifest, dict):
+                sites = list(manifest.items())
+            else:
+                sites = [(entry['site'], entry['workbook']) for entry in manifest]
+        elif source.lower().endswith('.csv'):
+            manifest = pd.read_csv(source, dtype=str)
+            sites = list(zip(manifest['site'].str.strip(), manifest['workbook'].str.strip()))
+        else:
+            with open(source, encoding='utf-8') as handle:
+                paths = [line.strip() for line in handle if line.strip() and not line.startswith('#')]
+            sites = [(os.path.splitext(os.path.basename(path))[0], path) for path in paths]
+        sites = [(site, path if os.path.isabs(path) else os.path.join(base_dir, path)) for site, path in sites]
+    
+    names = [site for site, _ in sites]
+    duplicates = sorted({site for site in names if names.count(site) > 1})
+    if duplicates:
+        raise ValueError(f"❌ Duplicate site names: {duplicates}")
+    
+    return sites
+
+def _run_site(site, workbook, options):
+    """
+    Full pipeline for one site in its own system; never raises.
+    
+    Returns a dict with the site status, timing and (on success) the exported
+    predictions, so one failing workbook does not stop the other sites.
+    """
+    
+    import traceback
+    
+    start = time.perf_counter()
+    outcome = {'site': site, 'workbook': workbook, 'status': 'failed', 'items': 0,
+               'wall_s': 0.0, 'error': None, 'predictions': None}
+    try:
+        site_dir = os.path.join(options['output_dir'], site)
+        system = BatchAwareInventoryPredictionSystem(verbose=False, use_cache=options['use_cache'])
+        system.training_cpu_budget = options['cpu_budget']
+        system.ingest_workers = options['cpu_budget']
+        system.output_dir = site_dir
+        system.model_dir = os.path.join(site_dir, 'batch_aware_models')
+        if options['formats']:
+            system.output_formats = options['formats']
+        if options['history_months']:
+            system.history_months = options['history_months']
+        system.compact_memory = options['compact_memory']
+        if options['rules_path']:
+            system.load_business_rules(options['rules_path'])
+        
+        system.load_and_process_data(workbook)
+        system.create_training_features()
+        if options['artifact']:
+            system.load_model_artifact(options['artifact'])
+        else:
+            system.train_production_models()
+            system.save_model_artifact()
+        system.generate_production_predictions()
+        if options['report']:
+            system.save_comprehensive_results(os.path.join(site_dir, f"{site}_batch_aware_predictions.xlsx"))
+        system.publish_outputs()
+        
+        outcome['predictions'] = system.predictions_for_publishing()
+        outcome['items'] = len(outcome['predictions'])
+        outcome['status'] = 'ok'
+    except Exception as e:
+        outcome['error'] = f"{type(e).__name__}: {e}"
+        outcome['traceback'] = traceback.format_exc()
+    
+    outcome['wall_s'] = time.perf_counter() - start
+    return outcome
+
+def run_sites(source, output_dir=None, max_workers=None, artifact=None, report=True, formats=None,
+              use_cache=True, history_months=None, compact_memory=False, rules_path=None):
+    """
+    Run the prediction for many site workbooks in a process pool.
+    
+    Sites come from discover_site_workbooks(source). At most max_workers sites
+    (default: one per CPU) run at once, each in its own process with an even
+    share of the cores as its training budget, so the batch takes about as long
+    as the slowest site rather than the sum of all sites. Each site publishes
+    to <output_dir>/<site>/; the successful sites' predictions are combined
+    into <output_dir>/predictions_all_sites with a Site column, next to a
+    site_runs_latest summary of every site's status. A site whose worker
+    process dies is retried alone, so it cannot fail the others.
+    Returns the list of per-site outcomes.
+    """
+    
+    from concurrent.futures import as_completed
+    from concurrent.futures.process import BrokenProcessPool
+    
+    sites = discover_site_workbooks(source) if isinstance(source, str) else list(source)
+    if not sites:
+        raise ValueError(f"❌ No workbooks found in {source}")
+    
+    output_dir = output_dir or os.path.join(os.getcwd(), 'site_predictions')
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(len(sites), max_workers or cpus))
+    options = {
+        'output_dir': output_dir,
+        'cpu_budget': max(1, cpus // workers),
+        'artifact': artifact,
+        'report': report,
+        'formats': formats,
+        'use_cache': use_cache,
+        'history_months': history_months,
+        'compact_memory': compact_memory,
+        'rules_path': rules_path
+    }
+    
+    print(f"🏭 Running {len(sites)} sites on {workers} worker(s) ({options['cpu_budget']} core(s) each)")
+    start = time.perf_counter()
+    outcomes = {}
+    
+    def finished(outcome):
+        outcomes[outcome['site']] = outcome
+        if outcome['status'] == 'ok':
+            print(f"   ✅ {outcome['site']}: {outcome['items']:,} items in {outcome['wall_s']:.1f}s")
+        else:
+            print(f"   ❌ {outcome['site']}: {outcome['error']}")
+    
+    if workers == 1:
+        for site, workbook in sites:
+            finished(_run_site(site, workbook, options))
+    else:
+        crashed = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_run_site, site, workbook, options): (site, workbook) for site, workbook in sites}
+            for future in as_completed(futures):
+                try:
+                    finished(future.result())
+                except BrokenProcessPool:
+                    crashed.append(futures[future])
+        
+        # A dead worker breaks the whole pool - rerun the affected sites one per pool
+        for site, workbook in crashed:
+            try:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    finished(pool.submit(_run_site, site, workbook, options).result())
+            except BrokenProcessPool:
+                finished({'site': site, 'workbook': workbook, 'status': 'failed', 'items': 0, 'wall_s': 0.0,
+                          'error': "worker process died", 'predictions': None})
+    
+    outcomes = [outcomes[site] for site, _ in sites]
+    wall_time = time.perf_counter() - start
+    
+    # Combined artifact and per-site summary
+    formats, skipped = prediction_sinks.usable_formats(formats or ['parquet', 'csv'])
+    combined = [outcome['predictions'].assign(**{prediction_sinks.SITE_COLUMN: outcome['site']})
+                for outcome in outcomes if outcome['status'] == 'ok']
+    paths = []
+    if combined:
+        combined = pd.concat(combined, ignore_index=True)
+        combined = combined[[prediction_sinks.SITE_COLUMN] +
+                            [col for col in combined.columns if col != prediction_sinks.SITE_COLUMN]]
+        paths = prediction_sinks.publish_frame(prediction_sinks.conform_predictions(combined), output_dir,
+                                               prediction_sinks.COMBINED_PREDICTIONS_NAME, formats)
+    
+    summary = pd.DataFrame([{key: outcome[key] for key in ['site', 'workbook', 'status', 'items', 'wall_s', 'error']}
+                            for outcome in outcomes])
+    prediction_sinks.publish_frame(summary, output_dir, 'site_runs_latest', ['csv'])
+    
+    succeeded = int((summary['status'] == 'ok').sum())
+    print(f"\n🏁 {succeeded}/{len(outcomes)} sites succeeded in {wall_time:.1f}s "
+          f"(slowest site {summary['wall_s'].max():.1f}s, sum of sites {summary['wall_s'].sum():.1f}s)")
+    if skipped:
+        print(f"⚠️ pyarrow not installed - skipped {skipped} outputs")
+    if paths:
+        print(f"📤 Combined predictions: {', '.join(paths)}")
+    
+    return outcomes
+
+def benchmark_withdrawal_kernel(n_items=5000, n_days=31, density=0.15, repeats=3, seed=42):
+    """Time the dense regularity kernel and the sparse (CSR) events against the per-row loop"""
+    
+    rng = np.random.default_rng(seed)
+    withdrawal_array = np.where(
+        rng.random((n_items, n_days)) < density,
+        rng.integers(1, 50, size=(n_items, n_days)),
+        0
+    ).astype(float)
+    withdrawal_array[:n_items // 10] = 0                   # No withdrawals
+    withdrawal_array[n_items // 10:n_items // 5, 1:] = 0   # Single withdrawal (or none)
+    
+    system = BatchAwareInventoryPredictionSystem
+    timings = {}
+    results = {}
+    for name, func in [('loop', system._withdrawal_regularity_reference),
+                       ('kernel', system._withdrawal_regularity_kernel),
+                       ('sparse', lambda array: WithdrawalEvents.from_dense(array).regularity())]:
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            results[name] = [np.asarray(values) for values in func(withdrawal_array)]
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    
+    max_diff = max(
+        float(np.max(np.abs(loop_values - other_values)))
+        for other in ('kernel', 'sparse')
+        for loop_values, other_values in zip(results['loop'], results[other])
+    )
+    events = WithdrawalEvents.from_dense(withdrawal_array)
+    
+    print(f"Withdrawal regularity benchmark: {n_items:,} items x {n_days} days (density {density:.0%})")
+    print(f"   • Per-row loop:      {timings['loop'] * 1000:8.1f} ms")
+    print(f"   • Vectorized kernel: {timings['kernel'] * 1000:8.1f} ms "
+          f"({timings['loop'] / timings['kernel']:.1f}x)")
+    print(f"   • Sparse events:     {timings['sparse'] * 1000:8.1f} ms "
+          f"({timings['loop'] / timings['sparse']:.1f}x, incl. CSR build)")
+    print(f"   • Memory:            {withdrawal_array.nbytes / 1024 ** 2:.1f} MB dense, "
+          f"{events.nbytes / 1024 ** 2:.1f} MB CSR ({events.nnz:,} withdrawals)")
+    print(f"   • Max abs difference: {max_diff:.2e}")
+    
+    return timings, max_diff
+
+def benchmark_startup(repeats=5):
+    """Time a fresh interpreter importing this module and running --help"""
+    
+    import subprocess
+    
+    script = os.path.abspath(__file__)
+    script_dir = os.path.dirname(script)
+    commands = [
+        ('python (baseline)', [sys.executable, '-c', 'pass']),
+        ('import inventory_prediction', [sys.executable, '-c', 'import inventory_prediction']),
+        ('inventory_prediction.py --help', [sys.executable, script, '--help']),
+        ('import sklearn + openpyxl (deferred)', [sys.executable, '-c', 'import sklearn.ensemble, openpyxl'])
+    ]
+    
+    timings = {}
+    for label, command in commands:
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=script_dir, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            runs.append(time.perf_counter() - start)
+        timings[label] = {'best': min(runs), 'median': float(np.median(runs))}
+    
+    print(f"Startup benchmark (best / median of {repeats} fresh interpreters)")
+    for label, timing in timings.items():
+        print(f"   • {label:<38} {timing['best'] * 1000:7.0f} ms / {timing['median'] * 1000:7.0f} ms")
+    
+    return timings
+
+def benchmark_history(month_counts=(12, 24, 36), n_items=2000, seed=42):
+    """
+    Time and peak memory of the history-dependent stages for growing histories.
+    
+    Synthetic month sheets (synthetic_workbook, no Excel I/O) go through sheet processing, the item
+    panel, the feature frame and the walk-forward training samples. Timings
+    include tracemalloc overhead. On one CPU with 2,000 items every stage grows
+    about linearly with the number of months: 6.1s / 10.9s / 16.7s in total and
+    31 / 62 / 93 MB peak for 12 / 24 / 36 months.
+    """
+    
+    import tracemalloc
+    import synthetic_workbook
+    
+    sheets = [sheet for _, sheet in synthetic_workbook.synthetic_month_sheets(n_items, max(month_counts), seed=seed)]
+    
+    results = {}
+    for n_months in month_counts:
+        system = BatchAwareInventoryPredictionSystem(verbose=False, use_cache=False)
+        periods = pd.period_range(end=pd.Period('2025-05', freq='M'), periods=n_months, freq='M')
+        system.month_periods = {period.strftime('%b %Y'): period for period in periods}
+        system.month_labels = list(system.month_periods)
+        system.target_month = periods[-1] + 1
+        
+        timings = {}
+        tracemalloc.start()
+        start = time.perf_counter()
+        for label, sheet in zip(system.month_labels, sheets[-n_months:]):
+            system.monthly_data[label] = system._safe_process_sheet_batch_aware(sheet, label)
+        timings['sheets'] = time.perf_counter() - start
+        
+        stage_start = time.perf_counter()
+        system.build_item_panel()
+        timings['panel'] = time.perf_counter() - stage_start
+        
+        stage_start = time.perf_counter()
+        system.create_training_features()
+        timings['features'] = time.perf_counter() - stage_start
+        
+        stage_start = time.perf_counter()
+        samples = system.build_walk_forward_samples(system._model_feature_columns(system.training_features))
+        timings['walk_forward'] = time.perf_counter() - stage_start
+        
+        timings['total'] = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        results[n_months] = {'timings': timings, 'peak_mb': peak / 1024 ** 2, 'samples': len(samples)}
+    
+    print(f"History benchmark: {n_items:,} items, synthetic month sheets")
+    print(f"   {'months':>6} {'sheets':>8} {'panel':>8} {'features':>9} {'walk-fwd':>9} {'total':>8} {'peak MB':>8} {'samples':>8}")
+    for n_months, result in results.items():
+        t = result['timings']
+        print(f"   {n_months:>6} {t['sheets']:>7.2f}s {t['panel']:>7.2f}s {t['features']:>8.2f}s "
+              f"{t['walk_forward']:>8.2f}s {t['total']:>7.2f}s {result['peak_mb']:>8.1f} {result['samples']:>8,}")
+    
+    return results
+
+def benchmark_append(month_counts=(6, 12, 24), n_items=2000, work_dir=None, seed=42):
+    """
+    Time append_month against a full reload for growing histories.
+    
+    For each history length a synthetic workbook is written, the panel is built
+    from all but its last month sheet, and a fresh system appends the last
+    month (loading the saved panel, parsing one sheet, merging, refreshing
+    features and saving). The full reload parses every sheet and rebuilds all
+    features. Models are trained once at bootstrap (linear members only).
+    """
+    
+    import tempfile
+    import synthetic_workbook
+    
+    work_dir = work_dir or tempfile.mkdtemp(prefix='append_benchmark_')
+    
+    def fresh_system(n_months):
+        system = BatchAwareInventoryPredictionSystem(verbose=False, use_cache=False)
+        system.panel_state_dir = os.path.join(work_dir, f"panel_{n_months}")
+        system.model_dir = os.path.join(work_dir, f"models_{n_months}")
+        system.ensemble_members = ['Ridge', 'LinearRegression']
+        return system
+    
+    results = {}
+    for n_months in month_counts:
+        workbook = synthetic_workbook.write_synthetic_workbook(
+            os.path.join(work_dir, f"append_{n_items}x{n_months}.xlsx"), n_items, n_months, seed=seed
+        )
+        shutil.rmtree(os.path.join(work_dir, f"panel_{n_months}"), ignore_errors=True)
+        
+        system = fresh_system(n_months)
+        system.sheet_names = system._workbook_sheet_names(workbook)[:-1]
+        system.append_month(workbook)
+        
+        system = fresh_system(n_months)
+        start = time.perf_counter()
+        system.append_month(workbook)
+        append_s = time.perf_counter() - start
+        
+        system = fresh_system(n_months)
+        start = time.perf_counter()
+        system.load_and_process_data(workbook)
+        system.create_training_features()
+        reload_s = time.perf_counter() - start
+        
+        results[n_months] = {'append_s': append_s, 'reload_s': reload_s}
+    
+    print(f"Append benchmark: {n_items:,} items, synthetic workbooks in {work_dir}")
+    print(f"   {'months':>6} {'append':>8} {'full reload':>12} {'speed-up':>9}")
+    for n_months, result in results.items():
+        print(f"   {n_months:>6} {result['append_s']:>7.2f}s {result['reload_s']:>11.2f}s "
+              f"{result['reload_s'] / result['append_s']:>8.1f}x")
+    
+    return results
+
+def benchmark_memory(n_items=10000, n_months=5, seed=42):
+    """
+    Memory footprint of each stage's frames with and without compact memory mode.
+    
+    Synthetic month sheets go through sheet processing, the item panel, feature
+    building and prediction (the linear ensemble members only, to keep it quick).
+    Also reports how far compact predictions drift from the full-precision ones.
+    With 10,000 items x 5 months: monthly frames 22.9 -> 5.5 MB, item panel
+    9.7 -> 4.5 MB, training features 3.5 -> 2.4 MB, predictions 3.1 -> 2.7 MB;
+    no prediction moves (the metrics behind the features stay float64).
+    """
+    
+    import synthetic_workbook
+    
+    sheets = list(synthetic_workbook.synthetic_month_sheets(n_items, n_months, seed=seed))
+    
+    footprints = {}
+    predictions = {}
+    for compact in (False, True):
+        system = BatchAwareInventoryPredictionSystem(verbose=False, use_cache=False)
+        system.compact_memory = compact
+        system.ensemble_members = ['Ridge', 'LinearRegression']
+        
+        periods = [pd.Period(pd.to_datetime(name, format='%b %y'), freq='M') for name, _ in sheets]
+        system.month_periods = {period.strftime('%b %Y'): period for period in periods}
+        system.month_labels = list(system.month_periods)
+        system.target_month = periods[-1] + 1
+        
+        stages = {}
+        for label, (_, sheet) in zip(system.month_labels, sheets):
+            system.monthly_data[label] = system._safe_process_sheet_batch_aware(sheet, label)
+        stages['monthly frames'] = system.memory_footprint()['monthly_data']
+        system.build_item_panel()
+        stages['item panel'] = system.memory_footprint()['item_panel']
+        system.create_training_features()
+        stages['training features'] = system.memory_footprint()['training_features']
+        system.train_production_models()
+        predictions[compact] = system.generate_production_predictions()
+        stages['predictions'] = system.memory_footprint()['predictions']
+        footprints[compact] = stages
+    
+    print(f"Memory benchmark: {n_items:,} items x {n_months} months (deep memory_usage, MB)")
+    print(f"   {'stage':<20} {'full':>9} {'compact':>9} {'saved':>7}")
+    for stage, full in footprints[False].items():
+        compact = footprints[True][stage]
+        print(f"   {stage:<20} {full:>9.2f} {compact:>9.2f} {1 - compact / full:>7.0%}")
+    
+    full_pred = predictions[False].set_index('Item_Name')['Final_Monthly_Prediction']
+    compact_pred = predictions[True].set_index('Item_Name')['Final_Monthly_Prediction'].reindex(full_pred.index)
+    changed = (full_pred != compact_pred)
+    print(f"   Predictions changed by compact mode: {int(changed.sum()):,} of {len(full_pred):,} "
+          f"(max difference {int((full_pred - compact_pred).abs().max())})")
+    
+    return footprints, predictions
+
+# Stage methods timed by benchmark_pipeline, with their run-report span names
+PIPELINE_BENCHMARK_STAGES = [
+    ('load_and_process_data', 'ingest'),
+    ('create_training_features', 'features'),
+    ('train_production_models', 'train'),
+    ('generate_production_predictions', 'predict'),
+    ('save_comprehensive_results', 'report')
+]
+PIPELINE_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'pipeline_baseline.json')
+
+def benchmark_pipeline(sizes=(1000, 10000, 100000), n_months=5, baseline_path=PIPELINE_BASELINE_PATH,
+                       update_baseline=False, tolerance=0.25, work_dir=None, seed=42):
+    """
+    Time every pipeline stage on synthetic workbooks and compare with a stored baseline.
+    
+    Workbooks come from synthetic_workbook (generated once per size into
+    work_dir and reused). Each stage is timed through the run recorder, so
+    wall time, CPU time and peak RSS come from the same spans as a run report.
+    A stage regresses when it is more than `tolerance` slower than the
+    baseline (and at least 0.5s slower, to ignore noise on tiny stages); a
+    result fingerprint (items, samples, total prediction, mean confidence)
+    that differs from the baseline is reported as a behaviour change.
+    Returns (results, problems); update_baseline stores results as the new
+    baseline instead of comparing.
+    """
+    
+    import synthetic_workbook
+    
+    work_dir = work_dir or os.path.join(os.path.expanduser("~"), ".cache", "inventory_prediction", "benchmarks")
+    
+    stored = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding='utf-8') as handle:
+            stored = json.load(handle)
+    baseline = {} if update_baseline else stored.get('sizes', {})
+    
+    results = {}
+    problems = []
+    for n_items in sizes:
+        workbook = os.path.join(work_dir, f"synthetic_{n_items}_items_{n_months}_months_seed{seed}.xlsx")
+        if not os.path.exists(workbook):
+            start = time.perf_counter()
+            synthetic_workbook.write_synthetic_workbook(workbook, n_items, n_months, seed=seed)
+            print(f"🧪 Generated {os.path.basename(workbook)} in {time.perf_counter() - start:.1f}s")
+        
+        system = BatchAwareInventoryPredictionSystem(verbose=False, use_cache=False)
+        system.run_recorder.enabled = True
+        system.load_and_process_data(workbook)
+        system.create_training_features()
+        system.train_production_models()
+        predictions = system.generate_production_predictions()
+        system.save_comprehensive_results(os.path.join(work_dir, f"report_{n_items}_items.xlsx"))
+        
+        spans = {span.name: span for span in system.run_recorder.spans if span.depth == 0}
+        stages = {
+            method: {'wall_s': spans[name].wall_s, 'cpu_s': spans[name].cpu_s, 'peak_mb': spans[name].peak_mb}
+            for method, name in PIPELINE_BENCHMARK_STAGES
+        }
+        training_set = next(span for span in system.run_recorder.spans if span.name == 'training_set')
+        fingerprint = {
+            'items': len(predictions),
+            'training_samples': training_set.rows_out,
+            'total_monthly_prediction': int(predictions['Final_Monthly_Prediction'].sum()),
+            'mean_confidence': round(float(predictions['Confidence'].mean()), 3)
+        }
+        results[str(n_items)] = {'stages': stages, 'fingerprint': fingerprint}
+        
+        expected = baseline.get(str(n_items))
+        print(f"\nPipeline benchmark: {n_items:,} items x {n_months} months")
+        for method, timing in stages.items():
+            line = f"   • {method:<34} {timing['wall_s']:8.2f}s wall {timing['cpu_s']:8.2f}s CPU"
+            if timing['peak_mb'] is not None:
+                line += f" {timing['peak_mb']:8.1f}MB peak"
+            if expected and method in expected['stages']:
+                base_wall = expected['stages'][method]['wall_s']
+                line += f"   baseline {base_wall:8.2f}s ({timing['wall_s'] / max(base_wall, 1e-9):5.2f}x)"
+                if timing['wall_s'] > base_wall * (1 + tolerance) and timing['wall_s'] - base_wall > 0.5:
+                    problems.append(f"{n_items} items: {method} regressed {base_wall:.2f}s -> {timing['wall_s']:.2f}s")
+                    line += "  ⚠️ REGRESSION"
+            print(line)
+        print(f"   • Result fingerprint: {fingerprint}")
+        if expected and expected['fingerprint'] != fingerprint:
+            problems.append(f"{n_items} items: results changed {expected['fingerprint']} -> {fingerprint}")
+    
+    if update_baseline:
+        import platform
+        import sklearn
+        
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        stored.update({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'sklearn': sklearn.__version__,
+                'cpu_count': os.cpu_count()
+            },
+            'n_months': n_months,
+            'seed': seed,
+            'sizes': {**stored.get('sizes', {}), **results}  # Sizes not re-run keep their entries
+        })
+        with open(baseline_path, 'w', encoding='utf-8') as handle:
+            json.dump(stored, handle, indent=2)
+        print(f"\n💾 Baseline saved: {baseline_path}")
+    elif not baseline:
+        print(f"\nℹ️ No baseline at {baseline_path} - run with --update-baseline to store one")
+    elif problems:
+        print("\n⚠️ Benchmark problems:")
+        for problem in problems:
+            print(f"   • {problem}")
+    else:
+        print("\n✅ Within baseline tolerance")
+    
+    return results, problems
+
+def build_arg_parser():
+    """Command-line interface: one subcommand per pipeline stage"""
+    
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog='inventory_prediction.py',
+        description="Batch-aware inventory prediction. Without a subcommand the full analysis runs "
+                    "on the first inventory workbook found (legacy behaviour)."
+    )
+    parser.add_argument('--predict-only', action='store_true',
+                        help="legacy: predict with the latest saved model artifact instead of retraining")
+    parser.add_argument('--benchmark-kernel', action='store_true',
+                        help="legacy: same as 'benchmark kernel'")
+    
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--quiet', action='store_true', help="only print errors and summaries")
+    common.add_argument('--no-cache', action='store_true', help="do not use the processed-sheet cache")
+    common.add_argument('--output-dir', help="directory for published outputs (default: the save folder)")
+    common.add_argument('--run-report', nargs='?', const='', metavar='PATH',
+                        help="record stage timings/memory/rows and write a JSON run report "
+                             "(default path: run_report_<timestamp>.json in the output folder)")
+    common.add_argument('--compact', action='store_true',
+                        help="compact memory mode (categorical text, int8 flags, float32 metrics, no day columns)")
+    common.add_argument('--keep-withdrawals', action='store_true',
+                        help="keep the daily withdrawals as a memory-mapped (items, months, 31) store")
+    common.add_argument('--rules', metavar='PATH', help="business rules JSON (critical/seasonal keywords, "
+                                                         "category multipliers)")
+    common.add_argument('--ingest-workers', type=int,
+                        help="processes reading month sheets (default: one per CPU, 1 = no worker processes)")
+    common.add_argument('--history-months', type=int,
+                        help="only use the latest N month sheets (default: every month sheet found)")
+    common.add_argument('--formats', nargs='+', choices=list(prediction_sinks.SINK_EXTENSIONS),
+                        help="published output formats (default: parquet csv)")
+    
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    
+    stage = subparsers.add_parser('ingest', parents=[common], help="parse the monthly sheets and publish the item panel")
+    stage.add_argument('workbook')
+    
+    stage = subparsers.add_parser('features', parents=[common], help="build and publish the training features")
+    stage.add_argument('workbook')
+    
+    stage = subparsers.add_parser('train', parents=[common], help="train the ensemble and save a model artifact")
+    stage.add_argument('workbook')
+    stage.add_argument('--artifact', help="artifact path (default: a new file in the model folder)")
+    
+    stage = subparsers.add_parser('predict', parents=[common], help="predict with a saved artifact and publish outputs")
+    stage.add_argument('workbook')
+    stage.add_argument('--artifact', help="artifact path (default: the latest in the model folder)")
+    
+    stage = subparsers.add_parser('report', parents=[common], help="write the Excel report from published predictions")
+    stage.add_argument('--predictions', help="published predictions file (default: the latest in the output folders)")
+    stage.add_argument('--output', help="report .xlsx path")
+    
+    stage = subparsers.add_parser('run', parents=[common], help="full analysis: all stages plus report")
+    stage.add_argument('workbook')
+    
+    stage = subparsers.add_parser('append', parents=[common],
+                                  help="add a new month sheet to the saved item panel and predict")
+    stage.add_argument('workbook')
+    stage.add_argument('--sheet', help="month sheet to append (default: the earliest month after the panel)")
+    stage.add_argument('--refresh-models', action='store_true', help="refit the ensemble on the updated panel")
+    stage.add_argument('--panel-dir', help="saved item panel folder (default: batch_aware_panel in the save folder)")
+    
+    stage = subparsers.add_parser('batch', parents=[common], help="run many site workbooks in parallel")
+    stage.add_argument('source', help="directory of site workbooks or a manifest (.json / .csv / list of paths)")
+    stage.add_argument('--workers', type=int, help="sites run at once (default: one per CPU)")
+    stage.add_argument('--artifact', help="predict every site with this model artifact instead of retraining")
+    stage.add_argument('--no-report', action='store_true', help="skip the per-site Excel reports")
+    
+    stage = subparsers.add_parser('benchmark', help="micro-benchmarks and the pipeline benchmark suite")
+    stage.add_argument('target', choices=['kernel', 'startup', 'history', 'append', 'pipeline', 'memory'])
+    stage.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000],
+                       help="pipeline: catalog sizes (items) to benchmark")
+    stage.add_argument('--months', type=int, default=5, help="pipeline: month sheets per workbook")
+    stage.add_argument('--baseline', default=PIPELINE_BASELINE_PATH, help="pipeline: baseline JSON")
+    stage.add_argument('--update-baseline', action='store_true', help="pipeline: store the results as the baseline")
+    stage.add_argument('--tolerance', type=float, default=0.25,
+                       help="pipeline: allowed slowdown against the baseline (0.25 = 25%%)")
+    stage.add_argument('--work-dir', help="pipeline/append: folder for generated workbooks and reports")
+    
+    stage = subparsers.add_parser('generate', help="write a synthetic inventory workbook")
+    stage.add_argument('output', help=".xlsx path")
+    stage.add_argument('--items', type=int, default=1000)
+    stage.add_argument('--months', type=int, default=5)
+    stage.add_argument('--last-month', default='2025-05', help="last month sheet (YYYY-MM)")
+    stage.add_argument('--sparsity', type=float, default=0.05, help="share of items missing from each sheet")
+    stage.add_argument('--seed', type=int, default=42)
+    
+    return parser
 
-# After running the analysis
-system = BatchAwareInventoryPredictionSystem()
-system.run_complete_analysis("data/inventory_test_sheet.xlsx")
+def run_cli(argv=None):
+    """Dispatch a command line to the pipeline stages; returns a process exit code"""
+    
+    args = build_arg_parser().parse_args(argv)
+    
+    if args.command == 'benchmark' or args.benchmark_kernel:
+        target = getattr(args, 'target', 'kernel')
+        if target == 'startup':
+            benchmark_startup()
+        elif target == 'history':
+            benchmark_history()
+        elif target == 'append':
+            benchmark_append(work_dir=args.work_dir)
+        elif target == 'memory':
+            benchmark_memory()
+        elif target == 'pipeline':
+            _, problems = benchmark_pipeline(args.sizes, args.months, args.baseline, args.update_baseline,
+                                             args.tolerance, args.work_dir)
+            return 1 if problems else 0
+        else:
+            benchmark_withdrawal_kernel()
+        return 0
+    
+    if args.command == 'generate':
+        import synthetic_workbook
+        
+        path = synthetic_workbook.write_synthetic_workbook(args.output, args.items, args.months, args.last_month,
+                                                           args.sparsity, seed=args.seed)
+        print(f"🧪 Synthetic workbook: {path}")
+        return 0
+    
+    if args.command is None:
+        result = main(predict_only=args.predict_only)
+        if result:
+            print("\n✨ Batch-aware analysis completed successfully!")
+            return 0
+        print("\n⚠️ Analysis was not completed")
+        return 1
+    
+    if args.command == 'batch':
+        outcomes = run_sites(args.source, args.output_dir, args.workers, args.artifact, not args.no_report,
+                             args.formats, not args.no_cache, args.history_months, args.compact, args.rules)
+        return 0 if all(outcome['status'] == 'ok' for outcome in outcomes) else 1
+    
+    system = BatchAwareInventoryPredictionSystem(verbose=not args.quiet, use_cache=not args.no_cache)
+    if args.output_dir:
+        system.output_dir = args.output_dir
+    if args.formats:
+        system.output_formats = args.formats
+    if args.history_months:
+        system.history_months = args.history_months
+    system.compact_memory = args.compact
+    if args.ingest_workers:
+        system.ingest_workers = args.ingest_workers
+    if args.rules:
+        system.load_business_rules(args.rules)
+    system.keep_daily_withdrawals = args.keep_withdrawals
+    if args.run_report is not None:
+        system.run_recorder.enabled = True
+        system.run_report_path = args.run_report or None
+    
+    try:
+        if args.command == 'run':
+            system.run_complete_analysis(args.workbook)
+            return 0
+        
+        if args.command == 'append':
+            if args.panel_dir:
+                system.panel_state_dir = args.panel_dir
+            system.append_month(args.workbook, args.sheet, args.refresh_models)
+            system.generate_production_predictions()
+            system.publish_outputs()
+            return 0
+        
+        if args.command == 'report':
+            system.load_published_predictions(args.predictions)
+            print(f"📁 Report: {system.save_comprehensive_results(args.output)}")
+            return 0
+        
+        system.load_and_process_data(args.workbook)
+        if args.command == 'ingest':
+            system.publish_outputs(names=['item_panel_latest'])
+            return 0
+        
+        system.create_training_features()
+        if args.command == 'features':
+            system.publish_outputs(names=['training_features_latest'])
+            return 0
+        
+        if args.command == 'train':
+            system.train_production_models()
+            print(f"📦 Model artifact: {system.save_model_artifact(args.artifact)}")
+            return 0
+        
+        # predict
+        system.load_model_artifact(args.artifact)
+        system.generate_production_predictions()
+        system.publish_outputs()
+        return 0
+    
+    except KeyboardInterrupt:
+        print(f"\n⚠️ {args.command} interrupted by user")
+        return 1
+    except Exception as e:
+        print(f"\n❌ {args.command} failed: {str(e)}")
+        return 1
+    finally:
+        if args.command != 'run':  # run_complete_analysis writes its own report
+            system.write_run_report(command=args.command)
 
-# Save predictions DataFrame to a simple CSV for dashboard
-system.predictions_df.to_csv("predictions_latest.csv", index=False)
+if __name__ == "__main__":
+    sys.exit(run_cli())
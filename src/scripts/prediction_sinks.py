@@ -0,0 +1,183 @@
+import os
+
+import pandas as pd
+
+# Shared by the producer (inventory_prediction.py) and the consumer (dashboard.py)
+
+# Column -> dtype of the published predictions; 'text' columns are kept as strings.
+# Per-model '<name>_Monthly' columns follow MEMBER_PREDICTION_DTYPE.
+PREDICTION_SCHEMA = {
+    'Site': 'text',  # Only in combined multi-site predictions
+    'Item_Name': 'text',
+    'UOM': 'text',
+    'Category': 'text',
+    'Price': 'float64',
+    'Dominant_Batch_Pattern': 'text',
+    'Final_Monthly_Prediction': 'int64',
+    'Confidence': 'float64',
+    'Risk_Level': 'text',
+    'Adjustments_Applied': 'text',
+    'Procurement_Recommendation': 'text',
+    'Avg_Daily_Consumption_Rate': 'float64',
+    'Seasonal_Adjusted_Daily_Rate': 'float64',
+    'Recent_Weighted_Daily_Rate': 'float64',
+    'Last_Month_Daily_Rate': 'float64',
+    'Months_Available': 'int64',
+    'Daily_Rate_Trend': 'float64',
+    'Batch_Pattern_Stability': 'float64',
+    'Data_Quality': 'float64',
+    'Is_Critical': 'int64',
+    'Withdrawal_Pattern_Risk': 'int64',
+    'Avg_Withdrawal_Frequency': 'float64',
+    'Avg_Batch_Size': 'float64',
+    'Batch_Size_Variability': 'float64',
+    'Is_Single_Batch_Item': 'int64',
+    'Batch_Size_Risk': 'int64',
+    'Prediction_Quality': 'text',
+    'Target_Month': 'text'  # 'YYYY-MM' month the predictions are for
+}
+MEMBER_PREDICTION_SUFFIX = '_Monthly'
+MEMBER_PREDICTION_DTYPE = 'int64'
+
+# Columns the dashboard cannot work without
+REQUIRED_PREDICTION_COLUMNS = ['Item_Name', 'Final_Monthly_Prediction', 'Confidence', 'Risk_Level']
+
+PREDICTIONS_NAME = 'predictions_latest'
+COMBINED_PREDICTIONS_NAME = 'predictions_all_sites'
+SITE_COLUMN = 'Site'
+TARGET_MONTH_COLUMN = 'Target_Month'
+
+# File extension per sink format, in the order readers prefer them
+SINK_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv'}
+
+def typed_sinks_available():
+    """Parquet and Arrow IPC sinks need pyarrow"""
+    
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def usable_formats(formats):
+    """(formats that can be written here, skipped typed formats); CSV stands in when pyarrow is missing"""
+    
+    formats = list(formats)
+    if typed_sinks_available():
+        return formats, []
+    
+    skipped = [fmt for fmt in formats if fmt != 'csv']
+    return [fmt for fmt in formats if fmt == 'csv'] or ['csv'], skipped
+
+def prediction_column_dtype(column):
+    """Schema dtype of a predictions column (None if the column is not in the schema)"""
+    
+    if column in PREDICTION_SCHEMA:
+        return PREDICTION_SCHEMA[column]
+    if column.endswith(MEMBER_PREDICTION_SUFFIX):
+        return MEMBER_PREDICTION_DTYPE
+    return None
+
+def conform_predictions(df):
+    """Check the required columns and cast the schema columns to their dtypes"""
+    
+    missing = [col for col in REQUIRED_PREDICTION_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"❌ Missing required columns: {missing}")
+    
+    df = df.copy()
+    for col in df.columns:
+        dtype = prediction_column_dtype(col)
+        if dtype is None:
+            continue
+        if dtype == 'text':
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str).str.strip())
+        elif dtype == 'int64':
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('int64')
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    return df
+
+def _write_parquet(df, path):
+    df.to_parquet(path, index=False)
+
+def _write_arrow(df, path):
+    import pyarrow as pa
+    
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def _write_csv(df, path):
+    df.to_csv(path, index=False)
+
+def _read_parquet(path):
+    return pd.read_parquet(path)
+
+def _read_arrow(path):
+    import pyarrow as pa
+    
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+def _read_csv(path):
+    return pd.read_csv(path, float_precision='round_trip')
+
+SINK_WRITERS = {'parquet': _write_parquet, 'arrow': _write_arrow, 'csv': _write_csv}
+SINK_READERS = {'parquet': _read_parquet, 'arrow': _read_arrow, 'csv': _read_csv}
+
+def publish_frame(df, output_dir, name, formats=('parquet', 'csv')):
+    """
+    Publish a frame as <output_dir>/<name>.<ext> for each format.
+    
+    Each file is written to a temporary name in the same directory and renamed
+    into place, so readers only ever see a complete file.
+    """
+    
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    
+    for fmt in formats:
+        if fmt not in SINK_WRITERS:
+            raise ValueError(f"❌ Unknown output format '{fmt}' (available: {list(SINK_WRITERS)})")
+        
+        path = os.path.join(output_dir, name + SINK_EXTENSIONS[fmt])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            SINK_WRITERS[fmt](df, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        paths.append(path)
+    
+    return paths
+
+def find_published(directories, name=PREDICTIONS_NAME):
+    """First published file for name, preferring typed formats; (path, format) or (None, None)"""
+    
+    typed = typed_sinks_available()
+    for directory in directories:
+        for fmt, ext in SINK_EXTENSIONS.items():
+            if fmt != 'csv' and not typed:
+                continue
+            path = os.path.join(directory, name + ext)
+            if os.path.exists(path):
+                return path, fmt
+    return None, None
+
+def read_predictions(path, fmt=None):
+    """Read published predictions; CSV is re-typed with the shared schema"""
+    
+    if fmt is None:
+        fmt = next((f for f, ext in SINK_EXTENSIONS.items() if path.endswith(ext)), 'csv')
+    
+    df = SINK_READERS[fmt](path)
+    if fmt == 'csv':
+        return conform_predictions(df)
+    
+    missing = [col for col in REQUIRED_PREDICTION_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"❌ Missing required columns: {missing}")
+    return df
@@ -0,0 +1,319 @@
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Stage spans for one pipeline run, written as a machine-readable JSON run report
+
+RUN_REPORT_VERSION = 1
+
+def _proc_status_bytes(*fields):
+    """Values (in bytes) of /proc/self/status fields, e.g. VmRSS and VmHWM (Linux only)"""
+    
+    values = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            key, _, value = line.partition(':')
+            if key in fields:
+                values[key] = int(value.split()[0]) * 1024
+    return tuple(values[field] for field in fields)
+
+def _rss_peak_resettable():
+    """Whether this process can reset its RSS high-water mark (Linux /proc/self/clear_refs)"""
+    
+    try:
+        _proc_status_bytes('VmRSS', 'VmHWM')
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except (OSError, KeyError, ValueError):
+        return False
+
+def _rss_high_water_mb():
+    """Peak resident set size of this process so far (None where unavailable)"""
+    
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+class _NullSpan:
+    """Span handed out while recording is disabled: every operation is a no-op"""
+    
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def __setattr__(self, name, value):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    """
+    One timed stage. Set rows_in / rows_out (and any attrs) inside the with-block.
+    
+    peak_mb is the highest memory use during the span (nested spans included)
+    above the level at span start; rss_max_mb is the process high-water mark
+    when the span ends.
+    """
+    
+    def __init__(self, recorder, name, parent, rows_in=None, **attrs):
+        self.recorder = recorder
+        self.name = name
+        self.parent = parent
+        self.path = f"{parent.path}/{name}" if parent is not None else name
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.attrs = attrs
+        self.status = 'ok'
+        self.wall_s = None
+        self.cpu_s = None
+        self.peak_mb = None
+        self.rss_max_mb = None
+        self._peak_bytes = 0
+        self._start_bytes = 0
+    
+    def __enter__(self):
+        self.recorder._enter(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.status = f"error: {exc_type.__name__}"
+        self.recorder._exit(self)
+        return False
+    
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'depth': self.depth,
+            'status': self.status,
+            'wall_s': self.wall_s,
+            'cpu_s': self.cpu_s,
+            'peak_mb': self.peak_mb,
+            'rss_max_mb': self.rss_max_mb,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'attrs': self.attrs
+        }
+
+class RunRecorder:
+    """
+    Collects stage spans for a run.
+    
+    While disabled, span() returns NULL_SPAN and record() returns at once, so
+    instrumented code pays one method call per stage. CPU time is
+    time.process_time() (every thread of this process, not pool workers).
+    Spans opened in other threads are attached to the outermost open span.
+    
+    memory selects how peak_mb is measured:
+    - 'rss': resident set size, resetting the kernel high-water mark at each
+      span boundary (Linux); near-free, covers native allocations too
+    - 'tracemalloc': Python and NumPy allocations only, exact but slows
+      allocation-heavy code (imports several times over)
+    - None: no peak_mb
+    Where the RSS high-water mark cannot be reset, 'rss' falls back to None.
+    """
+    
+    def __init__(self, enabled=False, memory='rss'):
+        self.enabled = enabled
+        self.memory = memory
+        self.spans = []
+        self.started_at = None
+        self._local = threading.local()
+        self._root = None
+        self._started_tracing = False
+        self._rss_max_bytes = 0  # Resetting VmHWM also resets ru_maxrss, so track the maximum here
+        self._lock = threading.Lock()
+    
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+    
+    def _memory_sample(self):
+        """(current, peak since last reset) in bytes, or None when memory is not measured"""
+        
+        if self.memory == 'rss':
+            sample = _proc_status_bytes('VmRSS', 'VmHWM')
+            self._rss_max_bytes = max(self._rss_max_bytes, sample[1])
+            return sample
+        if self.memory == 'tracemalloc' and tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()
+        return None
+    
+    def _rss_max_mb(self):
+        """Process high-water mark so far"""
+        
+        if self.memory == 'rss':
+            return max(self._rss_max_bytes, _proc_status_bytes('VmHWM')[0]) / 1024 ** 2
+        return _rss_high_water_mb()
+    
+    def _reset_memory_peak(self):
+        if self.memory == 'rss':
+            with open('/proc/self/clear_refs', 'w') as clear_refs:
+                clear_refs.write('5')
+        elif self.memory == 'tracemalloc':
+            tracemalloc.reset_peak()
+    
+    def span(self, name, rows_in=None, **attrs):
+        """Context manager timing one stage (NULL_SPAN when disabled)"""
+        
+        if not self.enabled:
+            return NULL_SPAN
+        
+        stack = self._stack()
+        parent = stack[-1] if stack else self._root
+        return Span(self, name, parent, rows_in=rows_in, **attrs)
+    
+    def record(self, name, wall_s, cpu_s=None, rows_in=None, rows_out=None, **attrs):
+        """Add a span measured elsewhere (e.g. in a worker process) under the current span"""
+        
+        if not self.enabled:
+            return
+        
+        stack = self._stack()
+        span = Span(self, name, stack[-1] if stack else self._root, rows_in=rows_in, **attrs)
+        span.wall_s, span.cpu_s, span.rows_out = wall_s, cpu_s, rows_out
+        with self._lock:
+            self.spans.append(span)
+    
+    def replay(self, spans, **attrs):
+        """
+        Add spans recorded by another recorder (as_dict() entries in recording
+        order, e.g. from a worker process) under the current span, keeping
+        their nesting; attrs are added to every replayed span.
+        """
+        
+        if not self.enabled:
+            return
+        
+        stack = self._stack()
+        parents = {-1: stack[-1] if stack else self._root}
+        with self._lock:
+            for entry in spans:
+                span = Span(self, entry['name'], parents[entry['depth'] - 1], rows_in=entry['rows_in'],
+                            **{**entry['attrs'], **attrs})
+                span.status, span.wall_s, span.cpu_s = entry['status'], entry['wall_s'], entry['cpu_s']
+                span.peak_mb, span.rss_max_mb, span.rows_out = entry['peak_mb'], entry['rss_max_mb'], entry['rows_out']
+                parents[entry['depth']] = span
+                self.spans.append(span)
+    
+    def _enter(self, span):
+        if self.started_at is None:
+            self.started_at = datetime.now()
+            if self.memory == 'rss' and not _rss_peak_resettable():
+                self.memory = None
+        
+        stack = self._stack()
+        if not stack and self._root is None:
+            self._root = span
+            if self.memory == 'tracemalloc' and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        
+        sample = self._memory_sample()
+        if sample is not None:
+            current, peak = sample
+            # Hand the peak reached so far to the enclosing span before resetting it
+            if span.parent is not None:
+                span.parent._peak_bytes = max(span.parent._peak_bytes, peak)
+            self._reset_memory_peak()
+            span._start_bytes = span._peak_bytes = current
+        
+        with self._lock:
+            self.spans.append(span)
+        stack.append(span)
+        span._wall_start = time.perf_counter()
+        span._cpu_start = time.process_time()
+    
+    def _exit(self, span):
+        span.wall_s = time.perf_counter() - span._wall_start
+        span.cpu_s = time.process_time() - span._cpu_start
+        
+        sample = self._memory_sample()
+        if sample is not None:
+            span._peak_bytes = max(span._peak_bytes, sample[1])
+            span.peak_mb = (span._peak_bytes - span._start_bytes) / 1024 ** 2
+            if span.parent is not None:
+                span.parent._peak_bytes = max(span.parent._peak_bytes, span._peak_bytes)
+            self._reset_memory_peak()
+        span.rss_max_mb = self._rss_max_mb()
+        
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        if span is self._root:
+            self._root = None
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+    
+    def report(self, **metadata):
+        """Run report as a JSON-serialisable dict"""
+        
+        top_level = [span for span in self.spans if span.depth == 0]
+        return {
+            'run_report_version': RUN_REPORT_VERSION,
+            'started_at': self.started_at.isoformat(timespec='seconds') if self.started_at else None,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'metadata': metadata,
+            'total_wall_s': sum(span.wall_s or 0 for span in top_level),
+            'total_cpu_s': sum(span.cpu_s or 0 for span in top_level),
+            'rss_max_mb': self._rss_max_mb(),
+            'memory': self.memory,
+            'spans': [span.as_dict() for span in self.spans]
+        }
+    
+    def write_report(self, path, **metadata):
+        """Write the run report to path (atomically) and return the path"""
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(self.report(**metadata), handle, indent=2, default=str)
+        os.replace(tmp_path, path)
+        
+        return path
+    
+    def summary_lines(self, max_depth=1):
+        """Human-readable lines for spans up to max_depth"""
+        
+        lines = []
+        for span in self.spans:
+            if span.depth > max_depth or span.wall_s is None:
+                continue
+            rows = f" rows {span.rows_in if span.rows_in is not None else '-'}->" \
+                   f"{span.rows_out if span.rows_out is not None else '-'}"
+            peak = f" peak {span.peak_mb:.1f}MB" if span.peak_mb is not None else ""
+            label = span.name
+            for key in ('model', 'month'):
+                if key in span.attrs:
+                    label = f"{span.name} [{span.attrs[key]}]"
+                    break
+            lines.append(f"{'  ' * span.depth}{label:<28} {span.wall_s:7.2f}s wall "
+                         f"{(span.cpu_s or 0):7.2f}s CPU{peak}{rows}")
+        return lines
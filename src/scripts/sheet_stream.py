@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+# Streaming reader for month sheets: openpyxl read-only rows, converted and typed like
+# pd.read_excel does it, handed out in chunks so a sheet is never held in memory whole
+
+def convert_cell(cell):
+    """Cell value as pandas' openpyxl reader converts it ('' when empty, NaN for errors, integral floats as int)"""
+    
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+    
+    if cell.value is None:
+        return ''
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+def _trimmed(values):
+    """Row values without trailing empty cells"""
+    
+    values = list(values)
+    while values and values[-1] == '':
+        values.pop()
+    return values
+
+def _parse_rows(rows, **kwargs):
+    # Same parser settings as pd.read_excel, so column types are inferred identically
+    return TextParser(rows, skip_blank_lines=False, **kwargs).read()
+
+def iter_sheet_chunks(worksheet, select, skiprows=1, chunk_rows=20000):
+    """
+    Yield the rows under a sheet's header as DataFrames of up to chunk_rows rows.
+    
+    The header is row skiprows + 1 and columns are named as pd.read_excel names
+    them ('Unnamed: 5', duplicates as 'Price.1'); select(position, name) picks
+    the columns to keep, and only those cells are converted. Chunks are indexed
+    by row position under the header, like read_excel(skiprows=skiprows), and
+    column types are inferred per chunk; a column read as text keeps its text
+    type in later chunks where it is empty, so chunks concatenate to the types
+    of a whole-sheet read. Empty rows are kept (as all-NaN rows).
+    """
+    
+    # Stored dimensions can be wrong (pandas ignores them too)
+    worksheet.reset_dimensions()
+    rows = worksheet.iter_rows(min_row=skiprows + 1)
+    
+    header = _trimmed(convert_cell(cell) for cell in next(rows, ()))
+    if not header:
+        return
+    
+    names = _parse_rows([header], header=0).columns
+    positions = [i for i, name in enumerate(names) if select(i, name)]
+    if not positions:
+        return
+    labels = [names[i] for i in positions]
+    width = positions[-1] + 1
+    
+    text_dtypes = {}
+    chunk, start = [], 0
+    for row in rows:
+        cells = row[:width]
+        chunk.append([convert_cell(cells[i]) if i < len(cells) else '' for i in positions])
+        if len(chunk) == chunk_rows:
+            yield _chunk_frame(chunk, labels, start, text_dtypes)
+            start += len(chunk)
+            chunk = []
+    
+    if chunk:
+        yield _chunk_frame(chunk, labels, start, text_dtypes)
+
+def _chunk_frame(rows, labels, start, text_dtypes):
+    frame = _parse_rows(rows, header=None, names=labels)
+    frame.index = pd.RangeIndex(start, start + len(rows))
+    
+    for label in labels:
+        column = frame[label]
+        if pd.api.types.is_numeric_dtype(column.dtype):
+            # An all-empty column parses as float; give it the text type seen in earlier chunks
+            if label in text_dtypes and column.isna().all():
+                frame[label] = column.astype(text_dtypes[label])
+        else:
+            text_dtypes.setdefault(label, column.dtype)
+    return frame
@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Synthetic inventory workbooks shaped like the real monthly sheets, for benchmarks
+
+# Header row of a month sheet (row 2; row 1 is a title), as read by _read_pipeline_columns
+SHEET_COLUMNS = (
+    ['S.No', 'Type', 'Item Description', 'UOM', 'Price', 'Opening Stock', 'Received Stock', 'Total Stock']
+    + list(range(1, 32))
+    + ['Consumption', 'SIH']
+)
+
+# Withdrawal days per month for each batch pattern (same bands as the pipeline's batch_patterns);
+# Irregular items draw a different pattern every month, Dormant items rarely withdraw at all
+PATTERN_EVENTS = {
+    'Single_Batch': (1, 1),
+    'Weekly_Batches': (2, 6),
+    'BiWeekly_Batches': (7, 12),
+    'Regular_Batches': (13, 19),
+    'Frequent_Small_Batches': (20, 31)
+}
+DEFAULT_PATTERN_MIX = {
+    'Single_Batch': 0.15,
+    'Weekly_Batches': 0.30,
+    'BiWeekly_Batches': 0.15,
+    'Regular_Batches': 0.08,
+    'Frequent_Small_Batches': 0.07,
+    'Irregular': 0.20,
+    'Dormant': 0.05
+}
+
+CATEGORIES = ['HK Chemical', 'Food Items', 'Safety Items', 'Office Supplies', 'Pantry']
+UOMS = ['Nos', 'Kgs', 'Ltrs', 'Pkts', 'Box']
+
+# Item names that trigger the critical / seasonal business rules, with their share of the catalog
+KEYWORD_ITEMS = {'Hand Sanitizer': 0.02, 'First Aid Kit': 0.01, 'Safety Gloves': 0.01, 'Ice Cream Cup': 0.01}
+
+def synthetic_catalog(n_items, pattern_mix=None, seed=42):
+    """Item master: name, category, UOM, price, batch pattern and typical batch size per item"""
+    
+    rng = np.random.default_rng(seed)
+    pattern_mix = pattern_mix or DEFAULT_PATTERN_MIX
+    patterns = list(pattern_mix)
+    shares = np.array([pattern_mix[p] for p in patterns], dtype=float)
+    
+    names = np.array([f"Item {i:06d}" for i in range(n_items)], dtype=object)
+    start = 0
+    for keyword, share in KEYWORD_ITEMS.items():
+        count = int(n_items * share)
+        names[start:start + count] = [f"{keyword} {i:06d}" for i in range(start, start + count)]
+        start += count
+    
+    return pd.DataFrame({
+        'Item_Name': names,
+        'Category': np.array(CATEGORIES)[rng.integers(0, len(CATEGORIES), n_items)],
+        'UOM': np.array(UOMS)[rng.integers(0, len(UOMS), n_items)],
+        'Price': np.round(rng.lognormal(4, 1, n_items), 2),
+        'Pattern': np.array(patterns)[rng.choice(len(patterns), size=n_items, p=shares / shares.sum())],
+        'Batch_Size': np.maximum(1, np.round(rng.lognormal(2, 0.8, n_items)))
+    })
+
+def _withdrawal_days(rng, catalog):
+    """Number of withdrawal days this month for every item of the catalog"""
+    
+    n_items = len(catalog)
+    pattern = catalog['Pattern'].to_numpy()
+    events = np.zeros(n_items, dtype=int)
+    
+    # Irregular items take a random banded pattern each month
+    banded = np.array(list(PATTERN_EVENTS))
+    monthly = np.where(pattern == 'Irregular', banded[rng.integers(0, len(banded), n_items)], pattern)
+    
+    for name, (low, high) in PATTERN_EVENTS.items():
+        rows = monthly == name
+        events[rows] = rng.integers(low, high + 1, rows.sum())
+    
+    dormant = pattern == 'Dormant'
+    events[dormant] = np.where(rng.random(dormant.sum()) < 0.2, 1, 0)
+    return events
+
+def synthetic_month_sheet(rng, catalog, sparsity=0.05):
+    """
+    One month sheet as a DataFrame with the workbook's columns (SHEET_COLUMNS).
+    
+    sparsity is the share of catalog items missing from the sheet; withdrawal
+    days are spread at random over the 31 day columns, with per-withdrawal
+    quantities around each item's batch size (frequent withdrawals are smaller).
+    """
+    
+    present = catalog[rng.random(len(catalog)) >= sparsity].reset_index(drop=True)
+    n_items = len(present)
+    
+    events = _withdrawal_days(rng, present)
+    # Pick each item's withdrawal days: the `events` lowest random ranks of its row
+    ranks = np.argsort(rng.random((n_items, 31)), axis=1).argsort(axis=1)
+    withdrawn = ranks < events[:, None]
+    
+    per_event = present['Batch_Size'].to_numpy()[:, None] * 6 / np.maximum(events, 6)[:, None]
+    quantities = np.maximum(1, np.round(per_event * rng.lognormal(0, 0.35, (n_items, 31))))
+    withdrawals = np.where(withdrawn, quantities, 0.0)
+    consumption = withdrawals.sum(axis=1)
+    
+    opening = np.round(consumption * rng.uniform(0.5, 1.5, n_items))
+    received = np.round(consumption * rng.uniform(0.5, 1.2, n_items))
+    
+    sheet = pd.DataFrame({
+        'S.No': np.arange(1, n_items + 1),
+        'Type': present['Category'].to_numpy(),
+        'Item Description': present['Item_Name'].to_numpy(),
+        'UOM': present['UOM'].to_numpy(),
+        'Price': present['Price'].to_numpy(),
+        'Opening Stock': opening,
+        'Received Stock': received,
+        'Total Stock': opening + received
+    })
+    days = pd.DataFrame(np.where(withdrawals > 0, withdrawals, np.nan), columns=list(range(1, 32)))
+    sheet = pd.concat([sheet, days], axis=1)
+    sheet['Consumption'] = consumption
+    sheet['SIH'] = np.maximum(0, opening + received - consumption)
+    
+    return sheet
+
+def synthetic_month_sheets(n_items=1000, n_months=5, last_month='2025-05', sparsity=0.05,
+                           pattern_mix=None, seed=42):
+    """Yield (sheet name, sheet frame) for n_months consecutive months ending at last_month"""
+    
+    rng = np.random.default_rng(seed)
+    catalog = synthetic_catalog(n_items, pattern_mix, seed)
+    
+    for period in pd.period_range(end=pd.Period(last_month, freq='M'), periods=n_months, freq='M'):
+        yield period.strftime('%b %y'), synthetic_month_sheet(rng, catalog, sparsity)
+
+def write_synthetic_workbook(path, n_items=1000, n_months=5, last_month='2025-05', sparsity=0.05,
+                             pattern_mix=None, seed=42):
+    """
+    Write an .xlsx workbook of synthetic month sheets and return its path.
+    
+    Each sheet has a title row, the header row and one row per item followed by
+    a TOTAL row, like the real inventory workbooks. Empty day cells are left
+    blank. The workbook is streamed (openpyxl write-only), so memory stays flat
+    for large catalogs.
+    """
+    
+    from openpyxl import Workbook
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    workbook = Workbook(write_only=True)
+    for sheet_name, sheet in synthetic_month_sheets(n_items, n_months, last_month, sparsity, pattern_mix, seed):
+        ws = workbook.create_sheet(sheet_name)
+        ws.append([f"Inventory Management - {sheet_name}"])
+        ws.append(SHEET_COLUMNS)
+        
+        values = sheet.astype(object).where(sheet.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(row)
+        ws.append([None, None, 'TOTAL'])
+    
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        workbook.save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    return path
@@ -0,0 +1,31 @@
+import copy
+
+import pandas as pd
+
+from business_rules import DEFAULT_BUSINESS_RULES, BusinessRuleEngine
+
+# The name memo is shared by parallel site runs: a save keeps the names other runs saved
+
+def engine(path=None):
+    rules_engine = BusinessRuleEngine(copy.deepcopy(DEFAULT_BUSINESS_RULES))
+    if path is not None:
+        rules_engine.load_memo(path)
+    return rules_engine
+
+def test_concurrent_saves_keep_each_others_names(tmp_path):
+    path = str(tmp_path / 'memo.json')
+    site_a, site_b = engine(path), engine(path)
+    
+    site_a.flags(pd.Series(['Insulin pen', 'Gauze roll']))
+    site_b.flags(pd.Series(['Flu vaccine', 'Gauze roll']))
+    assert site_a.save_memo(path) and site_b.save_memo(path)
+    
+    assert sorted(engine(path).entries()[0]) == ['Flu vaccine', 'Gauze roll', 'Insulin pen']
+
+def test_memo_keeps_the_latest_names(tmp_path):
+    path = str(tmp_path / 'memo.json')
+    rules_engine = engine()
+    rules_engine.flags(pd.Series([f'Item {i}' for i in range(10)]))
+    rules_engine.save_memo(path, max_names=4)
+    
+    assert engine(path).entries()[0] == ['Item 6', 'Item 7', 'Item 8', 'Item 9']
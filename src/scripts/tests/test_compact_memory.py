@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+import synthetic_workbook
+from inventory_prediction import BatchAwareInventoryPredictionSystem
+
+# Compact memory mode shrinks the frames but must not change the predictions
+
+def predict(sheets, compact):
+    system = BatchAwareInventoryPredictionSystem(verbose=False, use_cache=False)
+    system.compact_memory = compact
+    
+    periods = [pd.Period(pd.to_datetime(name, format='%b %y'), freq='M') for name, _ in sheets]
+    system.month_periods = {period.strftime('%b %Y'): period for period in periods}
+    system.month_labels = list(system.month_periods)
+    system.target_month = periods[-1] + 1
+    
+    for label, (_, sheet) in zip(system.month_labels, sheets):
+        system.monthly_data[label] = system._safe_process_sheet_batch_aware(sheet.copy(), label)
+    system.build_item_panel()
+    system.create_training_features()
+    system.train_production_models()
+    system.generate_production_predictions()
+    return system.predictions_for_export().set_index('Item_Name').sort_index()
+
+@pytest.fixture(scope='module')
+def sheets():
+    return list(synthetic_workbook.synthetic_month_sheets(n_items=300, n_months=5, seed=11))
+
+def test_compact_mode_gives_the_same_predictions(sheets):
+    full = predict(sheets, compact=False)
+    compact = predict(sheets, compact=True)
+    
+    assert list(compact.index) == list(full.index)
+    assert list(compact.columns) == list(full.columns)
+    for col in full.columns:
+        if pd.api.types.is_numeric_dtype(full[col]):
+            pd.testing.assert_series_equal(compact[col].astype(float), full[col].astype(float), check_exact=True)
+        else:
+            assert compact[col].astype(str).tolist() == full[col].astype(str).tolist(), col
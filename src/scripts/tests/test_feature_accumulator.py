@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from feature_accumulator import SUM_FIELDS, FeatureAccumulator
+
+N_ITEMS, N_MONTHS, N_PATTERNS = 200, 24, 4
+
+# Statistics whose merge is exact up to summation order
+MOMENT_STATS = ['avg_rate', 'rate_std', 'seasonal_rate', 'trend', 'avg_frequency', 'avg_batch_size',
+                'batch_size_std', 'avg_regularity', 'avg_predictability', 'pattern_stability']
+EXACT_STATS = ['months', 'recent_trend', 'first_rate', 'prev_rate', 'last_rate', 'dominant_pattern',
+               'min_rate', 'max_rate']
+QUANTILE_STATS = {'q25_rate': 0.25, 'median_rate': 0.5, 'q75_rate': 0.75}
+
+@pytest.fixture(scope='module')
+def months():
+    """(codes, t, pattern codes, rows, values) per month; each item is missing from about 30% of the months"""
+    
+    rng = np.random.default_rng(3)
+    months = []
+    for t in range(1, N_MONTHS + 1):
+        codes = np.flatnonzero(rng.random(N_ITEMS) < 0.7)
+        values = {name: rng.gamma(2.0, 3.0, len(codes)) for name in SUM_FIELDS}
+        months.append((codes, t, rng.integers(0, N_PATTERNS, len(codes)), codes + t * N_ITEMS, values))
+    return months
+
+def accumulate(months, quantile_points):
+    accumulator = FeatureAccumulator(N_ITEMS, N_PATTERNS, quantile_points)
+    for codes, t, pattern_codes, rows, values in months:
+        accumulator.add_month(codes, t, pattern_codes, rows, **values)
+    return accumulator
+
+def merged_and_sequential(months, split, quantile_points):
+    merged = accumulate(months[:split], quantile_points).merge(accumulate(months[split:], quantile_points))
+    return merged, accumulate(months, quantile_points)
+
+def item_rates(months):
+    rates = [[] for _ in range(N_ITEMS)]
+    for codes, _, _, _, values in months:
+        for code, rate in zip(codes, values['rate']):
+            rates[code].append(rate)
+    return [np.array(item) for item in rates]
+
+@pytest.mark.parametrize('split', [1, 5, 12, 23])
+def test_merge_is_exact_below_quantile_points(months, split):
+    merged, sequential = merged_and_sequential(months, split, quantile_points=N_MONTHS)
+    codes = np.arange(N_ITEMS)
+    actual, expected = merged.stats(codes), sequential.stats(codes)
+    
+    np.testing.assert_array_equal(merged.latest_row, sequential.latest_row)
+    for name in EXACT_STATS + list(QUANTILE_STATS):
+        np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
+    for name in MOMENT_STATS:
+        np.testing.assert_allclose(actual[name], expected[name], rtol=1e-12, atol=1e-12, err_msg=name)
+    
+    # Exact buffers give np.percentile's quantiles
+    for code, rates in enumerate(item_rates(months)):
+        for name, q in QUANTILE_STATS.items():
+            assert actual[name][code] == pytest.approx(np.percentile(rates, q * 100), rel=1e-12)
+
+@pytest.mark.parametrize('quantile_points', [4, 8])
+@pytest.mark.parametrize('split', [5, 12, 20])
+def test_merged_sketch_stays_within_rank_error(months, split, quantile_points):
+    merged, sequential = merged_and_sequential(months, split, quantile_points)
+    codes = np.arange(N_ITEMS)
+    actual, expected = merged.stats(codes), sequential.stats(codes)
+    
+    # Everything but the quantiles merges exactly, however small the sketch
+    for name in EXACT_STATS:
+        np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
+    for name in MOMENT_STATS:
+        np.testing.assert_allclose(actual[name], expected[name], rtol=1e-12, atol=1e-12, err_msg=name)
+    
+    # Merged sketches differ from sequentially built ones, but keep the documented
+    # rank error: about 1 / quantile_points, plus one month of rank resolution
+    assert any(not np.array_equal(actual[name], expected[name]) for name in QUANTILE_STATS)
+    for code, rates in enumerate(item_rates(months)):
+        tolerance = 1 / quantile_points + 1 / len(rates)
+        for name, q in QUANTILE_STATS.items():
+            rank = np.mean(rates <= actual[name][code])
+            assert abs(rank - q) <= tolerance, (code, name, rank)
+        assert rates.min() <= actual['q25_rate'][code] <= actual['median_rate'][code] \
+            <= actual['q75_rate'][code] <= rates.max()
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic_workbook
+from inventory_prediction import BatchAwareInventoryPredictionSystem
+
+# _compute_feature_frame checked against the per-item feature loop it replaced
+
+def reference_features(system, rows):
+    """Batch-aware features of one item from its panel rows (in month order), as the per-item loop computed them"""
+    
+    history = []
+    for row in rows.itertuples(index=False):
+        history.append({
+            'month': row.Month,
+            'month_num': row.Month_Num,
+            'withdrawal_events': float(row.Withdrawal_Events),
+            'avg_batch_size': float(row.Average_Batch_Size),
+            'daily_rate': float(row.Estimated_Daily_Consumption_Rate),
+            'withdrawal_regularity': float(row.Withdrawal_Regularity),
+            'consumption_predictability': float(row.Consumption_Predictability),
+            'batch_pattern': str(row.Batch_Consumption_Pattern),
+            'is_critical': bool(row.Is_Critical),
+            'is_seasonal': bool(row.Is_Seasonal),
+            'category_multiplier': float(row.Category_Multiplier),
+            'price': float(row.Price),
+            'uom': str(row.UOM),
+            'category': str(row.Category)
+        })
+    
+    if len(history) < 2:
+        return None
+    
+    daily_rates = np.array([h['daily_rate'] for h in history])
+    withdrawal_frequencies = np.array([h['withdrawal_events'] for h in history])
+    batch_sizes = np.array([h['avg_batch_size'] for h in history])
+    month_nums = np.array([h['month_num'] for h in history])
+    
+    avg_daily_rate = float(np.mean(daily_rates))
+    daily_rate_std = float(np.std(daily_rates))
+    daily_rate_cv = daily_rate_std / (avg_daily_rate + 0.1)
+    
+    avg_withdrawal_frequency = float(np.mean(withdrawal_frequencies))
+    avg_batch_size = float(np.mean(batch_sizes))
+    batch_size_variability = float(np.std(batch_sizes) / (avg_batch_size + 0.1))
+    
+    seasonal_adjustments = []
+    for i, h in enumerate(history):
+        base_adj = system._target_seasonal_factor() / system.seasonal_factors.get(system._month_name(h['month']), 1.0)
+        if h['is_seasonal']:
+            base_adj *= 0.8
+        if h['is_critical']:
+            base_adj *= 1.1
+        seasonal_adjustments.append(daily_rates[i] * base_adj)
+    
+    if len(daily_rates) > 2:
+        daily_rate_trend = float(np.polyfit(month_nums, daily_rates, 1)[0])
+        recent_trend = float(np.polyfit([0, 1], daily_rates[-2:], 1)[0])
+    else:
+        daily_rate_trend = 0
+        recent_trend = 0
+    
+    recent_weighted_daily_rate = daily_rates[-2] * 0.3 + daily_rates[-1] * 0.7
+    
+    # Ties go to the most recently seen pattern
+    batch_patterns = [h['batch_pattern'] for h in history]
+    dominant_batch_pattern = max(reversed(batch_patterns), key=batch_patterns.count)
+    pattern_stability = batch_patterns.count(dominant_batch_pattern) / len(batch_patterns)
+    
+    avg_predictability = float(np.mean([h['consumption_predictability'] for h in history]))
+    avg_regularity = float(np.mean([h['withdrawal_regularity'] for h in history]))
+    
+    data_quality = min(1.0,
+        pattern_stability * 0.4 +
+        (len(history) / 5) * 0.2 +
+        avg_predictability * 0.3 +
+        (1 - min(daily_rate_cv, 1.5) / 1.5) * 0.1
+    )
+    
+    return {
+        'Item_Name': str(rows['Item_Name'].iloc[-1]),
+        'UOM': history[-1]['uom'],
+        'Category': history[-1]['category'],
+        'Price': history[-1]['price'],
+        'Months_Available': len(history),
+        'Avg_Daily_Consumption_Rate': avg_daily_rate,
+        'Median_Daily_Rate': float(np.median(daily_rates)),
+        'Daily_Rate_Std': daily_rate_std,
+        'Daily_Rate_CV': daily_rate_cv,
+        'Seasonal_Adjusted_Daily_Rate': float(np.mean(seasonal_adjustments)),
+        'Daily_Rate_Trend': daily_rate_trend,
+        'Recent_Trend': recent_trend,
+        'Recent_Weighted_Daily_Rate': float(recent_weighted_daily_rate),
+        'Last_Month_Daily_Rate': float(daily_rates[-1]),
+        'Last_2Months_Avg_Daily_Rate': float(np.mean(daily_rates[-2:])),
+        'Avg_Withdrawal_Frequency': avg_withdrawal_frequency,
+        'Avg_Batch_Size': avg_batch_size,
+        'Batch_Size_Variability': batch_size_variability,
+        'Avg_Withdrawal_Regularity': avg_regularity,
+        'Avg_Consumption_Predictability': avg_predictability,
+        'Dominant_Batch_Pattern': dominant_batch_pattern,
+        'Batch_Pattern_Stability': pattern_stability,
+        'Is_Critical': int(history[-1]['is_critical']),
+        'Is_Seasonal': int(history[-1]['is_seasonal']),
+        'Category_Multiplier': history[-1]['category_multiplier'],
+        'Min_Daily_Rate': float(np.min(daily_rates)),
+        'Max_Daily_Rate': float(np.max(daily_rates)),
+        'Daily_Rate_Range': float(np.max(daily_rates) - np.min(daily_rates)),
+        'Q75_Daily_Rate': float(np.percentile(daily_rates, 75)),
+        'Q25_Daily_Rate': float(np.percentile(daily_rates, 25)),
+        'Is_Low_Volume': 1 if avg_daily_rate * 30 <= system.low_volume_threshold else 0,
+        'Is_High_Volatility': 1 if daily_rate_cv > system.volatility_threshold else 0,
+        'Is_Single_Batch_Item': 1 if avg_withdrawal_frequency <= 1.5 else 0,
+        'Is_Frequent_Small_Batch': 1 if avg_withdrawal_frequency >= 20 else 0,
+        'Data_Quality': data_quality,
+        'Growth_Rate': float((daily_rates[-1] - daily_rates[0]) / (daily_rates[0] + 0.1)) if daily_rates[0] > 0 else 0,
+        'Recent_vs_Historical': float(recent_weighted_daily_rate / (avg_daily_rate + 0.1)),
+        'Momentum': float((daily_rates[-1] - daily_rates[-2]) / (daily_rates[-2] + 0.1)),
+        'Withdrawal_Pattern_Risk': 1 if pattern_stability < 0.5 or avg_predictability < 0.4 else 0,
+        'Batch_Size_Risk': 1 if batch_size_variability > 1.0 else 0
+    }
+
+@pytest.fixture(scope='module')
+def system():
+    system = BatchAwareInventoryPredictionSystem(verbose=False, use_cache=False)
+    periods = pd.period_range(end=pd.Period('2025-05', freq='M'), periods=6, freq='M')
+    system.month_periods = {period.strftime('%b %Y'): period for period in periods}
+    system.month_labels = list(system.month_periods)
+    system.target_month = periods[-1] + 1
+    
+    # Sparse sheets, so some items miss months and a few have fewer than two
+    sheets = synthetic_workbook.synthetic_month_sheets(n_items=300, n_months=6, sparsity=0.3, seed=7)
+    for label, (_, sheet) in zip(system.month_labels, sheets):
+        system.monthly_data[label] = system._safe_process_sheet_batch_aware(sheet, label)
+    system.build_item_panel()
+    return system
+
+@pytest.mark.parametrize('n_months', [None, 3, 2])
+def test_feature_frame_matches_per_item_features(system, n_months):
+    months = None if n_months is None else system.month_labels[:n_months]
+    panel = system.item_panel if months is None else system.item_panel[system.item_panel['Month'].isin(months)]
+    
+    expected = [reference_features(system, rows) for _, rows in panel.groupby(panel['Item_Code'].to_numpy(), sort=True)]
+    expected = pd.DataFrame([features for features in expected if features is not None])
+    actual = system._compute_feature_frame(months=months).reset_index(drop=True)
+    
+    assert 0 < len(expected) < system.item_panel['Item_Code'].nunique()
+    assert list(actual.columns) == list(expected.columns)
+    assert len(actual) == len(expected)
+    
+    for col in expected.columns:
+        if not pd.api.types.is_numeric_dtype(expected[col]):
+            assert actual[col].astype(str).tolist() == expected[col].astype(str).tolist(), col
+        else:
+            # Trend slopes are closed-form least squares rather than np.polyfit
+            np.testing.assert_allclose(actual[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float),
+                                       rtol=1e-9, atol=1e-12, err_msg=col)
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pandas as pd
+
+from inventory_prediction import BatchAwareInventoryPredictionSystem
+
+# Sheets named without a year take their years from workbook order
+
+def discover(sheet_names):
+    system = BatchAwareInventoryPredictionSystem(verbose=False)
+    system.sheet_names = sheet_names
+    system.discover_month_sheets(None)
+    return system
+
+def test_yearless_sheets_roll_over_into_a_new_year():
+    system = discover(['Nov', 'Dec', 'Jan', 'Feb'])
+    
+    year = datetime.now().year
+    assert list(system.month_periods.values()) == [pd.Period(f'{year - 1}-11'), pd.Period(f'{year - 1}-12'),
+                                                   pd.Period(f'{year}-01'), pd.Period(f'{year}-02')]
+    assert system.target_month == pd.Period(f'{year}-03')
+
+def test_yearless_sheets_within_one_year_keep_the_current_year():
+    system = discover(['Jan', 'Feb', 'Mar'])
+    
+    assert system.month_labels == [f'{month} {datetime.now().year}' for month in ('Jan', 'Feb', 'Mar')]
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+
+import synthetic_workbook
+from inventory_prediction import BatchAwareInventoryPredictionSystem
+
+# Processed sheets, their daily withdrawals and withdrawal stores are keyed by sheet content,
+# so a workbook that gains a month only has that month parsed
+
+pytest.importorskip('pyarrow')
+
+def load(workbook, cache_dir):
+    system = BatchAwareInventoryPredictionSystem(verbose=False, use_cache=True, cache_dir=cache_dir)
+    system.keep_daily_withdrawals = True
+    system.ingest_workers = 1
+    
+    parsed = []
+    parse_month_sheet = system._parse_month_sheet
+    def recording_parse(workbook, sheet_name, month_label):
+        parsed.append(sheet_name)
+        return parse_month_sheet(workbook, sheet_name, month_label)
+    system._parse_month_sheet = recording_parse
+    
+    system.load_and_process_data(workbook)
+    return system, parsed
+
+def test_appended_month_is_the_only_sheet_parsed(tmp_path):
+    five_months = synthetic_workbook.write_synthetic_workbook(str(tmp_path / 'five.xlsx'), 100, 5, '2025-05', seed=4)
+    six_months = synthetic_workbook.write_synthetic_workbook(str(tmp_path / 'six.xlsx'), 100, 6, '2025-06', seed=4)
+    cache_dir = str(tmp_path / 'cache')
+    
+    _, parsed = load(five_months, cache_dir)
+    assert len(parsed) == 5
+    warm, parsed = load(six_months, cache_dir)
+    assert parsed == ['Jun 25']
+    
+    cold, parsed = load(six_months, str(tmp_path / 'cold'))
+    assert len(parsed) == 6
+    assert warm.withdrawals.items == cold.withdrawals.items
+    np.testing.assert_array_equal(warm.withdrawals.withdrawals, cold.withdrawals.withdrawals)
+    np.testing.assert_array_equal(warm.withdrawals.item_present, cold.withdrawals.item_present)
+    for month, frame in cold.monthly_data.items():
+        assert warm.monthly_data[month].equals(frame), month
+
+def test_eviction_covers_withdrawal_stores_and_memos(tmp_path):
+    workbook = synthetic_workbook.write_synthetic_workbook(str(tmp_path / 'book.xlsx'), 50, 3, seed=4)
+    system, _ = load(workbook, str(tmp_path / 'cache'))
+    
+    entries = system._cache_entries()
+    kinds = {os.path.basename(os.path.dirname(path)) for path in entries}
+    assert {'withdrawals', 'business_rules'} <= kinds
+    
+    system.cache_max_entries = 2
+    system._evict_cache()
+    assert len(system._cache_entries()) == 2
@@ -0,0 +1,351 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Daily withdrawals kept past ingestion: a memory-mapped (items, months, 31) tensor for the
+# whole history, and sparse per-sheet withdrawal events (CSR) for the month metrics
+
+TENSOR_FILE = 'withdrawals.npy'
+PRESENT_FILE = 'item_present.npy'
+INDEX_FILE = 'index.json'
+STORE_VERSION = 1
+DAYS = 31
+
+class WithdrawalTensor:
+    """
+    Memory-mapped daily withdrawals with an item-code index and validity masks.
+    
+    A store is a directory holding withdrawals.npy (float32, items x months x 31),
+    item_present.npy (bool, items x months: the item is listed in that month's
+    sheet) and index.json (item names in code order, month labels and periods,
+    metadata). Arrays are opened with np.load(mmap_mode=...), so only the pages
+    a kernel touches are read. day_valid (months x 31) marks the days that exist
+    in each calendar month; valid combines it with item_present.
+    """
+    
+    def __init__(self, path, mode='r'):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), encoding='utf-8') as handle:
+            index = json.load(handle)
+        if index.get('version') != STORE_VERSION:
+            raise ValueError(f"❌ Unsupported withdrawal store version {index.get('version')} in {path}")
+        
+        self.items = index['items']
+        self.months = index['months']
+        self.periods = [pd.Period(period, freq='M') for period in index['periods']]
+        self.metadata = index.get('metadata', {})
+        self.item_codes = {name: code for code, name in enumerate(self.items)}
+        
+        self.withdrawals = np.load(os.path.join(path, TENSOR_FILE), mmap_mode=mode)
+        self.item_present = np.load(os.path.join(path, PRESENT_FILE), mmap_mode=mode)
+        self.day_valid = np.arange(1, DAYS + 1) <= np.array([p.days_in_month for p in self.periods])[:, None]
+    
+    @property
+    def shape(self):
+        return self.withdrawals.shape
+    
+    @classmethod
+    def exists(cls, path):
+        return all(os.path.exists(os.path.join(path, name)) for name in [TENSOR_FILE, PRESENT_FILE, INDEX_FILE])
+    
+    @classmethod
+    def build(cls, path, months, month_withdrawals, metadata=None):
+        """
+        Write a store from per-month (item names, n x 31 withdrawal matrix) pairs.
+        
+        months is a list of (label, pd.Period) in calendar order. Item codes
+        follow first appearance across the months (the item panel's order);
+        an item listed more than once in a month has its rows summed. The
+        tensor is filled one month at a time through a memory map and the
+        directory is swapped into place when complete.
+        """
+        
+        names = [np.asarray(month_withdrawals[label][0], dtype=object) for label, _ in months
+                 if label in month_withdrawals]
+        items = pd.unique(np.concatenate(names)) if names else np.array([], dtype=object)
+        item_codes = pd.Index(items)
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            tensor = np.lib.format.open_memmap(
+                os.path.join(tmp_path, TENSOR_FILE), mode='w+', dtype=np.float32, shape=(len(items), len(months), DAYS)
+            )
+            present = np.lib.format.open_memmap(
+                os.path.join(tmp_path, PRESENT_FILE), mode='w+', dtype=bool, shape=(len(items), len(months))
+            )
+            for month_idx, (label, _) in enumerate(months):
+                if label not in month_withdrawals:
+                    continue
+                month_items, matrix = month_withdrawals[label]
+                codes = item_codes.get_indexer(np.asarray(month_items, dtype=object))
+                month = np.zeros((len(items), DAYS), dtype=np.float32)
+                np.add.at(month, codes, np.asarray(matrix, dtype=np.float32)[:, :DAYS])
+                tensor[:, month_idx, :] = month
+                present[codes, month_idx] = True
+            tensor.flush()
+            present.flush()
+            del tensor, present
+            
+            index = {
+                'version': STORE_VERSION,
+                'items': [str(name) for name in items],
+                'months': [label for label, _ in months],
+                'periods': [str(period) for _, period in months],
+                'metadata': metadata or {}
+            }
+            with open(os.path.join(tmp_path, INDEX_FILE), 'w', encoding='utf-8') as handle:
+                json.dump(index, handle)
+            
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        
+        return cls(path)
+    
+    @property
+    def valid(self):
+        """(items, months, 31) mask of item-days that exist (item listed, day in month)"""
+        
+        return self.item_present[:, :, None] & self.day_valid[None, :, :]
+    
+    def item(self, name):
+        """(months, 31) withdrawals of one item"""
+        
+        return self.withdrawals[self.item_codes[name]]
+    
+    def month(self, label):
+        """(items, 31) withdrawals of one month"""
+        
+        return self.withdrawals[:, self.months.index(label)]
+    
+    def map_rows(self, kernel, chunk_items=20000):
+        """
+        Apply a (rows x 31) -> array or tuple of arrays row kernel to every item-month.
+        
+        Items are processed in chunks, so memory stays bounded by chunk_items
+        regardless of the store size. Returns arrays shaped (items, months).
+        """
+        
+        n_items, n_months, _ = self.shape
+        outputs = None
+        for start in range(0, n_items, chunk_items):
+            stop = min(start + chunk_items, n_items)
+            rows = np.asarray(self.withdrawals[start:stop], dtype=float).reshape(-1, DAYS)
+            results = kernel(rows)
+            single = not isinstance(results, tuple)
+            results = (results,) if single else results
+            if outputs is None:
+                outputs = [np.empty((n_items, n_months), dtype=np.asarray(r).dtype) for r in results]
+            for output, result in zip(outputs, results):
+                output[start:stop] = np.asarray(result).reshape(stop - start, n_months)
+        
+        if outputs is None:
+            return np.empty((0, n_months))
+        return outputs[0] if single else tuple(outputs)
+    
+    def monthly_totals(self, chunk_items=20000):
+        """(items, months) total withdrawn per month"""
+        
+        return self.map_rows(lambda rows: rows.sum(axis=1), chunk_items)
+    
+    def withdrawal_days(self, chunk_items=20000):
+        """(items, months) number of days with a withdrawal"""
+        
+        return self.map_rows(lambda rows: (rows > 0).sum(axis=1), chunk_items)
+    
+    def day_anomalies(self, z=3.0, chunk_items=20000):
+        """
+        (item code, month index, day) of withdrawals more than z standard deviations
+        above the item's mean withdrawal size over all its withdrawal days.
+        """
+        
+        found = []
+        n_items = self.shape[0]
+        for start in range(0, n_items, chunk_items):
+            stop = min(start + chunk_items, n_items)
+            block = np.asarray(self.withdrawals[start:stop], dtype=float)
+            valid = self.item_present[start:stop, :, None] & self.day_valid[None, :, :]
+            withdrawn = (block > 0) & valid
+            count = withdrawn.sum(axis=(1, 2))
+            safe = np.maximum(count, 1)
+            mean = np.where(withdrawn, block, 0).sum(axis=(1, 2)) / safe
+            var = np.where(withdrawn, (block - mean[:, None, None]) ** 2, 0).sum(axis=(1, 2)) / safe
+            threshold = mean + z * np.sqrt(var)
+            hits = withdrawn & (count[:, None, None] > 2) & (block > threshold[:, None, None])
+            codes, months, days = np.nonzero(hits)
+            found.append(np.column_stack([codes + start, months, days + 1]))
+        
+        return np.concatenate(found) if found else np.empty((0, 3), dtype=int)
+
+def _segment_layout(indptr):
+    """(row of each value, [value indices at position 0, 1, ...] within their segment, segment lengths)"""
+    
+    counts = np.diff(indptr)
+    rows = np.repeat(np.arange(len(counts)), counts)
+    pos = np.arange(len(rows)) - indptr[:-1][rows]
+    order = np.argsort(pos, kind='stable')
+    bounds = np.searchsorted(pos[order], np.arange(int(counts.max(initial=0)) + 1))
+    return rows, np.split(order, bounds[1:]), counts
+
+def _segment_sum(values, indptr, layout=None):
+    """
+    Sum of each CSR segment, added in the same order as NumPy's pairwise
+    summation of the segment (sequential below 8 values, 8 interleaved partial
+    sums above), so results match np.sum / np.mean on the dense row bit for bit.
+    Values are visited one segment position at a time, so the cost is O(nnz).
+    """
+    
+    rows, by_position, counts = layout or _segment_layout(indptr)
+    blocked = counts // 8 * 8
+    partial = np.zeros((len(counts), 8))
+    rest = []
+    
+    for position, idx in enumerate(by_position):
+        segment_rows = rows[idx]
+        in_block = position < blocked[segment_rows]
+        partial[segment_rows[in_block], position % 8] += values[idx[in_block]]
+        rest.append(idx[~in_block])
+    
+    totals = ((partial[:, 0] + partial[:, 1]) + (partial[:, 2] + partial[:, 3])) + \
+             ((partial[:, 4] + partial[:, 5]) + (partial[:, 6] + partial[:, 7]))
+    
+    # Remaining values (fewer than 8 per segment) are added one by one, in position order
+    for idx in rest:
+        totals[rows[idx]] += values[idx]
+    
+    return totals
+
+class WithdrawalEvents:
+    """
+    Withdrawal events of one month sheet in CSR form.
+    
+    Row i (an item row of the sheet) owns days[indptr[i]:indptr[i + 1]] (day
+    column positions, ascending) and the matching quantities. Only withdrawal
+    days (quantity > 0) are stored, so every kernel runs in time and memory
+    proportional to the number of withdrawals instead of rows x 31.
+    """
+    
+    def __init__(self, indptr, days, quantities, n_days=DAYS):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.days = np.asarray(days, dtype=np.int8)
+        self.quantities = np.asarray(quantities, dtype=float)
+        self.n_days = n_days
+    
+    @property
+    def n_rows(self):
+        return len(self.indptr) - 1
+    
+    @property
+    def nnz(self):
+        return len(self.quantities)
+    
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.days.nbytes + self.quantities.nbytes
+    
+    @classmethod
+    def from_columns(cls, columns):
+        """Build from per-day columns (1-D arrays in day order, zero = no withdrawal)"""
+        
+        columns = [np.asarray(column, dtype=float) for column in columns]
+        n_rows = len(columns[0]) if columns else 0
+        rows = [np.flatnonzero(column > 0) for column in columns]
+        
+        row_ids = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        days = np.concatenate([np.full(len(r), pos, dtype=np.int8) for pos, r in enumerate(rows)]) \
+            if rows else np.empty(0, dtype=np.int8)
+        quantities = np.concatenate([column[r] for column, r in zip(columns, rows)]) if rows else np.empty(0)
+        
+        # Columns were visited in day order, so a stable sort by row keeps days ascending
+        order = np.argsort(row_ids, kind='stable')
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_ids, minlength=n_rows), out=indptr[1:])
+        
+        return cls(indptr, days[order], quantities[order], n_days=len(columns))
+    
+    @classmethod
+    def from_dense(cls, matrix):
+        """Build from an (items x days) withdrawal matrix"""
+        
+        matrix = np.asarray(matrix, dtype=float)
+        return cls.from_columns(list(matrix.T))
+    
+    def to_dense(self):
+        matrix = np.zeros((self.n_rows, self.n_days))
+        matrix[self._row_ids(), self.days] = self.quantities
+        return matrix
+    
+    def _row_ids(self):
+        return np.repeat(np.arange(self.n_rows), np.diff(self.indptr))
+    
+    def event_counts(self):
+        """Withdrawal days per row"""
+        
+        return np.diff(self.indptr)
+    
+    def totals(self):
+        """Total withdrawn per row"""
+        
+        return _segment_sum(self.quantities, self.indptr)
+    
+    def intervals(self):
+        """(intervals, indptr): days between consecutive withdrawals of each row, in CSR form"""
+        
+        counts = np.diff(self.indptr)
+        keep = np.ones(self.nnz, dtype=bool)
+        keep[self.indptr[:-1][counts > 0]] = False  # A row's first withdrawal has no interval
+        gaps = np.diff(self.days.astype(np.int64), prepend=0)[keep].astype(float)
+        
+        indptr = np.zeros_like(self.indptr)
+        np.cumsum(np.maximum(counts - 1, 0), out=indptr[1:])
+        return gaps, indptr
+    
+    @staticmethod
+    def _mean_std(values, indptr):
+        """Per-segment mean and population std (ddof=0); 0 for empty segments"""
+        
+        layout = _segment_layout(indptr)
+        counts = np.maximum(layout[2], 1)
+        mean = _segment_sum(values, indptr, layout) / counts
+        dev = values - mean[layout[0]]
+        return mean, np.sqrt(_segment_sum(dev * dev, indptr, layout) / counts)
+    
+    def batch_stats(self):
+        """(mean, std) of the withdrawn quantities of each row"""
+        
+        return self._mean_std(self.quantities, self.indptr)
+    
+    def interval_stats(self):
+        """(mean, std) of the days between withdrawals of each row"""
+        
+        return self._mean_std(*self.intervals())
+    
+    def regularity(self):
+        """
+        Interval consistency, batch size consistency and withdrawal regularity
+        per row - the sparse counterpart of the dense regularity kernel
+        (_withdrawal_regularity_kernel in inventory_prediction.py), same results.
+        """
+        
+        events = self.event_counts()
+        batch_mean, batch_std = self.batch_stats()
+        interval_mean, interval_std = self.interval_stats()
+        
+        interval_consistency = np.maximum(0, 1 - interval_std / (interval_mean + 1))
+        batch_consistency = np.maximum(0, 1 - batch_std / (batch_mean + 1))
+        regularity = interval_consistency * 0.6 + batch_consistency * 0.4
+        
+        # Special cases: one withdrawal (perfectly consistent) and none at all
+        multi = events > 1
+        single = events == 1
+        interval_consistency = np.select([multi, single], [interval_consistency, 1.0], 0.0)
+        batch_consistency = np.select([multi, single], [batch_consistency, 1.0], 0.0)
+        regularity = np.select([multi, single], [regularity, 0.8], 0.0)
+        
+        return interval_consistency, batch_consistency, regularity